@@ -32,6 +32,32 @@ default_args = {
 
 
 
+# ==================== TRACING ====================
+import hashlib
+
+# OpenTelemetry settings forwarded to the pipeline container
+OTEL_ENV = {
+    key: os.getenv(key)
+    for key in (
+        "OTEL_TRACES_EXPORTER",
+        "OTEL_TRACES_FILE",
+        "OTEL_EXPORTER_OTLP_ENDPOINT",
+        "OTEL_EXPORTER_OTLP_PROTOCOL",
+    )
+    if os.getenv(key)
+}
+
+
+def traceparent(dag_id, run_id, task_id, try_number):
+    """
+    W3C traceparent for a task try: the trace id is derived from the DAG run,
+    so every task of one run lands in the same trace.
+    """
+    trace_id = hashlib.sha256(f"{dag_id}:{run_id}".encode()).hexdigest()[:32]
+    span_id = hashlib.sha256(f"{run_id}:{task_id}:{try_number}".encode()).hexdigest()[:16]
+    return f"00-{trace_id}-{span_id}-01"
+
+
 # ==================== DAG DEFINITION ====================
 
 from airflow import DAG
@@ -52,6 +78,7 @@ with DAG(
     schedule_interval=None,
     catchup=False,
     tags=["etl", "docker", "postgres"],
+    user_defined_macros={"traceparent": traceparent},
 ) as dag:
 
     run_docker_pipeline = DockerOperator(
@@ -64,6 +91,111 @@ with DAG(
         network_mode="docker_db",
         command="python -m src.data_pipeline.main" ,  # replace with your actual docker-compose network name
         mount_tmp_dir=False,
+        # Propagate trace context into the container (see src/data_pipeline/tracing.py)
+        environment={
+            "TRACEPARENT": "{{ traceparent(dag.dag_id, run_id, ti.task_id, ti.try_number) }}",
+            "OTEL_SERVICE_NAME": "data-pipeline",
+            **OTEL_ENV,
+        },
     )
 
     run_docker_pipeline
+
+
+# ==================== PER-SOURCE DAG ====================
+# One mapped task group per source: fetch -> transform -> store, each step in
+# its own container. Steps hand their data on as Parquet files on a shared
+# volume (src/data_pipeline/tasks.py); XCom only carries the file reference,
+# and a failing source is retried without touching the others.
+from datetime import timedelta
+from airflow.decorators import task_group
+from docker.types import Mount
+
+PIPELINE_IMAGE = os.getenv("PIPELINE_IMAGE", "ayushghimire95/data-pipeline:linux")
+PIPELINE_NETWORK = os.getenv("PIPELINE_NETWORK", "docker_db")
+HANDOFF_VOLUME = os.getenv("PIPELINE_HANDOFF_VOLUME", "pipeline-handoff")
+HANDOFF_DIR = "/data/handoff"
+XCOM_PATH = "/tmp/script.out"
+# Sources processed at the same time (per step)
+MAX_PARALLEL_SOURCES = int(os.getenv("PIPELINE_MAX_PARALLEL_SOURCES", "8"))
+
+TASKS_CMD = ["python", "-m", "src.data_pipeline.tasks"]
+RUN_ID_ARGS = ["--run-id", "{{ run_id }}"]
+
+
+def pipeline_step(task_id, command, **kwargs):
+    """DockerOperator running one step of src.data_pipeline.tasks, result read back as XCom."""
+    return DockerOperator(
+        task_id=task_id,
+        image=PIPELINE_IMAGE,
+        api_version="auto",
+        auto_remove="success",
+        docker_url="unix://var/run/docker.sock",
+        network_mode=PIPELINE_NETWORK,
+        command=TASKS_CMD + command,
+        mount_tmp_dir=False,
+        mounts=[Mount(source=HANDOFF_VOLUME, target=HANDOFF_DIR, type="volume")],
+        retrieve_output=True,
+        retrieve_output_path=XCOM_PATH,
+        environment={
+            "TRACEPARENT": "{{ traceparent(dag.dag_id, run_id, ti.task_id ~ '.' ~ ti.map_index, ti.try_number) }}",
+            "OTEL_SERVICE_NAME": "data-pipeline",
+            "PIPELINE_HANDOFF_DIR": HANDOFF_DIR,
+            "PIPELINE_XCOM_PATH": XCOM_PATH,
+            # Trigger with {"full_refresh": true} to ignore the source high-water marks
+            "PIPELINE_FULL_REFRESH": "{{ dag_run.conf.get('full_refresh', False) }}",
+            **OTEL_ENV,
+        },
+        **kwargs,
+    )
+
+
+def previous_ref(task_id):
+    # Reference pushed by the same source's previous step
+    return "{{ ti.xcom_pull(task_ids='ingest_source.%s', map_indexes=ti.map_index) | tojson }}" % task_id
+
+
+with DAG(
+    dag_id="per_source_pipeline_dag",
+    default_args={
+        'owner': 'airflow',
+        'depends_on_past': False,
+        'retries': 2,
+        'retry_delay': timedelta(minutes=1),
+    },
+    description="Fetch, transform and store every RSS source as its own mapped task group",
+    start_date=datetime(2025, 1, 1),
+    schedule_interval=None,
+    catchup=False,
+    tags=["etl", "docker", "postgres", "mapped"],
+    user_defined_macros={"traceparent": traceparent},
+) as per_source_dag:
+
+    sources = pipeline_step("list_sources", ["sources"] + RUN_ID_ARGS)
+
+    @task_group(group_id="ingest_source")
+    def ingest_source(source):
+        fetch = pipeline_step(
+            "fetch", ["fetch", "--source", source] + RUN_ID_ARGS,
+            max_active_tis_per_dagrun=MAX_PARALLEL_SOURCES,
+        )
+        transform = pipeline_step(
+            "transform", ["transform", "--input", previous_ref("fetch")] + RUN_ID_ARGS,
+            max_active_tis_per_dagrun=MAX_PARALLEL_SOURCES,
+        )
+        store = pipeline_step(
+            "store", ["store", "--input", previous_ref("transform")] + RUN_ID_ARGS,
+            max_active_tis_per_dagrun=MAX_PARALLEL_SOURCES,
+        )
+        fetch >> transform >> store
+
+    ingested = ingest_source.expand(source=sources.output)
+
+    # Embed and summarize whatever was stored, even if some sources failed
+    embed = pipeline_step("embed", ["embed"], trigger_rule="all_done")
+    summary = pipeline_step("summary", ["summary"] + RUN_ID_ARGS, trigger_rule="all_done")
+    # Handoff files are kept when anything failed, so failed sources can be cleared and rerun
+    cleanup = pipeline_step("cleanup", ["cleanup"] + RUN_ID_ARGS, retries=0)
+
+    ingested >> embed >> summary >> cleanup
+    ingested >> cleanup
@@ -0,0 +1,100 @@
+"""
+BACKFILL BENCHMARK
+Offline rows/sec of the CPU phases of src/data_pipeline/backfill.py on a
+synthetic archive (recorded feeds plus a JSONL article dump):
+
+    read     load_file() per file: one process vs. --workers processes
+    encode   one encode_custom() call per article, formatted the way
+             psycopg2 sends embed_missing's lists, vs. backfill.embed_rows()
+             batches (same vectors), serial and in the pool
+
+The load (COPY + merge), embed UPDATE and index phases need Postgres; the
+backfill itself reports them (python -m src.data_pipeline.backfill ...).
+
+    python -m benchmarks.backfill
+    python -m benchmarks.backfill --sources 200 --entries 50 --workers 8
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from benchmarks.pipeline_engine import synthesize_feeds
+from benchmarks.records import synthesize
+
+
+def rate(rows: int, seconds: float) -> dict:
+    return {'rows': rows, 'seconds': round(seconds, 3), 'rows_per_s': round(rows / seconds, 1) if seconds else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline throughput of the backfill read and encode phases")
+    parser.add_argument("--sources", type=int, default=100, help="Synthetic recorded feeds")
+    parser.add_argument("--entries", type=int, default=40, help="Entries per feed")
+    parser.add_argument("--dump-articles", type=int, default=20000, help="Articles in the JSONL dump")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--embed-batch", type=int, default=5000)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    from src.data_pipeline import backfill
+    from src.data_pipeline.vector_db import EMBED_DIM, embedding_text, encode_custom
+
+    report = {'workers': args.workers}
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        synthesize_feeds(directory, args.sources, args.entries, fetch_ms=0)
+        dump = synthesize(args.dump_articles)
+        with open(directory / "dump.jsonl", "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in dump)
+        files = backfill.list_files([tmp])
+        jobs = [(path, False) for path in files]
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            serial = [backfill.load_file(*job) for job in jobs]
+            report['read_1_process'] = rate(sum(r['rows'] for r in serial), time.perf_counter() - start)
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                start = time.perf_counter()
+                pooled = list(executor.map(backfill.load_file, *zip(*jobs)))
+                report[f'read_{args.workers}_processes'] = rate(sum(r['rows'] for r in pooled),
+                                                                time.perf_counter() - start)
+        assert [r['csv'] for r in serial] == [r['csv'] for r in pooled]
+        errors = [r for r in serial if 'error' in r]
+        assert not errors, errors[:1]
+
+    rows = [(i, row['title'], row['summary']) for i, row in enumerate(dump)]
+    start = time.perf_counter()
+    for _, title, summary in rows:
+        vector = encode_custom(embedding_text({'title': title, 'summary': summary}), EMBED_DIM).tolist()
+        "ARRAY[" + ",".join(map(repr, vector)) + "]"
+    report['encode_per_row'] = rate(len(rows), time.perf_counter() - start)
+
+    batches = [rows[i:i + args.embed_batch] for i in range(0, len(rows), args.embed_batch)]
+    start = time.perf_counter()
+    for batch in batches:
+        backfill.embed_rows(batch)
+    report['encode_batch_1_process'] = rate(len(rows), time.perf_counter() - start)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        executor.submit(int).result()  # start the workers outside the measurement
+        start = time.perf_counter()
+        list(executor.map(backfill.embed_rows, batches))
+        report[f'encode_batch_{args.workers}_processes'] = rate(len(rows), time.perf_counter() - start)
+
+    print(f"{len(files)} files, {report['read_1_process']['rows']} articles read; "
+          f"{len(rows)} articles encoded (batches of {args.embed_batch})")
+    print(f"{'phase':<28}{'rows':>9}{'seconds':>10}{'rows/s':>12}")
+    for name, r in report.items():
+        if isinstance(r, dict):
+            print(f"{name:<28}{r['rows']:>9}{r['seconds']:>10.2f}{r['rows_per_s']:>12.1f}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
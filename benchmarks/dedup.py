@@ -0,0 +1,138 @@
+"""
+DEDUP BENCHMARK
+Accuracy and savings of the near-duplicate grouping in src/data_pipeline/dedup.py
+on a synthetic wire corpus, without Postgres (dedup.LSHIndex is what
+group_duplicates loads the stored candidates into):
+
+    stories     distinct synthetic articles (benchmarks.loadtest.seed); they
+                are built from shared sentence templates, so unrelated
+                stories overlap more than real ones do
+    copies      a share of them rerun by sister papers with the edits copy
+                desks make: a "STT:" headline prefix, a "Lue lisää" line,
+                one changed word, the last sentence cut
+
+Reports precision / recall of "copy of an earlier story" per edit, the
+dedup rate, the translator calls and characters and the embeddings the
+copies cost (what PIPELINE_DEDUP=collapse skips) and signatures per second.
+
+    python -m benchmarks.dedup
+    python -m benchmarks.dedup --stories 5000 --wire-share 0.4 --threshold 0.7
+"""
+
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+EDITS = ("verbatim", "prefix", "suffix", "word", "cut")
+
+
+def copy_of(article: dict, edit: str, source: str, i: int) -> dict:
+    copy = {**article, 'link_name': source, 'link': f"{article['link']}/copy/{i}"}
+    if edit == "prefix":
+        copy['title'] = "STT: " + article['title']
+    elif edit == "suffix":
+        copy['summary'] = article['summary'] + " Lue lisää verkkolehdestä."
+    elif edit == "word":
+        copy['summary'] = article['summary'].replace(" the ", " a ", 1)
+    elif edit == "cut":
+        copy['summary'] = ". ".join(article['summary'].split(". ")[:-1])
+    return copy
+
+
+def corpus(stories: int, wire_share: float, copies: int, seed: int = 11) -> list:
+    """(article, edit or None, index of the original or None), in arrival order."""
+    from benchmarks.loadtest.seed import synthetic_article
+
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    sisters = ["Länsi-Savo", "Itä-Häme", "Kouvolan Sanomat", "Kymen Sanomat", "Uusimaa", "Etelä-Saimaa"]
+    items = []
+    for s in range(stories):
+        original = synthetic_article(rng, s, now, days=7)
+        index = len(items)
+        items.append((original, None, None))
+        if rng.random() < wire_share:
+            for c, source in enumerate(rng.sample(sisters, k=copies)):
+                edit = rng.choice(EDITS)
+                items.append((copy_of(original, edit, source, c), edit, index))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate grouping accuracy and savings")
+    parser.add_argument("--stories", type=int, default=3000)
+    parser.add_argument("--wire-share", type=float, default=0.3, help="Share of stories rerun by sister papers")
+    parser.add_argument("--copies", type=int, default=4, help="Sister papers per rerun story")
+    parser.add_argument("--threshold", type=float, help="Estimated Jaccard for a copy (PIPELINE_DEDUP_THRESHOLD)")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    from src.data_pipeline import dedup
+
+    items = corpus(args.stories, args.wire_share, args.copies)
+    start = time.perf_counter()
+    signatures = [dedup.minhash(dedup.article_text(article)) for article, _, _ in items]
+    signature_s = time.perf_counter() - start
+
+    # Same decisions as group_duplicates: the first text of a story is canonical.
+    # A copy is found when it joins any story started by its original or by
+    # another copy of it (the original may have been too short, or missed).
+    index = dedup.LSHIndex(args.threshold if args.threshold is not None else dedup.THRESHOLD)
+    origin = {}
+    hits, misses, false = Counter(), Counter(), 0
+    saved = {'calls': 0, 'chars': 0}
+    start = time.perf_counter()
+    for i, ((article, edit, original), signature) in enumerate(zip(items, signatures)):
+        if signature is None:
+            continue
+        match = index.match(signature)
+        if match:
+            work = dedup.work_saved(article)
+            saved['calls'] += work['calls']
+            saved['chars'] += work['chars']
+            if edit is not None and origin[match[0]] == original:
+                hits[edit] += 1
+            else:
+                false += 1
+        else:
+            origin[i] = i if edit is None else original
+            index.add(i, signature)
+            if edit is not None:
+                misses[edit] += 1
+    match_s = time.perf_counter() - start
+
+    copies = sum(1 for _, edit, _ in items if edit is not None)
+    found = sum(hits.values())
+    report = {
+        'articles': len(items),
+        'copies': copies,
+        'threshold': index.threshold,
+        'recall': round(found / copies, 4) if copies else 0.0,
+        'precision': round(found / (found + false), 4) if found + false else 0.0,
+        'recall_by_edit': {edit: round(hits[edit] / max(hits[edit] + misses[edit], 1), 4) for edit in EDITS},
+        'false_matches': false,
+        'dedup_rate': round((found + false) / len(items), 4),
+        'translate_calls_saved': saved['calls'],
+        'translate_chars_saved': saved['chars'],
+        'embeddings_saved': found + false,
+        'signatures_per_s': round(len(items) / signature_s, 1),
+        'lookups_per_s': round(len(items) / match_s, 1),
+    }
+
+    print(f"{report['articles']} articles, {copies} wire copies; threshold {report['threshold']}")
+    print(f"Recall {report['recall'] * 100:.1f}%, precision {report['precision'] * 100:.1f}% "
+          f"({false} false matches); dedup rate {report['dedup_rate'] * 100:.1f}%")
+    print("Recall by edit: " + ", ".join(f"{e} {r * 100:.0f}%" for e, r in report['recall_by_edit'].items()))
+    print(f"Skipped with collapse: {report['translate_calls_saved']} translator calls "
+          f"({report['translate_chars_saved']} characters), {report['embeddings_saved']} embeddings")
+    print(f"{report['signatures_per_s']:.0f} signatures/s, {report['lookups_per_s']:.0f} lookups/s")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
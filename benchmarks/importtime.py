@@ -0,0 +1,119 @@
+"""
+STARTUP TIME
+Import-time benchmark and budget check for the API and pipeline entry points
+and the RAG module behind /ask.
+
+Each entry point is imported in a fresh interpreter under `python -X importtime`
+(best of --repeat runs). The check fails when its cumulative import time is
+over budget or when a heavy optional backend (torch, sentence_transformers,
+chromadb, ...) is imported although no code path selected it.
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget-ms api=400 --budget-ms pipeline=300 --top 15
+
+Budgets default to IMPORT_BUDGET_API_MS / IMPORT_BUDGET_PIPELINE_MS /
+IMPORT_BUDGET_RAG_MS.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+ENTRY_POINTS = {
+    "api": "src.api.main",
+    "pipeline": "src.data_pipeline.main",
+    # Imported by the first /ask (or the gunicorn warm-up), not at app import
+    "rag": "src.ml_logic.rag",
+}
+DEFAULT_BUDGETS_MS = {
+    "api": float(os.getenv("IMPORT_BUDGET_API_MS", "600")),
+    "pipeline": float(os.getenv("IMPORT_BUDGET_PIPELINE_MS", "500")),
+    "rag": float(os.getenv("IMPORT_BUDGET_RAG_MS", "400")),
+}
+# Only imported when their backend is used (ChromaDB path, Gemini calls, ...)
+FORBIDDEN_MODULES = ["torch", "transformers", "sentence_transformers", "chromadb", "sklearn", "google.genai"]
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """
+    Import `module` in a fresh interpreter.
+
+    Returns:
+        {module name: (self us, cumulative us)} for every module imported
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def measure(name: str, repeat: int) -> dict:
+    module = ENTRY_POINTS[name]
+    runs = [import_times(module) for _ in range(repeat)]
+    best = min(runs, key=lambda t: t[module][1])
+    return {
+        "module": module,
+        "total_ms": best[module][1] / 1000,
+        "modules": best,
+        "forbidden": [m for m in FORBIDDEN_MODULES if m in best],
+    }
+
+
+def parse_budgets(values: list[str]) -> dict[str, float]:
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for value in values:
+        name, _, ms = value.partition("=")
+        if name not in ENTRY_POINTS:
+            raise SystemExit(f"ERROR: unknown entry point '{name}' (choose from {', '.join(ENTRY_POINTS)})")
+        budgets[name] = float(ms)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the API and pipeline entry points")
+    parser.add_argument("entry_points", nargs="*", metavar="ENTRY_POINT",
+                        help=f"Any of {', '.join(ENTRY_POINTS)} (default: all)")
+    parser.add_argument("--budget-ms", action="append", default=[], metavar="NAME=MS",
+                        help="Override the budget of one entry point")
+    parser.add_argument("--repeat", type=int, default=3, help="Take the fastest of this many runs")
+    parser.add_argument("--top", type=int, default=10, help="Show the slowest top-level imports")
+    args = parser.parse_args()
+    budgets = parse_budgets(args.budget_ms)
+    unknown = set(args.entry_points) - set(ENTRY_POINTS)
+    if unknown:
+        raise SystemExit(f"ERROR: unknown entry point(s) {', '.join(sorted(unknown))}")
+
+    failed = False
+    for name in args.entry_points or ENTRY_POINTS:
+        report = measure(name, args.repeat)
+        over = report["total_ms"] > budgets[name]
+        status = "OVER BUDGET" if over else "ok"
+        print(f"{name} ({report['module']}): {report['total_ms']:.0f} ms, budget {budgets[name]:.0f} ms - {status}")
+
+        top_level = {m: t for m, t in report["modules"].items() if "." not in m and m != report["module"]}
+        for module, (_, cumulative) in sorted(top_level.items(), key=lambda kv: -kv[1][1])[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {module}")
+
+        if report["forbidden"]:
+            print(f"ERROR: {name} imports heavy optional backends at startup: {', '.join(report['forbidden'])}")
+        failed = failed or over or bool(report["forbidden"])
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+LOAD TEST RUNNER
+One command: seed Postgres, start the LLM stub and the API, drive /ask and
+/search with open-loop (Poisson) arrivals and write a JSON report.
+
+    python -m benchmarks.loadtest.run --seed-articles 5000 --ask-rps 2,5,10 --search-rps 20,50 --duration 60
+
+Open loop means requests are sent on schedule whether or not earlier ones
+have finished, so queueing shows up as latency and shedding instead of the
+client silently slowing down. The report holds, per scenario, throughput,
+p50/p95/p99 latency, status codes, error rate, per-stage server timings
+(from the /ask `stats`) and per-stage error counts (from /metrics), plus
+the memory of the API process tree.
+
+The API and the seeder use the same DB_HOST / DB_PORT / DB_USER /
+DB_PASSWORD / DB_NAME variables as the application.
+
+Compare two runs:
+
+    python -m benchmarks.loadtest.run --compare results/old.json results/new.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+ROOT = Path(__file__).resolve().parents[2]
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+LOOKUP_TEMPLATES = [
+    "What did {source} publish about {actor}?",
+    "Show me the latest news about {topic}",
+    "Any articles on {topic} in {place}?",
+    "Find stories about {actor} and {topic}",
+]
+GENERATIVE_TEMPLATES = [
+    "Why is {topic} in the news in {place}?",
+    "How will {topic} affect people in {place}?",
+    "Summarize what {actor} has said about {topic}",
+    "What is the impact of {topic} on {place}?",
+]
+
+
+# -----------------------------
+# Workload
+# -----------------------------
+def question_pool(size: int, lookup_share: float, seed: int) -> List[str]:
+    from .seed import ACTORS, PLACES, SOURCES, TOPICS
+
+    rng = random.Random(seed)
+    topics = [t for ts in TOPICS.values() for t in ts]
+    pool = []
+    for _ in range(size):
+        templates = LOOKUP_TEMPLATES if rng.random() < lookup_share else GENERATIVE_TEMPLATES
+        pool.append(rng.choice(templates).format(
+            source=rng.choice(SOURCES).replace(" RSS Feed", ""),
+            actor=rng.choice(ACTORS), topic=rng.choice(topics), place=rng.choice(PLACES),
+        ))
+    return pool
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(q / 100 * len(ordered))))
+    return round(ordered[rank - 1], 2)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 2) if values else None,
+    }
+
+
+# -----------------------------
+# Metrics scraping
+# -----------------------------
+def scrape_counters(client: httpx.Client, base_url: str) -> Dict[str, float]:
+    """
+    Error and shedding counters from /metrics, keyed like
+    'rag_errors_total{stage=vector_search}'.
+    """
+    try:
+        text = client.get(f"{base_url}/metrics", timeout=10).text
+    except httpx.HTTPError:
+        return {}
+    wanted = {"rag_errors", "admission_shed", "llm_fallbacks", "llm_hedged_requests", "ask_coalesce_requests"}
+    counters = {}
+    for family in text_string_to_metric_families(text):
+        if family.name not in wanted:
+            continue
+        for sample in family.samples:
+            if not sample.name.endswith("_total"):
+                continue
+            labels = ",".join(f"{k}={v}" for k, v in sorted(sample.labels.items()) if k != "backend")
+            counters[f"{sample.name}{{{labels}}}"] = counters.get(f"{sample.name}{{{labels}}}", 0) + sample.value
+    return counters
+
+
+def counter_delta(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    return {k: v - before.get(k, 0) for k, v in sorted(after.items()) if v - before.get(k, 0) > 0}
+
+
+# -----------------------------
+# Open-loop driver
+# -----------------------------
+async def run_scenario(base_url: str, endpoint: str, rps: float, duration: float, questions: List[str],
+                       timeout: float, seed: int) -> dict:
+    """
+    Fire requests at Poisson arrival times for `duration` seconds.
+
+    Returns:
+        Scenario report (latency, throughput, status codes, stage timings)
+    """
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    stage_ms: Dict[str, List[float]] = defaultdict(list)
+    routes: Counter = Counter()
+    tasks = []
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def one(i: int, question: str):
+            headers = {"X-Client-Id": f"loadtest-{i}"}
+            start = time.perf_counter()
+            try:
+                if endpoint == "ask":
+                    response = await client.post("/ask", json={"question": question}, headers=headers)
+                else:
+                    response = await client.get("/search", params={"q": question, "limit": 10}, headers=headers)
+                status = str(response.status_code)
+            except httpx.TimeoutException:
+                response, status = None, "client_timeout"
+            except httpx.HTTPError as e:
+                response, status = None, f"client_error:{type(e).__name__}"
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            statuses[status] += 1
+            if status != "200":
+                return
+            latencies.append(elapsed_ms)
+            if endpoint == "ask":
+                stats = response.json().get("stats") or {}
+                for stage, ms in (stats.get("timings_ms") or {}).items():
+                    stage_ms[stage].append(ms)
+                if "total_ms" in stats:
+                    stage_ms["server_total"].append(stats["total_ms"])
+                routes[stats.get("route", "none")] += 1
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        next_at, i = started, 0
+        while True:
+            next_at += rng.expovariate(rps)
+            if next_at - started >= duration:
+                break
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            tasks.append(asyncio.create_task(one(i, questions[i % len(questions)])))
+            i += 1
+
+        sent_for = loop.time() - started
+        await asyncio.gather(*tasks)
+        drained_for = loop.time() - started
+
+    ok = statuses.get("200", 0)
+    total = sum(statuses.values())
+    return {
+        "endpoint": endpoint,
+        "offered_rps": rps,
+        "duration_s": round(sent_for, 2),
+        "requests": total,
+        "throughput_rps": round(ok / max(drained_for, 1e-9), 2),
+        "error_rate": round((total - ok) / max(total, 1), 4),
+        "status_codes": dict(statuses),
+        "latency_ms": summarize(latencies),
+        "stages_ms": {stage: summarize(values) for stage, values in sorted(stage_ms.items())},
+        "routes": dict(routes),
+    }
+
+
+# -----------------------------
+# Process management
+# -----------------------------
+def start_process(args: List[str], env: dict, log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, *args], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_healthy(url: str, proc: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not healthy after {timeout}s")
+
+
+def api_environment(args) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "LLM_BACKEND": "openai",
+        "LLM_MODEL": "stub",
+        "LLM_FALLBACK_MODEL": "stub-fallback",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+        # Measure capacity, not the per-client rate limits
+        "ASK_RATE_LIMIT_RPS": "0",
+        "SEARCH_RATE_LIMIT_RPS": "0",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if args.server == "gunicorn":
+        # gunicorn_conf.py empties the directory and sizes the DB pools
+        env.update({
+            "WEB_CONCURRENCY": str(args.workers),
+            "BIND": f"127.0.0.1:{args.port}",
+            "PROMETHEUS_MULTIPROC_DIR": str(RESULTS_DIR / "prometheus"),
+        })
+    elif args.workers > 1:
+        multiproc_dir = RESULTS_DIR / "prometheus"
+        if multiproc_dir.exists():
+            for f in multiproc_dir.iterdir():
+                f.unlink()
+        multiproc_dir.mkdir(parents=True, exist_ok=True)
+        env["PROMETHEUS_MULTIPROC_DIR"] = str(multiproc_dir)
+    return env
+
+
+def api_command(args) -> List[str]:
+    if args.server == "gunicorn":
+        return ["-m", "gunicorn", "-c", "src/api/gunicorn_conf.py", "src.api.main:app"]
+    return ["-m", "uvicorn", "src.api.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+            "--workers", str(args.workers), "--log-level", "warning"]
+
+
+def process_tree_memory(proc: subprocess.Popen) -> dict:
+    """
+    Memory of a server and its workers. PSS splits shared (copy-on-write)
+    pages between the processes sharing them, so its sum is the real
+    footprint; USS is what each process holds alone.
+    """
+    import psutil
+
+    root = psutil.Process(proc.pid)
+    processes = [root, *root.children(recursive=True)]
+    info = [p.memory_full_info() for p in processes]
+    mb = 1024 * 1024
+    return {
+        "processes": len(processes),
+        "rss_total_mb": round(sum(i.rss for i in info) / mb, 1),
+        "pss_total_mb": round(sum(getattr(i, "pss", 0) for i in info) / mb, 1),
+        "uss_total_mb": round(sum(i.uss for i in info) / mb, 1),
+        "uss_per_worker_mb": round(sum(i.uss for i in info[1:]) / max(1, len(info) - 1) / mb, 1),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+# -----------------------------
+# Comparison
+# -----------------------------
+def compare(old_path: str, new_path: str):
+    old, new = json.loads(Path(old_path).read_text()), json.loads(Path(new_path).read_text())
+    print(f"{old.get('git_revision')} -> {new.get('git_revision')}")
+    old_by_key = {(s["endpoint"], s["offered_rps"]): s for s in old["scenarios"]}
+    for s in new["scenarios"]:
+        o = old_by_key.get((s["endpoint"], s["offered_rps"]))
+        if not o:
+            continue
+        print(f"\n{s['endpoint']} @ {s['offered_rps']} rps")
+        rows = [("throughput_rps", o["throughput_rps"], s["throughput_rps"]),
+                ("error_rate", o["error_rate"], s["error_rate"])]
+        rows += [(f"latency_{q}", o["latency_ms"][q], s["latency_ms"][q]) for q in ("p50", "p95", "p99")]
+        for name, a, b in rows:
+            change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else "n/a"
+            print(f"  {name:<16} {a!s:>10} -> {b!s:>10}  {change}")
+
+
+def parse_rates(value: str) -> List[float]:
+    return [float(r) for r in value.split(",") if r.strip()] if value else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Open-loop load test for /ask and /search")
+    parser.add_argument("--seed-articles", type=int, default=0, help="Seed this many synthetic articles first")
+    parser.add_argument("--api-url", help="Test an already running API instead of starting one")
+    parser.add_argument("--port", type=int, default=8055)
+    parser.add_argument("--stub-port", type=int, default=8101)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for the started API")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn",
+                        help="gunicorn = production config (preload + copy-on-write), uvicorn = plain --workers")
+    parser.add_argument("--llm-latency", default="lognormal:median=1.0,sigma=0.4", help="LLM stub latency spec")
+    parser.add_argument("--llm-tail-prob", type=float, default=0.02)
+    parser.add_argument("--ask-rps", default="1,2,5", help="Comma-separated arrival rates for /ask")
+    parser.add_argument("--search-rps", default="10,25", help="Comma-separated arrival rates for /search")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per scenario")
+    parser.add_argument("--timeout", type=float, default=90, help="Client-side request timeout")
+    parser.add_argument("--questions", type=int, default=500, help="Distinct questions in the pool")
+    parser.add_argument("--lookup-share", type=float, default=0.4, help="Share of lookup-style questions")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Report path (default: results/<git revision>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two reports and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.seed_articles:
+        from .seed import main as seed_main
+        seed_main(["--articles", str(args.seed_articles), "--seed", str(args.seed), "--reset"])
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    processes = []
+    memory = {}
+    base_url = args.api_url
+    try:
+        if not base_url:
+            env = api_environment(args)
+            # uvicorn.run() honours WEB_CONCURRENCY, which is meant for the API only
+            stub_env = {k: v for k, v in env.items() if k != "WEB_CONCURRENCY"}
+            stub = start_process(["-m", "src.ml_logic.llm_stub", "--port", str(args.stub_port),
+                                  "--latency", args.llm_latency, "--tail-prob", str(args.llm_tail_prob)],
+                                 stub_env, RESULTS_DIR / "llm_stub.log")
+            processes.append(stub)
+            wait_healthy(f"http://127.0.0.1:{args.stub_port}/v1/models", stub)
+
+            api = start_process(api_command(args), env, RESULTS_DIR / "api.log")
+            processes.append(api)
+            base_url = f"http://127.0.0.1:{args.port}"
+            wait_healthy(f"{base_url}/health", api)
+            time.sleep(2)  # let every worker finish booting
+            memory["after_start"] = process_tree_memory(api)
+
+        questions = question_pool(args.questions, args.lookup_share, args.seed)
+        scenarios = []
+        with httpx.Client() as client:
+            for endpoint, rates in (("search", parse_rates(args.search_rps)), ("ask", parse_rates(args.ask_rps))):
+                for rps in rates:
+                    print(f"INFO: {endpoint} at {rps} rps for {args.duration:.0f}s...", file=sys.stderr)
+                    before = scrape_counters(client, base_url)
+                    result = asyncio.run(run_scenario(base_url, endpoint, rps, args.duration, questions,
+                                                      args.timeout, args.seed))
+                    result["server_counters"] = counter_delta(before, scrape_counters(client, base_url))
+                    scenarios.append(result)
+                    print(f"INFO:   {result['throughput_rps']} rps ok, p95 {result['latency_ms']['p95']} ms, "
+                          f"errors {result['error_rate']:.1%}", file=sys.stderr)
+        if processes:
+            memory["after_load"] = process_tree_memory(processes[-1])
+    finally:
+        for proc in reversed(processes):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    report = {
+        "git_revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output")},
+        "api_memory": memory,
+        "scenarios": scenarios,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{report['git_revision'] or 'run'}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    print(f"INFO: Report written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
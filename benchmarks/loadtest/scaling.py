@@ -0,0 +1,60 @@
+"""
+WORKER SCALING
+Runs the load test once per worker count and prints a markdown table of
+throughput, latency and memory (see docs/scaling.md).
+
+    python -m benchmarks.loadtest.scaling --worker-counts 1,2,4,8 -- --ask-rps 5,10 --search-rps 50 --duration 60
+
+Arguments after `--` are passed to benchmarks.loadtest.run unchanged.
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+from .run import RESULTS_DIR, git_revision
+from .run import main as run_main
+
+
+def best(scenarios: list, endpoint: str) -> str:
+    """Highest throughput reached for an endpoint, with its p95."""
+    runs = [s for s in scenarios if s["endpoint"] == endpoint and s["latency_ms"]["p95"] is not None]
+    if not runs:
+        return "-"
+    top = max(runs, key=lambda s: s["throughput_rps"])
+    return f"{top['throughput_rps']} rps / p95 {top['latency_ms']['p95']:.0f} ms"
+
+
+def table(reports: dict) -> str:
+    lines = [
+        "| Workers | Processes | RSS total (MB) | PSS total (MB) | USS per worker (MB) | /search best | /ask best |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for workers, report in sorted(reports.items()):
+        memory = report["api_memory"].get("after_load") or report["api_memory"].get("after_start") or {}
+        lines.append(
+            f"| {workers} | {memory.get('processes', '-')} | {memory.get('rss_total_mb', '-')} | "
+            f"{memory.get('pss_total_mb', '-')} | {memory.get('uss_per_worker_mb', '-')} | "
+            f"{best(report['scenarios'], 'search')} | {best(report['scenarios'], 'ask')} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API at several worker counts")
+    parser.add_argument("--worker-counts", default="1,2,4,8")
+    args, passthrough = parser.parse_known_args()
+    passthrough = [a for a in passthrough if a != "--"]
+
+    revision = git_revision() or "run"
+    reports = {}
+    for workers in [int(w) for w in args.worker_counts.split(",")]:
+        output = RESULTS_DIR / f"scaling-{revision}-w{workers}.json"
+        run_main([*passthrough, "--workers", str(workers), "--output", str(output)])
+        reports[workers] = json.loads(Path(output).read_text())
+
+    print(table(reports))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+LOAD TEST SEEDER
+Fills Postgres/pgvector with a reproducible synthetic Finnish-news corpus.
+
+Articles are generated from a fixed vocabulary with a seeded RNG, embedded
+with the same hashing encoder the API uses for queries, and marked by a
+https://bench.local/ link prefix so they can be removed again with --reset.
+
+    python -m benchmarks.loadtest.seed --articles 20000 --index hnsw
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from psycopg2.extras import execute_values
+
+BENCH_LINK_PREFIX = "https://bench.local/"
+INIT_SQL = Path(__file__).resolve().parents[2] / "storage" / "init.sql"
+
+SOURCES = [
+    "Yle RSS Feed", "Helsinki Times RSS Feed", "Helsingin Sanomat RSS Feed", "Iltalehti RSS Feed",
+    "Kauppalehti RSS Feed", "Aamulehti RSS Feed", "Keskisuomalainen RSS Feed", "Savon Sanomat RSS Feed",
+    "Turun Sanomat RSS Feed", "Kaleva RSS Feed", "Lapin Kansa RSS Feed", "Hufvudstadsbladet RSS Feed",
+]
+PLACES = [
+    "Helsinki", "Espoo", "Tampere", "Vantaa", "Oulu", "Turku", "Jyväskylä", "Kuopio", "Lahti",
+    "Rovaniemi", "Vaasa", "Joensuu", "Porvoo", "Lappeenranta", "Kotka", "Seinäjoki",
+]
+ACTORS = [
+    "Nokia", "Finnair", "Kone", "Wärtsilä", "Fortum", "Neste", "UPM", "Stora Enso", "Wolt", "Supercell",
+    "the government", "the city council", "Parliament", "the Bank of Finland", "VR", "HSL", "Posti",
+    "the University of Helsinki", "Aalto University", "the Finnish Defence Forces",
+]
+TOPICS = {
+    "economy": ["layoffs", "quarterly earnings", "inflation", "interest rates", "exports", "investment"],
+    "politics": ["budget cuts", "elections", "immigration rules", "NATO membership", "pension reform"],
+    "energy": ["electricity prices", "nuclear power", "wind farms", "district heating", "Olkiluoto"],
+    "transport": ["tram extension", "metro strike", "rail timetable", "airport expansion", "road tolls"],
+    "technology": ["5G rollout", "quantum computing", "startup funding", "AI research", "data centres"],
+    "society": ["housing market", "healthcare queues", "school reform", "heatwave", "Pride parade"],
+    "sports": ["ice hockey", "cross-country skiing", "football league", "rally championship"],
+}
+VERBS = ["announces", "reports", "plans", "faces", "confirms", "delays", "expands", "cuts", "debates"]
+SENTENCES = [
+    "{actor} {verb} new measures related to {topic} in {place}.",
+    "Officials in {place} say the {topic} situation will be reviewed next month.",
+    "According to {actor}, the changes to {topic} affect thousands of residents.",
+    "Critics argue that the {topic} decision by {actor} came too late.",
+    "The {topic} debate continued in {place} on {weekday}.",
+    "Experts expect {topic} to remain a key issue for {actor} this year.",
+]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def synthetic_article(rng: random.Random, i: int, now: datetime, days: int) -> dict:
+    """
+    One deterministic synthetic article.
+
+    Args:
+        rng: Seeded random generator
+        i: Article number (makes the link unique)
+        now: Reference time for publication dates
+        days: Publication dates are spread over this many past days
+
+    Returns:
+        Article dictionary in the shape of the articles table
+    """
+    category = rng.choice(list(TOPICS))
+    topic = rng.choice(TOPICS[category])
+    place, actor, verb = rng.choice(PLACES), rng.choice(ACTORS), rng.choice(VERBS)
+    source = rng.choice(SOURCES)
+    published_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+
+    words = dict(actor=actor, verb=verb, topic=topic, place=place, weekday=rng.choice(WEEKDAYS))
+    summary = " ".join(s.format(**words) for s in rng.sample(SENTENCES, k=rng.randint(2, 4)))
+    return {
+        "link_name": source,
+        "title": f"{actor[0].upper() + actor[1:]} {verb} {topic} in {place}",
+        "link": f"{BENCH_LINK_PREFIX}{source.split()[0].lower()}/{i}",
+        "published": published_at.strftime("%a, %d %b %Y %H:%M:%S +0000"),
+        "published_at": published_at,
+        "summary": summary,
+        "authors": [rng.choice(["STT", "Reuters", "Yle News", "HT Staff"])],
+        "tags": [category, topic, place],
+    }
+
+
+def vector_literal(vec) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vec) + "]"
+
+
+def seed(conn, articles: int, seed_value: int = 42, days: int = 30, batch_size: int = 1000) -> int:
+    """
+    Insert `articles` synthetic rows with embeddings (existing links are skipped).
+
+    Returns:
+        Number of rows inserted
+    """
+    from src.ml_logic.vector_db import EMBED_DIM, encode_custom
+
+    rng = random.Random(seed_value)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    inserted = 0
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE articles ADD COLUMN IF NOT EXISTS embedding vector({EMBED_DIM})")
+        batch = []
+        for i in range(articles):
+            a = synthetic_article(rng, i, now, days)
+            embedding = vector_literal(encode_custom(a["summary"], EMBED_DIM))
+            batch.append((a["link_name"], a["title"], a["link"], a["published"], a["published_at"],
+                          a["summary"], a["authors"], a["tags"], embedding))
+            if len(batch) >= batch_size or i == articles - 1:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO articles
+                        (link_name, title, link, published, published_at, summary, authors, tags, embedding)
+                    VALUES %s
+                    ON CONFLICT (link) DO NOTHING
+                    """,
+                    batch,
+                    template="(%s, %s, %s, %s, %s, %s, %s, %s, %s::vector)",
+                )
+                inserted += cur.rowcount
+                conn.commit()
+                batch = []
+    return inserted
+
+
+def reset(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM articles WHERE link LIKE %s", (BENCH_LINK_PREFIX + "%",))
+        deleted = cur.rowcount
+    conn.commit()
+    return deleted
+
+
+def create_index(conn, kind: str):
+    with conn.cursor() as cur:
+        cur.execute("DROP INDEX IF EXISTS articles_embedding_idx")
+        if kind == "hnsw":
+            cur.execute("CREATE INDEX articles_embedding_idx ON articles USING hnsw (embedding vector_cosine_ops)")
+        elif kind == "ivfflat":
+            cur.execute("CREATE INDEX articles_embedding_idx ON articles USING ivfflat (embedding vector_cosine_ops) "
+                        "WITH (lists = 100)")
+        cur.execute("ANALYZE articles")
+    conn.commit()
+
+
+def main(argv=None):
+    from src.ml_logic.storage import connect_storage
+
+    parser = argparse.ArgumentParser(description="Seed Postgres with a synthetic news corpus for load tests")
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=30, help="Spread publication dates over this many days")
+    parser.add_argument("--index", choices=["none", "hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--init", action="store_true", help="Apply storage/init.sql first (fresh database)")
+    parser.add_argument("--reset", action="store_true", help="Delete previously seeded rows first")
+    args = parser.parse_args(argv)
+
+    conn = connect_storage()
+    if conn is None:
+        raise SystemExit("ERROR: could not connect to Postgres (check DB_HOST/DB_PORT/DB_USER/DB_NAME)")
+    try:
+        if args.init:
+            with conn.cursor() as cur:
+                cur.execute(INIT_SQL.read_text())
+            conn.commit()
+        if args.reset:
+            print(f"INFO: Removed {reset(conn)} seeded articles")
+
+        start = time.perf_counter()
+        inserted = seed(conn, args.articles, args.seed, args.days)
+        elapsed = time.perf_counter() - start
+        print(f"INFO: Inserted {inserted} articles in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):.0f} rows/s)")
+
+        if args.index != "none":
+            start = time.perf_counter()
+            create_index(conn, args.index)
+            print(f"INFO: Built {args.index} index in {time.perf_counter() - start:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+PIPELINE ENGINE BENCHMARK
+End-to-end time of the ingestion pipeline, serial loop vs. staged engine, on
+recorded feeds, with the same stage functions and the same outputs.
+
+Feeds are replayed from disk with their recorded download latency. The
+translator and the database are replaced by stand-ins with a fixed latency
+per call (--translate-ms, --db-ms), because the point is the overlap between
+stages, not the speed of any one service. Parsing, HTML cleaning and
+embedding run the real code.
+
+    python -m benchmarks.pipeline_engine                       # synthetic recording
+    python -m benchmarks.pipeline_engine --record benchmarks/data/feeds   # record live feeds once
+    python -m benchmarks.pipeline_engine --feeds benchmarks/data/feeds --translate-ms 20
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from email.utils import format_datetime
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+BENCH_DB_MS_ENV = "BENCH_PIPELINE_DB_MS"
+
+
+# -----------------------------
+# Recorded feeds
+# -----------------------------
+def record_feeds(directory: Path) -> list:
+    """Download every configured feed once, keeping its body and latency."""
+    import requests
+    from src.data_pipeline.main import finland_rss_feeds
+
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = []
+    for i, (name, url) in enumerate(finland_rss_feeds):
+        if not url:
+            continue
+        start = time.perf_counter()
+        try:
+            body = requests.get(url, timeout=30).content
+        except Exception as e:
+            print(f"WARNING: {name}: {e}")
+            continue
+        latency_ms = (time.perf_counter() - start) * 1000
+        path = directory / f"feed-{i:02d}.xml"
+        path.write_bytes(body)
+        manifest.append({"name": name, "file": path.name, "latency_ms": round(latency_ms, 1)})
+        print(f"INFO: {name}: {len(body)} bytes in {latency_ms:.0f} ms")
+    (directory / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def synthesize_feeds(directory: Path, sources: int, entries: int, fetch_ms: float, seed: int = 42) -> list:
+    """Write RSS files built from the load-test corpus generator."""
+    from datetime import datetime, timezone
+    from benchmarks.loadtest.seed import synthetic_article
+
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    manifest = []
+    for s in range(sources):
+        items = []
+        for e in range(entries):
+            a = synthetic_article(rng, s * entries + e, now, days=7)
+            html = f"<p>{escape(a['summary'])}</p><img src='x.jpg'/><a href='{a['link']}'>Lue lisää</a>"
+            items.append(
+                f"<item><title>{escape(a['title'])}</title><link>{a['link']}</link>"
+                f"<pubDate>{format_datetime(a['published_at'])}</pubDate>"
+                f"<description>{escape(html)}</description>"
+                f"<category>{escape(a['tags'][0])}</category></item>"
+            )
+        path = directory / f"feed-{s:02d}.xml"
+        path.write_text(f"<?xml version='1.0' encoding='utf-8'?><rss version='2.0'><channel>"
+                        f"<title>Source {s}</title>{''.join(items)}</channel></rss>", encoding="utf-8")
+        latency = max(0.0, rng.gauss(fetch_ms, fetch_ms / 3))
+        manifest.append({"name": f"Source {s} RSS Feed", "file": path.name, "latency_ms": round(latency, 1)})
+    return manifest
+
+
+# -----------------------------
+# Stand-ins for the network and database
+# -----------------------------
+class FakeTranslator:
+    latency_s = 0.0
+
+    def __init__(self, source="auto", target="en"):
+        pass
+
+    def translate(self, text):
+        time.sleep(self.latency_s)
+        return text
+
+
+def fetch_replay(source: tuple):
+    from src.data_pipeline.main import fetch_source
+
+    name, path, latency_ms = source
+    time.sleep(latency_ms / 1000)
+    return fetch_source((name, path, None, "bench"))
+
+
+def store_stand_in(item: tuple) -> dict:
+    # Roughly one existence check + insert round trip per article
+    name, articles, _ = item
+    time.sleep(len(articles) * float(os.environ[BENCH_DB_MS_ENV]) / 1000)
+    from src.data_pipeline.records import encode
+
+    return {'source': name, 'articles': encode(articles), 'processed': len(articles),
+            'stored': len(articles), 'skipped': 0}
+
+
+def embed_stand_in(batch: dict) -> dict:
+    # Real encoding (CPU) in the worker process, simulated UPDATE
+    from src.data_pipeline.records import decode
+    from src.data_pipeline.vector_db import EMBED_DIM, embedding_text, encode_custom
+
+    vectors = [encode_custom(embedding_text(a), EMBED_DIM) for a in decode(batch["articles"])]
+    time.sleep(float(os.environ[BENCH_DB_MS_ENV]) / 1000)
+    result = {k: v for k, v in batch.items() if k != "articles"}
+    result["embedded"] = len(vectors)
+    result["checksum"] = round(float(sum(v.sum() for v in vectors)), 3)
+    return result
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def run(engine: str, sources: list) -> dict:
+    from src.data_pipeline.engine import Pipeline
+    from src.data_pipeline.main import build_stages
+
+    pipeline = Pipeline(build_stages(fetch=fetch_replay, store=store_stand_in, embed=embed_stand_in))
+    start = time.perf_counter()
+    results = list(pipeline.run(sources) if engine == "staged" else pipeline.run_serial(sources))
+    elapsed = time.perf_counter() - start
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "outputs": sorted(json.dumps(r, sort_keys=True) for r in results),
+        "articles": sum(r["processed"] for r in results),
+        "stages": pipeline.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the serial and staged ingestion pipeline")
+    parser.add_argument("--feeds", help="Directory with manifest.json and recorded feeds")
+    parser.add_argument("--record", help="Record the live feeds into this directory and exit")
+    parser.add_argument("--sources", type=int, default=40, help="Synthetic feeds (without --feeds)")
+    parser.add_argument("--entries", type=int, default=25, help="Entries per synthetic feed")
+    parser.add_argument("--fetch-ms", type=float, default=300, help="Mean synthetic download latency")
+    parser.add_argument("--translate-ms", type=float, default=5, help="Latency per translator call")
+    parser.add_argument("--db-ms", type=float, default=2, help="Latency per stored article / embed batch")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if args.record:
+        record_feeds(Path(args.record))
+        return
+
+    # Every replayed entry is new: no database to compare content hashes or
+    # near-duplicate signatures with
+    os.environ["PIPELINE_DETECT_EDITS"] = "false"
+    os.environ["PIPELINE_DEDUP"] = "off"
+    import src.data_pipeline.parse as parse
+    parse.GoogleTranslator = FakeTranslator
+    FakeTranslator.latency_s = args.translate_ms / 1000
+    os.environ[BENCH_DB_MS_ENV] = str(args.db_ms)  # read by the embed worker processes too
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(args.feeds) if args.feeds else Path(tmp)
+        if args.feeds:
+            manifest = json.loads((directory / "manifest.json").read_text())
+        else:
+            manifest = synthesize_feeds(directory, args.sources, args.entries, args.fetch_ms)
+        sources = [(m["name"], str(directory / m["file"]), m["latency_ms"]) for m in manifest]
+
+        # Output of the stages is noisy; keep it out of the report
+        with open(os.devnull, "w") as devnull:
+            import contextlib
+            with contextlib.redirect_stdout(devnull):
+                serial = run("serial", sources)
+                staged = run("staged", sources)
+
+    same = serial["outputs"] == staged["outputs"]
+    report = {
+        "sources": len(sources),
+        "articles": staged["articles"],
+        "serial_s": serial["elapsed_s"],
+        "staged_s": staged["elapsed_s"],
+        "speedup": round(serial["elapsed_s"] / max(staged["elapsed_s"], 1e-9), 2),
+        "same_outputs": same,
+        "settings": {"translate_ms": args.translate_ms, "db_ms": args.db_ms, "cpus": os.cpu_count()},
+        "stages": {"serial": serial["stages"], "staged": staged["stages"]},
+    }
+
+    from src.data_pipeline.main import print_stage_summary
+    print(f"{report['sources']} sources, {report['articles']} articles: serial {report['serial_s']}s, "
+          f"staged {report['staged_s']}s -> {report['speedup']}x (same outputs: {same})")
+    print_stage_summary(staged["stages"])
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    raise SystemExit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
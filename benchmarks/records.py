@@ -0,0 +1,128 @@
+"""
+RECORDS BENCHMARK
+Memory and stage-handoff cost of article dicts vs. the msgspec records in
+src/data_pipeline/records.py:
+
+    memory      bytes per 10k articles held in a stage (the containers only:
+                the text itself is the same in both and measured separately)
+    process     store -> embed handoff (multiprocessing pickles the batch):
+                pickle of dicts vs. records.encode/decode (msgpack)
+    xcom        legacy fetch/transform/store tasks (JSON in the metadata DB):
+                json of dicts vs. records.to_xcom (one array per record)
+
+    python -m benchmarks.records
+    python -m benchmarks.records --articles 50000 --repeat 5
+"""
+
+import argparse
+import gc
+import json
+import pickle
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+
+def synthesize(count: int, seed: int = 7) -> list:
+    """Article-shaped dicts with realistic field sizes."""
+    rng = random.Random(seed)
+    words = "helsinki startup funding technology company growth investment research data cloud energy".split()
+    rows = []
+    for i in range(count):
+        rows.append({
+            'link_name': f"Source {i % 40} RSS Feed",
+            'title': " ".join(rng.choice(words) for _ in range(9)).capitalize(),
+            'link': f"https://example.fi/uutiset/{i}",
+            'published': "Mon, 05 Jan 2026 10:%02d:00 +0200" % (i % 60),
+            'summary': " ".join(rng.choice(words) for _ in range(45)),
+            'authors': [f"Reporter {i % 13}"],
+            'tags': [rng.choice(words), rng.choice(words)],
+        })
+    return rows
+
+
+def container_bytes(build, rows: list) -> int:
+    """Bytes allocated by `build(rows)`, with the field values already alive."""
+    gc.collect()
+    tracemalloc.start()
+    held = build(rows)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def timed(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark article dicts vs msgspec records")
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    from src.data_pipeline.records import Article, decode, encode, from_dict, from_xcom, to_xcom
+
+    # Both representations reference the same strings; copy only the containers
+    def as_dicts(rs):
+        return [{**r, 'authors': list(r['authors']), 'tags': list(r['tags'])} for r in rs]
+
+    def as_records(rs):
+        return [from_dict(r, Article) for r in as_dicts(rs)]
+
+    rows = synthesize(args.articles)
+    articles = as_records(rows)
+    per_10k = 10000 / args.articles
+    text = sum(len(v) + 49 for r in rows for k, v in r.items() if isinstance(v, str))
+
+    memory = {
+        'dict_kb': container_bytes(as_dicts, rows) * per_10k / 1024,
+        'record_kb': container_bytes(as_records, rows) * per_10k / 1024,
+        'text_kb': text * per_10k / 1024,
+    }
+
+    pickled = pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+    packed = encode(articles)
+    process = {
+        'pickle_dict': {'bytes': len(pickled),
+                        'encode_ms': timed(lambda: pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL), args.repeat),
+                        'decode_ms': timed(lambda: pickle.loads(pickled), args.repeat)},
+        'msgpack_record': {'bytes': len(packed),
+                           'encode_ms': timed(lambda: encode(articles), args.repeat),
+                           'decode_ms': timed(lambda: decode(packed), args.repeat)},
+    }
+
+    as_json = json.dumps(rows)
+    as_xcom = json.dumps(to_xcom(articles))
+    xcom = {
+        'json_dict': {'bytes': len(as_json.encode()),
+                      'encode_ms': timed(lambda: json.dumps(rows), args.repeat),
+                      'decode_ms': timed(lambda: json.loads(as_json), args.repeat)},
+        'json_record': {'bytes': len(as_xcom.encode()),
+                        'encode_ms': timed(lambda: json.dumps(to_xcom(articles)), args.repeat),
+                        'decode_ms': timed(lambda: from_xcom(json.loads(as_xcom), Article), args.repeat)},
+    }
+    assert decode(packed) == articles and from_xcom(json.loads(as_xcom), Article) == articles
+
+    report = {'articles': args.articles, 'memory_per_10k': memory, 'process': process, 'xcom': xcom}
+    print(f"{args.articles} articles")
+    print(f"Memory per 10k articles: dicts {memory['dict_kb'] / 1024:.1f} MB, records {memory['record_kb'] / 1024:.1f} MB "
+          f"(+ {memory['text_kb'] / 1024:.1f} MB of text in both)")
+    print(f"{'handoff':<22}{'KiB':>10}{'encode ms':>12}{'decode ms':>12}")
+    for name, r in {**process, **xcom}.items():
+        print(f"{name:<22}{r['bytes'] / 1024:>10.0f}{r['encode_ms']:>12.1f}{r['decode_ms']:>12.1f}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+ROUTER EVALUATION
+Offline evaluation of the answer router in src/ml_logic/rag.py against a
+labelled question set.
+
+Each line of the question set holds a question, the expected route
+("extractive" or "generative") and the similarities of its retrieval
+candidates. With --live the similarities are recomputed against the
+current corpus instead (needs the database).
+
+    python -m benchmarks.router_eval
+    python -m benchmarks.router_eval --questions benchmarks/data/router_questions.jsonl --live -v
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+DEFAULT_QUESTIONS = os.path.join(os.path.dirname(__file__), "data", "router_questions.jsonl")
+
+
+def load_questions(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def live_hits(question: str) -> list[dict]:
+    from src.ml_logic.context_builder import RAG_CANDIDATE_K
+    from src.ml_logic.vector_db import vectordatabasePg
+
+    vectordatabase = vectordatabasePg()
+    try:
+        rows = vectordatabase.query_similar_articles(question, top_k=RAG_CANDIDATE_K)
+    finally:
+        vectordatabase.close()
+    return [{"similarity": 1.0 - float(r["distance"])} for r in rows]
+
+
+def evaluate(items: list[dict], live: bool = False, verbose: bool = False) -> dict:
+    """
+    Route every question and compare with its label.
+
+    Returns:
+        Dictionary with confusion counts, precision/recall of the extractive
+        route and the mean routing time
+    """
+    from src.ml_logic.rag import route_question
+
+    counts = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+    reasons: dict[str, int] = {}
+    route_time = 0.0
+
+    for item in items:
+        hits = live_hits(item["question"]) if live else [{"similarity": s} for s in item["similarities"]]
+        start = time.perf_counter()
+        decision = route_question(item["question"], hits, filtered=item.get("filtered", False))
+        route_time += time.perf_counter() - start
+
+        predicted_extractive = decision["route"] == "extractive"
+        expected_extractive = item["expected"] == "extractive"
+        key = ("t" if predicted_extractive == expected_extractive else "f") + ("p" if predicted_extractive else "n")
+        counts[key] += 1
+        reasons[decision["reason"]] = reasons.get(decision["reason"], 0) + 1
+
+        if verbose or key in ("fp", "fn"):
+            mark = "ok " if key in ("tp", "tn") else "ERR"
+            print(f"{mark} {decision['route']:<10} conf={decision['confidence']:.2f} "
+                  f"{decision['reason']:<18} {item['question']}")
+
+    precision = counts["tp"] / max(1, counts["tp"] + counts["fp"])
+    recall = counts["tp"] / max(1, counts["tp"] + counts["fn"])
+    return {
+        "questions": len(items),
+        "confusion": counts,
+        "accuracy": round((counts["tp"] + counts["tn"]) / max(1, len(items)), 3),
+        "extractive_precision": round(precision, 3),
+        "extractive_recall": round(recall, 3),
+        "extractive_share": round((counts["tp"] + counts["fp"]) / max(1, len(items)), 3),
+        "reasons": reasons,
+        "mean_route_us": round(route_time / max(1, len(items)) * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the extractive/generative answer router")
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="Labelled JSONL question set")
+    parser.add_argument("--live", action="store_true", help="Recompute similarities against the database")
+    parser.add_argument("--min-precision", type=float, default=0.9,
+                        help="Exit non-zero when extractive precision falls below this")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every decision, not only mistakes")
+    args = parser.parse_args()
+
+    report = evaluate(load_questions(args.questions), live=args.live, verbose=args.verbose)
+    print(json.dumps(report, indent=2))
+    # A wrong extractive answer is worse than a slow generative one
+    sys.exit(0 if report["extractive_precision"] >= args.min_precision else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+ADMISSION CONTROL
+Bounded concurrency, bounded queues, deadline-aware shedding and per-client
+rate limits for the expensive endpoints.
+
+Each lane has its own slots and queue, so a flood of /ask requests waiting on
+the LLM can never starve /search. /health bypasses admission entirely.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from .metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED, ADMISSION_WAIT
+
+# Clients may shorten (never extend) their deadline with this header, in seconds
+DEADLINE_HEADER = "x-request-timeout"
+CLIENT_ID_HEADER = "x-client-id"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the HTTP status and Retry-After."""
+
+    def __init__(self, lane: str, reason: str, retry_after: float, status_code: int = 503):
+        super().__init__(f"{lane}: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+    def to_http(self) -> HTTPException:
+        return HTTPException(
+            status_code=self.status_code,
+            detail=f"Server busy ({self.reason}), retry later",
+            headers={"Retry-After": str(max(1, math.ceil(self.retry_after)))},
+        )
+
+
+def shed(lane: str, reason: str, retry_after: float, status_code: int = 503) -> AdmissionRejected:
+    """Count a shed request and build the exception to raise for it."""
+    ADMISSION_SHED.labels(lane=lane, reason=reason).inc()
+    return AdmissionRejected(lane, reason, retry_after, status_code)
+
+
+class AdmissionLane:
+    """
+    A pool of `max_concurrency` slots with a FIFO wait queue of `max_queue`.
+
+    The expected wait is estimated from the queue position and an EWMA of
+    recent service times; a request whose deadline would pass before it could
+    even start is rejected immediately instead of occupying the queue.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int,
+                 initial_service_time: float = 1.0, ewma_alpha: float = 0.2):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.ewma_alpha = ewma_alpha
+        self.service_time = initial_service_time
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def estimated_wait(self, position: Optional[int] = None) -> float:
+        position = len(self._waiters) + 1 if position is None else position
+        return math.ceil(position / self.max_concurrency) * self.service_time
+
+    async def acquire(self, deadline: float) -> float:
+        """
+        Wait for a slot until `deadline` (time.monotonic()).
+
+        Returns:
+            Seconds spent queued
+        """
+        if self._active < self.max_concurrency and not self._waiters:
+            self._take_slot()
+            ADMISSION_WAIT.labels(lane=self.name).observe(0)
+            return 0.0
+
+        if len(self._waiters) >= self.max_queue:
+            raise shed(self.name, "queue_full", self.estimated_wait())
+
+        now = time.monotonic()
+        estimated = self.estimated_wait()
+        if now + estimated > deadline:
+            raise shed(self.name, "deadline", estimated)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        ADMISSION_QUEUE_DEPTH.labels(lane=self.name).set(len(self._waiters))
+        try:
+            await asyncio.wait_for(future, timeout=max(0.0, deadline - now))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                self._discard(future)
+            if isinstance(e, asyncio.TimeoutError):
+                raise shed(self.name, "timeout", self.estimated_wait())
+            raise
+
+        waited = time.monotonic() - now
+        ADMISSION_WAIT.labels(lane=self.name).observe(waited)
+        return waited
+
+    def release(self, service_time: Optional[float] = None):
+        if service_time is not None:
+            self.service_time += self.ewma_alpha * (service_time - self.service_time)
+
+        # Hand the slot straight to the next live waiter
+        while self._waiters:
+            future = self._waiters.popleft()
+            ADMISSION_QUEUE_DEPTH.labels(lane=self.name).set(len(self._waiters))
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self._active -= 1
+        ADMISSION_ACTIVE.labels(lane=self.name).set(self._active)
+
+    @asynccontextmanager
+    async def slot(self, deadline: float):
+        await self.acquire(deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def _take_slot(self):
+        self._active += 1
+        ADMISSION_ACTIVE.labels(lane=self.name).set(self._active)
+
+    def _discard(self, future: asyncio.Future):
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+        ADMISSION_QUEUE_DEPTH.labels(lane=self.name).set(len(self._waiters))
+
+
+class RateLimiter:
+    """
+    Per-client token buckets: `rate` requests/second sustained, `burst` at once.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_clients: int = 10000):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def check(self, client: str):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, last = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            raise shed(self.name, "rate_limited", (1 - tokens) / self.rate, status_code=429)
+
+        self._buckets[client] = (tokens - 1, now)
+        if len(self._buckets) > self.max_clients:
+            self._prune(now)
+
+    def _prune(self, now: float):
+        # Buckets idle long enough to be full again carry no state
+        refill = self.burst / self.rate
+        self._buckets = {c: b for c, b in self._buckets.items() if now - b[1] < refill}
+
+
+def client_id(request: Request) -> str:
+    forwarded = request.headers.get("x-forwarded-for")
+    return (
+        request.headers.get(CLIENT_ID_HEADER)
+        or (forwarded.split(",")[0].strip() if forwarded else None)
+        or (request.client.host if request.client else "unknown")
+    )
+
+
+def request_deadline(request: Request, default_timeout: float) -> float:
+    """
+    Absolute deadline (time.monotonic()) for a request.
+    """
+    timeout = default_timeout
+    try:
+        timeout = min(default_timeout, float(request.headers.get(DEADLINE_HEADER, default_timeout)))
+    except ValueError:
+        pass
+    return time.monotonic() + max(0.0, timeout)
+
+
+llm_lane = AdmissionLane(
+    "llm",
+    max_concurrency=int(os.getenv("ASK_MAX_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("ASK_MAX_QUEUE", "32")),
+    initial_service_time=float(os.getenv("ASK_INITIAL_SERVICE_TIME", "3")),
+)
+retrieval_lane = AdmissionLane(
+    "retrieval",
+    max_concurrency=int(os.getenv("SEARCH_MAX_CONCURRENCY", "16")),
+    max_queue=int(os.getenv("SEARCH_MAX_QUEUE", "64")),
+    initial_service_time=float(os.getenv("SEARCH_INITIAL_SERVICE_TIME", "0.1")),
+)
+
+ask_rate_limiter = RateLimiter(
+    "llm",
+    rate=float(os.getenv("ASK_RATE_LIMIT_RPS", "0.5")),
+    burst=float(os.getenv("ASK_RATE_LIMIT_BURST", "5")),
+)
+search_rate_limiter = RateLimiter(
+    "retrieval",
+    rate=float(os.getenv("SEARCH_RATE_LIMIT_RPS", "5")),
+    burst=float(os.getenv("SEARCH_RATE_LIMIT_BURST", "20")),
+)
@@ -0,0 +1,247 @@
+"""
+REQUEST COALESCING
+Single-flight de-duplication of identical in-flight /ask requests.
+
+Concurrent requests whose normalized question and corpus version match share
+one in-flight computation. Within a worker this is an asyncio future; across
+workers an optional Postgres advisory lock plus a short-lived answer cache lets
+the first worker compute while the others wait and reuse its result.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .metrics import (
+    COALESCE_CROSS_WORKER,
+    COALESCE_ERRORS,
+    COALESCE_INFLIGHT,
+    COALESCE_REQUESTS,
+    COALESCE_TIMEOUTS,
+)
+
+ASK_TIMEOUT = float(os.getenv("ASK_TIMEOUT", "60"))
+COALESCE_MAX_FLIGHT_AGE = float(os.getenv("ASK_COALESCE_MAX_FLIGHT_AGE", "120"))
+COALESCE_ACROSS_WORKERS = os.getenv("ASK_COALESCE_ACROSS_WORKERS", "false").lower() in ("1", "true", "yes")
+COALESCE_LOCK_TIMEOUT = float(os.getenv("ASK_COALESCE_LOCK_TIMEOUT", "30"))
+COALESCE_CACHE_TTL = float(os.getenv("ASK_COALESCE_CACHE_TTL", "30"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalize a question so trivially different spellings coalesce
+
+    Args:
+        text: Raw question text
+
+    Returns:
+        Case-folded, whitespace-collapsed question without trailing punctuation
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _WS_RE.sub(" ", text).strip()
+    return text.rstrip("?!. ")
+
+
+def coalesce_key(question: str, corpus_version: str, *extra: Any) -> str:
+    """
+    Build the single-flight key for a request
+
+    Args:
+        question: Raw question text
+        corpus_version: Version string of the searchable corpus
+        extra: Any further request parameters that change the answer
+
+    Returns:
+        Hex digest identifying the computation
+    """
+    payload = json.dumps(
+        [normalize_question(question), corpus_version, *extra],
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Share one in-flight asyncio computation between callers with the same key.
+
+    The leader's task is shielded, so a caller timing out never cancels the
+    work for the others. Exceptions raised by the computation are delivered to
+    every caller waiting on it.
+    """
+
+    def __init__(self, max_flight_age: float = COALESCE_MAX_FLIGHT_AGE):
+        self.max_flight_age = max_flight_age
+        self._flights: Dict[str, Tuple[asyncio.Future, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        flight = self._flights.get(key)
+        now = time.monotonic()
+
+        # Join only live flights; a stuck one past its age gets replaced
+        if flight is not None and not flight[0].done() and now - flight[1] < self.max_flight_age:
+            future = flight[0]
+            COALESCE_REQUESTS.labels(role="follower").inc()
+        else:
+            future = asyncio.ensure_future(self._run(key, fn))
+            future.add_done_callback(self._on_done)
+            self._flights[key] = (future, now)
+            COALESCE_REQUESTS.labels(role="leader").inc()
+            COALESCE_INFLIGHT.set(len(self._flights))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            COALESCE_TIMEOUTS.inc()
+            raise
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            return await fn()
+        finally:
+            current = self._flights.get(key)
+            if current is not None and current[0] is asyncio.current_task():
+                del self._flights[key]
+            COALESCE_INFLIGHT.set(len(self._flights))
+
+    @staticmethod
+    def _on_done(future: asyncio.Future):
+        # Retrieve the exception so an abandoned flight never logs "never retrieved"
+        if not future.cancelled() and future.exception() is not None:
+            COALESCE_ERRORS.inc()
+
+
+# -----------------------------
+# Cross-worker coalescing (Postgres advisory locks)
+# -----------------------------
+# The lock connection stays checked out while the computation takes a second
+# pool connection for retrieval, so at most half of the pool may hold locks
+_lock_slots: Dict[int, threading.BoundedSemaphore] = {}
+_lock_slots_guard = threading.Lock()
+
+
+def lock_slots(pool) -> Optional[threading.BoundedSemaphore]:
+    """Semaphore bounding this process's lock connections; None if the pool is too small to share."""
+    with _lock_slots_guard:
+        if pool.pid not in _lock_slots and pool.maxconn >= 2:
+            _lock_slots[pool.pid] = threading.BoundedSemaphore(pool.maxconn // 2)
+        return _lock_slots.get(pool.pid)
+
+
+def run_across_workers(
+    key: str,
+    compute: Callable[[], Any],
+    lock_timeout: float = COALESCE_LOCK_TIMEOUT,
+    cache_ttl: float = COALESCE_CACHE_TTL,
+    cacheable: Callable[[Any], bool] = lambda result: True,
+) -> Any:
+    """
+    Run `compute` at most once across workers for the same key
+
+    The first worker takes a Postgres advisory lock on the key and stores its
+    result in `answer_cache` (created by storage/init.sql) if `cacheable`
+    accepts it; workers blocked on the lock read that result once it is
+    released (or compute their own when it was not stored). The lock is held
+    on a connection from this worker's pool (ml_logic.storage.get_pool), so
+    it counts against DB_POOL_SIZE; at most half of the pool holds locks
+    (lock_slots). Falls back to computing locally if no lock slot or
+    connection is available or the lock wait exceeds `lock_timeout`.
+
+    Args:
+        key: Single-flight key from coalesce_key()
+        compute: Blocking function producing a JSON-serializable result
+        lock_timeout: Seconds to wait for another worker's computation
+        cache_ttl: Seconds a stored answer may be reused
+        cacheable: Whether a computed result may be stored for reuse
+
+    Returns:
+        The computed or reused result
+    """
+    import psycopg2
+    from ..ml_logic.storage import get_pool
+
+    try:
+        pool = get_pool()
+    except Exception as e:
+        print(f"WARNING: No connection for cross-worker coalescing ({e}); computing locally")
+        COALESCE_CROSS_WORKER.labels(result="no_connection").inc()
+        return compute()
+    slots = lock_slots(pool)
+    if slots is None or not slots.acquire(blocking=False):
+        COALESCE_CROSS_WORKER.labels(result="no_slot").inc()
+        return compute()
+    try:
+        conn = pool.getconn()
+    except Exception as e:
+        slots.release()
+        print(f"WARNING: No connection for cross-worker coalescing ({e}); computing locally")
+        COALESCE_CROSS_WORKER.labels(result="no_connection").inc()
+        return compute()
+
+    try:
+        with conn.cursor() as cur:
+            # Session setting on a pooled connection: reset before handing it back
+            cur.execute("SET lock_timeout = %s", (f"{int(lock_timeout * 1000)}ms",))
+            try:
+                cur.execute("SELECT pg_advisory_lock(hashtextextended(%s, 0))", (key,))
+                locked = True
+            except psycopg2.errors.LockNotAvailable:
+                COALESCE_CROSS_WORKER.labels(result="lock_timeout").inc()
+                locked = False
+            cur.execute("RESET lock_timeout")
+
+            if locked:
+                try:
+                    return _reuse_or_store(cur, key, compute, cache_ttl, cacheable)
+                finally:
+                    cur.execute("SELECT pg_advisory_unlock(hashtextextended(%s, 0))", (key,))
+    finally:
+        pool.putconn(conn)
+        slots.release()
+    # Not coalesced: don't keep a pool connection while computing
+    return compute()
+
+
+def _reuse_or_store(cur, key: str, compute: Callable[[], Any], cache_ttl: float,
+                    cacheable: Callable[[Any], bool]) -> Any:
+    """Under the advisory lock: the cached answer for `key`, or compute and store it."""
+    from psycopg2.extras import Json
+
+    cur.execute(
+        """
+        SELECT answer FROM answer_cache
+        WHERE cache_key = %s AND created_at > now() - make_interval(secs => %s)
+        """,
+        (key, cache_ttl),
+    )
+    row = cur.fetchone()
+    if row is not None:
+        COALESCE_CROSS_WORKER.labels(result="hit").inc()
+        return row[0]
+
+    COALESCE_CROSS_WORKER.labels(result="miss").inc()
+    result = compute()
+    if cacheable(result):
+        cur.execute(
+            """
+            INSERT INTO answer_cache (cache_key, answer, created_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (cache_key) DO UPDATE
+            SET answer = EXCLUDED.answer, created_at = EXCLUDED.created_at
+            """,
+            (key, Json(result)),
+        )
+    return result
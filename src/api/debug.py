@@ -0,0 +1,306 @@
+"""
+DEBUG ENDPOINTS
+Admin-only introspection of a live worker, for latency spikes that cannot be
+reproduced locally:
+
+    GET /debug/profile?seconds=10   sampling profile of every thread
+                                    (collapsed stacks or speedscope JSON)
+    GET /debug/requests             in-flight requests, their RAG stage and age
+    GET /debug/gc                   GC counters, pause times and allocation stats
+    GET /debug/explain?q=...        EXPLAIN ANALYZE of the /ask similarity query
+
+Disabled unless API_DEBUG_TOKEN is set: the routes, the in-flight tracker
+and the GC callback are then not installed at all. Requests must send the
+token in the X-Debug-Token header. Under gunicorn every call inspects the
+worker that happens to serve it (see the X-Worker-Pid response header).
+"""
+
+import asyncio
+import gc
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from ..ml_logic.request_stats import CURRENT_REQUEST
+
+DEBUG_TOKEN = os.getenv("API_DEBUG_TOKEN", "")
+DEBUG_ENABLED = bool(DEBUG_TOKEN)
+PROFILE_MAX_SECONDS = float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60"))
+PROFILE_DEFAULT_INTERVAL_MS = float(os.getenv("DEBUG_PROFILE_INTERVAL_MS", "10"))
+
+StackKey = Tuple[str, Tuple[Tuple[str, str, int], ...]]
+
+
+def require_token(x_debug_token: str = Header("")):
+    if not DEBUG_ENABLED or not hmac.compare_digest(x_debug_token, DEBUG_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+router = APIRouter(prefix="/debug", dependencies=[Depends(require_token)], include_in_schema=False)
+
+
+# -----------------------------
+# Sampling profiler
+# -----------------------------
+class SamplingProfiler(threading.Thread):
+    """
+    Samples the Python stack of every other thread at a fixed interval.
+
+    Only runs while a /debug/profile request is active; the rest of the time
+    the process is not instrumented at all.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name="debug-sampler", daemon=True)
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.ticks = 0
+        self.halted = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.halted.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, frame.f_lineno))
+                    frame = frame.f_back
+                self.samples[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+            self.ticks += 1
+
+    def stop(self):
+        self.halted.set()
+        self.join()
+
+
+def frame_label(frame: Tuple[str, str, int]) -> str:
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def to_collapsed(samples: Dict[StackKey, int]) -> str:
+    """Brendan Gregg's folded format: `thread;outer;...;inner count` per line."""
+    lines = []
+    for (thread, stack), count in sorted(samples.items(), key=lambda kv: -kv[1]):
+        frames = ";".join(frame_label(f).replace(";", ":") for f in stack)
+        lines.append(f"{thread};{frames} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def to_speedscope(samples: Dict[StackKey, int], interval_ms: float, name: str) -> Dict[str, Any]:
+    """One sampled speedscope profile per thread, weights in milliseconds."""
+    frames: List[Dict[str, Any]] = []
+    index: Dict[Tuple[str, str, int], int] = {}
+    profiles: Dict[str, Dict[str, Any]] = {}
+    for (thread, stack), count in samples.items():
+        ids = []
+        for f in stack:
+            if f not in index:
+                index[f] = len(frames)
+                frames.append({"name": f[0], "file": f[1], "line": f[2]})
+            ids.append(index[f])
+        profile = profiles.setdefault(thread, {
+            "type": "sampled", "name": thread, "unit": "milliseconds",
+            "startValue": 0, "endValue": 0, "samples": [], "weights": [],
+        })
+        profile["samples"].append(ids)
+        profile["weights"].append(count * interval_ms)
+        profile["endValue"] += count * interval_ms
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "api-debug-sampler",
+        "shared": {"frames": frames},
+        "profiles": list(profiles.values()),
+    }
+
+
+_profile_lock = asyncio.Lock()
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(PROFILE_DEFAULT_INTERVAL_MS, ge=1, le=1000),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+):
+    """
+    Sample all threads of this worker for `seconds` and return the profile.
+    One profile at a time per worker; others get 409.
+    """
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+
+    async with _profile_lock:
+        sampler = SamplingProfiler(interval_ms / 1000)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+
+    headers = {"X-Worker-Pid": str(os.getpid()), "X-Profile-Samples": str(sampler.ticks)}
+    if format == "speedscope":
+        name = f"api pid {os.getpid()} {time.strftime('%Y-%m-%dT%H:%M:%S')} {seconds:g}s"
+        headers["Content-Disposition"] = f'attachment; filename="profile-{os.getpid()}.speedscope.json"'
+        return JSONResponse(to_speedscope(sampler.samples, interval_ms, name), headers=headers)
+    return PlainTextResponse(to_collapsed(sampler.samples), headers=headers)
+
+
+# -----------------------------
+# In-flight requests
+# -----------------------------
+_inflight: Dict[int, Dict[str, Any]] = {}
+_request_ids = itertools.count(1)
+
+
+class InflightRequests:
+    """
+    ASGI middleware keeping a record per running HTTP request. The record is
+    exposed through CURRENT_REQUEST so RequestStats can set the RAG stage.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = next(_request_ids)
+        record = {
+            "id": request_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "started": time.time(),
+            "stage": None,
+        }
+        _inflight[request_id] = record
+        token = CURRENT_REQUEST.set(record)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            CURRENT_REQUEST.reset(token)
+            _inflight.pop(request_id, None)
+
+
+@router.get("/requests")
+async def inflight_requests(response: Response):
+    """Requests currently running in this worker, oldest first."""
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    now = time.time()
+    requests = [
+        {**r, "stage": r["stage"] or "handler", "age_ms": round((now - r["started"]) * 1000, 1)}
+        for r in list(_inflight.values())
+    ]
+    return {"pid": os.getpid(), "count": len(requests), "requests": sorted(requests, key=lambda r: -r["age_ms"])}
+
+
+# -----------------------------
+# GC and allocation stats
+# -----------------------------
+_gc_pauses = [{"count": 0, "total_ms": 0.0, "max_ms": 0.0} for _ in range(3)]
+_gc_started: Optional[float] = None
+
+
+def record_gc_pause(phase: str, info: Dict[str, Any]):
+    global _gc_started
+    if phase == "start":
+        _gc_started = time.perf_counter()
+    elif _gc_started is not None:
+        ms = (time.perf_counter() - _gc_started) * 1000
+        pauses = _gc_pauses[info["generation"]]
+        pauses["count"] += 1
+        pauses["total_ms"] += ms
+        pauses["max_ms"] = max(pauses["max_ms"], ms)
+        _gc_started = None
+
+
+@router.get("/gc")
+async def gc_stats(response: Response, objects: bool = Query(False, description="Count live objects by type (slow)")):
+    """Collector state and pause times since start-up, plus allocation counters."""
+    import psutil
+
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    memory = psutil.Process().memory_full_info()
+    stats: Dict[str, Any] = {
+        "pid": os.getpid(),
+        "gc": {
+            "enabled": gc.isenabled(),
+            "thresholds": gc.get_threshold(),
+            "counts": gc.get_count(),
+            "frozen_objects": gc.get_freeze_count(),
+            "generations": [
+                {**s, **{k: round(v, 3) for k, v in p.items()}} for s, p in zip(gc.get_stats(), _gc_pauses)
+            ],
+        },
+        "allocations": {
+            "allocated_blocks": sys.getallocatedblocks(),
+            "rss_mb": round(memory.rss / 1024 / 1024, 1),
+            "uss_mb": round(memory.uss / 1024 / 1024, 1),
+        },
+    }
+
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:20]
+        stats["tracemalloc"] = {
+            "current_mb": round(current / 1024 / 1024, 1),
+            "peak_mb": round(peak / 1024 / 1024, 1),
+            "top": [str(s) for s in top],
+        }
+    if objects:
+        counts = Counter(type(o).__qualname__ for o in gc.get_objects())
+        stats["objects"] = dict(counts.most_common(30))
+    return stats
+
+
+# -----------------------------
+# Retrieval explain
+# -----------------------------
+@router.get("/explain")
+async def explain(
+    q: str = Query(..., min_length=1),
+    top_k: int = Query(5, ge=1, le=100),
+    source: Optional[List[str]] = Query(None),
+    tag: Optional[List[str]] = Query(None),
+    published_from: Optional[datetime] = None,
+    published_to: Optional[datetime] = None,
+):
+    """
+    Plan, index usage, buffers and timings of the similarity query /ask would
+    run for `q`. The query is executed (EXPLAIN ANALYZE).
+    """
+    from ..ml_logic.explain import explain_query
+    from ..ml_logic.filters import SearchFilters
+
+    filters = SearchFilters(sources=source or [], tags=tag or [],
+                            published_from=published_from, published_to=published_to)
+    try:
+        return await run_in_threadpool(explain_query, q, top_k, filters)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Explain failed: {e}")
+
+
+def install(app: FastAPI):
+    """Register the debug routes, the in-flight tracker and GC timing on `app`."""
+    app.add_middleware(InflightRequests)
+    app.include_router(router)
+    gc.callbacks.append(record_gc_pause)
+    print(f"INFO: Debug endpoints enabled under /debug (pid {os.getpid()})")
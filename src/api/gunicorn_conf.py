@@ -0,0 +1,66 @@
+"""
+GUNICORN CONFIG
+Production serving: one master, WEB_CONCURRENCY uvicorn workers.
+
+    gunicorn -c src/api/gunicorn_conf.py src.api.main:app
+
+The app is imported and warmed up in the master (preload_app), then the
+heap is frozen so forked workers share those pages copy-on-write instead of
+each paying the import time and memory. See docs/scaling.md.
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers slowly to bound fragmentation; jitter avoids synchronized restarts
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+accesslog = os.getenv("GUNICORN_ACCESSLOG")
+errorlog = "-"
+
+# Workers read these at import/first use, so they must be set before the
+# app is preloaded: the metrics directory must exist and start empty, and
+# every worker gets the same connection pool size
+os.environ["WEB_CONCURRENCY"] = str(workers)
+_multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus")
+shutil.rmtree(_multiproc_dir, ignore_errors=True)
+os.makedirs(_multiproc_dir, exist_ok=True)
+
+
+def on_starting(server):
+    from src.ml_logic.storage import pool_size_per_worker
+
+    if not os.getenv("DB_POOL_SIZE"):
+        os.environ["DB_POOL_SIZE"] = str(pool_size_per_worker(workers))
+    server.log.info(f"{workers} workers, {os.environ['DB_POOL_SIZE']} DB connections per worker")
+
+
+def when_ready(server):
+    # Runs in the master after the app was preloaded and before the first fork
+    from src.api.main import warm_up
+
+    try:
+        warm_up()
+    except Exception as e:
+        # Workers still serve; they load what's missing on first use
+        server.log.warning(f"Warm-up failed: {e}")
+    # Move everything allocated so far out of the collector's generations:
+    # later collections in the workers won't touch (and copy) these pages
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Preloaded app; {gc.get_freeze_count()} objects frozen")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
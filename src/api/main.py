@@ -1,11 +1,28 @@
-from typing import Union
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+from typing import List, Union
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import uvicorn
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import multiprocess
 from prometheus_fastapi_instrumentator import Instrumentator, metrics
 
+from .coalesce import (
+    ASK_TIMEOUT,
+    COALESCE_ACROSS_WORKERS,
+    SingleFlight,
+    coalesce_key,
+    run_across_workers,
+)
+from .admission import AdmissionRejected, ask_rate_limiter, client_id, llm_lane, request_deadline
+from . import debug
+from ..data_pipeline.tracing import extract_context, init_tracing, shutdown_tracing, span
+from .search import router as search_router
+
 # DO NOT import rag functions here - causes circular import
 # from ..ml_logic.rag import answer_questions, answer_question_for_postgre
 
@@ -17,7 +34,21 @@ app = FastAPI(
 
 class Question(BaseModel):
     question: str
+    # Free-text source hint, e.g. "Yle" or "Helsinki Times"
     context: Union[str, None] = None
+    sources: Union[List[str], None] = None
+    published_from: Union[datetime, None] = None
+    published_to: Union[datetime, None] = None
+    tags: Union[List[str], None] = None
+
+    def to_filters(self):
+        from ..ml_logic.filters import SearchFilters
+        return SearchFilters(
+            sources=self.sources or [],
+            published_from=self.published_from,
+            published_to=self.published_to,
+            tags=self.tags or [],
+        )
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +57,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(search_router)
+
+# Admin-only /debug routes; nothing is installed unless API_DEBUG_TOKEN is set
+if debug.DEBUG_ENABLED:
+    debug.install(app)
+
+# Default HTTP metrics plus everything registered in api/metrics.py and
+# ml_logic/metrics.py. With several workers, PROMETHEUS_MULTIPROC_DIR must be
+# set (and emptied) before start-up; /metrics then aggregates all workers.
+instrumentator = Instrumentator(
+    should_group_status_codes=False,
+    should_ignore_untemplated=True,
+    excluded_handlers=["/metrics", "/health"],
+)
+instrumentator.add(metrics.default())
+instrumentator.instrument(app).expose(app, include_in_schema=False)
+
+
+@app.on_event("startup")
+def start_tracing():
+    # OTEL_TRACES_EXPORTER=console|file|otlp; disabled by default
+    init_tracing(os.getenv("OTEL_SERVICE_NAME", "rag-api"))
+
+
+@app.on_event("shutdown")
+def mark_metrics_process_dead():
+    # Drops this worker's live gauges from the multiprocess aggregate
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+    shutdown_tracing()
+
+# Identical in-flight questions share one retrieval + generation
+ask_flights = SingleFlight()
+
+
+def warm_up():
+    """
+    Import and exercise the request path once, without opening connections.
+    Called in the gunicorn master so workers inherit the loaded modules.
+    """
+    from ..ml_logic import rag
+    from ..ml_logic.vector_db import encode_query
+
+    encode_query("warm up")
+    rag.route_question("warm up", [])
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -36,21 +113,60 @@ async def health_check():
     }
 
 @app.post("/ask")
-async def asking(question: Question):
+async def asking(question: Question, request: Request):
     """
     Endpoint to answer questions using the provided context.
-    Import rag functions here to avoid circular imports.
+
+    Admission: per-client rate limit on arrival; the coalesced computation
+    then waits for an LLM slot and is shed with 503 + Retry-After when the
+    queue is full or the wait would run past the request deadline.
     """
-    # Import inside the function - only when endpoint is called
-    from ..ml_logic.rag import answer_question_for_postgre
-    
     print(question)
-    
-    if question.context:
-        return {"answer": answer_question_for_postgre(question.question, question.context)}
-    else:
-        return {"answer": answer_question_for_postgre(question.question)}
+
+    try:
+        ask_rate_limiter.check(client_id(request))
+    except AdmissionRejected as e:
+        raise e.to_http()
+    deadline = request_deadline(request, ASK_TIMEOUT)
+
+    with span("ask", {"ask.question_chars": len(question.question)}, parent=extract_context(request.headers)):
+        return await answer(question, deadline)
+
+
+async def answer(question: Question, deadline: float):
+    """
+    Coalesced, admission-controlled RAG answer for /ask (runs in the "ask" span).
+    Import rag functions here to avoid circular imports.
+    """
+    from ..ml_logic.rag import is_cacheable, run_rag_query
+    from ..ml_logic.vector_db import get_corpus_version
+
+    filters = question.to_filters()
+    corpus_version = await run_in_threadpool(get_corpus_version)
+    key = coalesce_key(question.question, corpus_version, question.context, filters.cache_key())
+
+    def compute():
+        return run_rag_query(question.question, filters=filters, source_hint=question.context, deadline=deadline)
+
+    async def run():
+        async with llm_lane.slot(deadline):
+            if COALESCE_ACROSS_WORKERS:
+                return await run_in_threadpool(run_across_workers, key, compute, cacheable=is_cacheable)
+            return await run_in_threadpool(compute)
+
+    try:
+        result = await ask_flights.do(key, run, timeout=max(0.0, deadline - time.monotonic()))
+    except AdmissionRejected as e:
+        raise e.to_http()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out waiting for an answer")
+    except Exception as e:
+        print(f"ERROR in /ask: {e}")
+        raise HTTPException(status_code=500, detail=f"Exception: {e}")
+
+    return {"answer": result["answer"], "stats": result["stats"]}
 
 
 if __name__ == "__main__":
+    # Development server; production runs gunicorn -c src/api/gunicorn_conf.py
     uvicorn.run(app)
\ No newline at end of file
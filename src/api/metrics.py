@@ -0,0 +1,65 @@
+"""
+API METRICS
+Prometheus metrics owned by the HTTP layer (request coalescing, admission control)
+
+Gauges use multiprocess_mode="livesum" so that under PROMETHEUS_MULTIPROC_DIR
+the exposed value is the sum over live workers.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# -----------------------------
+# Request coalescing
+# -----------------------------
+COALESCE_REQUESTS = Counter(
+    "ask_coalesce_requests_total",
+    "Requests entering the /ask single-flight, by role (leader runs the work, follower joins it)",
+    ["role"],
+)
+COALESCE_TIMEOUTS = Counter(
+    "ask_coalesce_timeouts_total",
+    "Requests that gave up waiting on an in-flight /ask computation",
+)
+COALESCE_ERRORS = Counter(
+    "ask_coalesce_errors_total",
+    "Single-flight computations that finished with an exception",
+)
+COALESCE_INFLIGHT = Gauge(
+    "ask_coalesce_inflight",
+    "Distinct /ask computations currently in flight in this worker",
+    multiprocess_mode="livesum",
+)
+COALESCE_CROSS_WORKER = Counter(
+    "ask_coalesce_cross_worker_total",
+    "Cross-worker coalescing outcomes (hit = answer reused from another worker)",
+    ["result"],
+)
+
+
+# -----------------------------
+# Admission control
+# -----------------------------
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for a slot, per lane",
+    ["lane"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_ACTIVE = Gauge(
+    "admission_active",
+    "Requests holding a slot, per lane",
+    ["lane"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time spent queued before getting a slot, per lane",
+    ["lane"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+ADMISSION_SHED = Counter(
+    "admission_shed_total",
+    "Requests rejected by admission control, per lane and reason",
+    ["lane", "reason"],
+)
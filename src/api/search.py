@@ -0,0 +1,128 @@
+"""
+SEARCH ENDPOINT
+Retrieval-only ranked search: no LLM call, keyset pagination, field
+selection and corpus-version ETags so nginx and browsers can cache it.
+"""
+
+import base64
+import hashlib
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from .admission import AdmissionRejected, client_id, request_deadline, retrieval_lane, search_rate_limiter
+from .coalesce import normalize_question
+
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "50"))
+SEARCH_CACHE_MAX_AGE = int(os.getenv("SEARCH_CACHE_MAX_AGE", "60"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "10"))
+
+router = APIRouter()
+
+
+def encode_cursor(distance: float, article_id: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([distance, article_id])).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        distance, article_id = orjson.loads(base64.urlsafe_b64decode(padded))
+        return float(distance), int(article_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def search_etag(corpus_version: str, *params) -> str:
+    payload = orjson.dumps([corpus_version, *params], option=orjson.OPT_NON_STR_KEYS, default=str)
+    return 'W/"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of `etag` against each entry of an If-None-Match list.
+    """
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (t.removeprefix("W/") for t in tags)
+
+
+@router.get("/search")
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Search text"),
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields, e.g. title,link,score"),
+    source: Optional[List[str]] = Query(None),
+    published_from: Optional[datetime] = None,
+    published_to: Optional[datetime] = None,
+    tag: Optional[List[str]] = Query(None),
+):
+    """
+    Ranked articles with similarity scores, without generating an answer.
+    """
+    from ..ml_logic.filters import SearchFilters
+    from ..ml_logic.vector_db import DEFAULT_SEARCH_COLUMNS, SEARCH_COLUMNS, get_corpus_version, vectordatabasePg
+
+    try:
+        search_rate_limiter.check(client_id(request))
+    except AdmissionRejected as e:
+        raise e.to_http()
+    deadline = request_deadline(request, SEARCH_TIMEOUT)
+
+    limit = min(limit, SEARCH_MAX_LIMIT)
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else [*DEFAULT_SEARCH_COLUMNS, "score"]
+    unknown = [f for f in requested if f not in SEARCH_COLUMNS and f != "score"]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    filters = SearchFilters(
+        sources=source or [],
+        published_from=published_from,
+        published_to=published_to,
+        tags=tag or [],
+    )
+    after = decode_cursor(cursor) if cursor else None
+
+    corpus_version = await run_in_threadpool(get_corpus_version)
+    etag = search_etag(corpus_version, normalize_question(q), limit, cursor, requested, filters.cache_key())
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={SEARCH_CACHE_MAX_AGE}"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    def run():
+        vectordatabase = vectordatabasePg()
+        try:
+            return vectordatabase.search_articles(
+                q, limit=limit, filters=filters, after=after,
+                columns=[f for f in requested if f != "score"],
+            )
+        finally:
+            vectordatabase.close()
+
+    try:
+        async with retrieval_lane.slot(deadline):
+            rows = await run_in_threadpool(run)
+    except AdmissionRejected as e:
+        raise e.to_http()
+
+    results = []
+    for row in rows:
+        row["score"] = round(1.0 - float(row["distance"]), 6)
+        results.append({f: row[f] for f in requested})
+
+    next_cursor = encode_cursor(float(rows[-1]["distance"]), rows[-1]["id"]) if len(rows) == limit else None
+    payload = {
+        "query": q,
+        "results": results,
+        "next_cursor": next_cursor,
+        "corpus_version": corpus_version,
+    }
+    return Response(content=orjson.dumps(payload), media_type="application/json", headers=headers)
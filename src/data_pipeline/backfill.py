@@ -0,0 +1,552 @@
+"""
+BACKFILL MODULE
+Responsible for bulk-loading historical archives into the articles table
+
+run_pipeline commits and embeds per feed, which is fine for a few new
+entries per source but takes days for an archive. A backfill runs in four
+phases instead:
+
+    read    parse local files in a process pool: recorded feeds (.xml, .rss,
+            .atom), article dumps (.jsonl, .json) and handoff files
+            (.parquet, see tasks.py); entries are translated unless
+            --translated, article dumps never are
+    load    COPY into a temporary staging table, then one INSERT ... SELECT
+            ... ON CONFLICT (link) DO NOTHING per --flush-rows
+    embed   encode articles without an embedding in large batches
+            (vector_db.encode_batch) in the process pool, COPY the vectors
+            into a staging table and UPDATE once per batch
+    index   recreate the secondary indexes on articles (including the ANN
+            index) that were dropped before the load
+
+    python -m src.data_pipeline.backfill /archive/feeds /archive/dumps --workers 8
+    python -m src.data_pipeline.backfill /archive/dumps --translated --skip-embed
+
+Restartable: a file is recorded in backfill_files in the same transaction
+that merges its rows, so an interrupted backfill skips the files already
+loaded (same size and mtime); embed picks up the rows still without an
+embedding; the dropped index definitions are kept in backfill_indexes
+until they are rebuilt. High-water marks (state.py) are left untouched.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .records import Article, Entry, from_dict
+
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", str(os.cpu_count() or 4)))
+FLUSH_ROWS = int(os.getenv("BACKFILL_FLUSH_ROWS", "50000"))
+EMBED_BATCH = int(os.getenv("BACKFILL_EMBED_BATCH", "5000"))
+MAINTENANCE_WORK_MEM = os.getenv("BACKFILL_MAINTENANCE_WORK_MEM", "1GB")
+
+FEED_SUFFIXES = (".xml", ".rss", ".atom")
+DUMP_SUFFIXES = (".jsonl", ".json", ".parquet")
+COLUMNS = ("link_name", "title", "link", "published", "published_at", "summary", "authors", "tags")
+MAX_SUMMARY = 10000
+
+BACKFILL_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS backfill_files (
+        path TEXT PRIMARY KEY,
+        bytes BIGINT,
+        mtime DOUBLE PRECISION,
+        rows INT,
+        loaded_at TIMESTAMPTZ DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS backfill_indexes (
+        name TEXT PRIMARY KEY,
+        definition TEXT NOT NULL,
+        dropped_at TIMESTAMPTZ DEFAULT now()
+    );
+"""
+
+
+# -----------------------------
+# Read phase (worker processes)
+# -----------------------------
+def list_files(paths: List[str]) -> List[str]:
+    """Supported files under `paths` (files or directories), sorted."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in names if n.endswith(FEED_SUFFIXES + DUMP_SUFFIXES))
+        else:
+            files.append(path)
+    return sorted(os.path.abspath(f) for f in files)
+
+
+def source_name(path: str) -> str:
+    """Source of a recorded feed: its manifest.json entry, or the file name."""
+    manifest = os.path.join(os.path.dirname(path), "manifest.json")
+    if os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            for feed in json.load(f):
+                if feed.get("file") == os.path.basename(path):
+                    return feed.get("name") or feed["file"]
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        yield from pq.read_table(path).to_pylist()
+    elif path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        yield from data.get("articles", []) if isinstance(data, dict) else data
+
+
+def read_file(path: str, translate: bool) -> List[Article]:
+    """
+    Articles of one archive file. Rows with a link_name are stored articles
+    (already translated); anything else is a feed entry and goes through
+    parse (and translation, if `translate`).
+    """
+    from .parse import parse_rss_feed_articles, translate_articles
+
+    name = source_name(path)
+    if path.endswith(FEED_SUFFIXES):
+        from .feed_stream import iter_entries
+        entries, articles = list(iter_entries(path)), []
+    else:
+        entries, articles = [], []
+        for row in read_rows(path):
+            if row.get('link_name'):
+                articles.append(from_dict(row, Article))
+            else:
+                entries.append(from_dict(row, Entry))
+    if entries:
+        parsed = parse_rss_feed_articles(entries, name, translate=False)
+        articles.extend(translate_articles(parsed) if translate else parsed)
+    return articles
+
+
+def pg_array(values: List[str]) -> str:
+    return "{" + ",".join('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values) + "}"
+
+
+def to_csv(articles: List[Article]) -> Tuple[str, int]:
+    """
+    COPY (FORMAT csv) payload of the valid articles.
+
+    Returns:
+        (csv text, number of invalid articles dropped)
+    """
+    from .parse import parse_published
+
+    out = io.StringIO()
+    writer = csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    invalid = 0
+    for a in articles:
+        if not a.title or not a.link or len(a.title) > 1000:
+            invalid += 1
+            continue
+        summary = a.summary if len(a.summary) <= MAX_SUMMARY else a.summary[:MAX_SUMMARY] + '...'
+        published_at = parse_published(a.published)
+        writer.writerow((a.link_name, a.title, a.link, a.published,
+                         published_at.isoformat() if published_at else "",
+                         summary, pg_array(a.authors), pg_array(a.tags)))
+    return out.getvalue(), invalid
+
+
+def load_file(path: str, translate: bool) -> Dict[str, Any]:
+    """Worker: read, parse and serialize one file for COPY."""
+    start = time.perf_counter()
+    try:
+        articles = read_file(path, translate)
+        payload, invalid = to_csv(articles)
+        return {'path': path, 'csv': payload, 'rows': len(articles) - invalid, 'invalid': invalid,
+                'seconds': time.perf_counter() - start}
+    except Exception as e:
+        return {'path': path, 'error': f"{type(e).__name__}: {e}", 'rows': 0, 'invalid': 0,
+                'seconds': time.perf_counter() - start}
+
+
+def embed_rows(rows: List[Tuple[int, str, str]]) -> str:
+    """Worker: COPY (FORMAT text) payload of (id, embedding) for a batch of rows."""
+    from .vector_db import EMBED_DIM, embedding_text, encode_batch, vector_literal
+
+    texts = [embedding_text({'title': title, 'summary': summary}) for _, title, summary in rows]
+    vectors = encode_batch(texts, EMBED_DIM)
+    return "".join(f"{row[0]}\t{vector_literal(vector)}\n" for row, vector in zip(rows, vectors))
+
+
+# -----------------------------
+# Database
+# -----------------------------
+def ensure_backfill_tables(conn):
+    with conn.cursor() as cur:
+        cur.execute(BACKFILL_TABLES_SQL)
+    conn.commit()
+
+
+def loaded_files(conn) -> Dict[str, Tuple[int, float]]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT path, bytes, mtime FROM backfill_files")
+        return {path: (size, mtime) for path, size, mtime in cur.fetchall()}
+
+
+def drop_secondary_indexes(conn) -> List[str]:
+    """
+    Drop the non-unique indexes on articles (btree, GIN and the ANN index);
+    their definitions are saved first so an interrupted backfill can still
+    rebuild them. The primary key and UNIQUE(link) stay: the merge needs it.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT i.relname, pg_get_indexdef(i.oid)
+            FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = 'articles'::regclass AND NOT x.indisunique AND NOT x.indisprimary
+            """
+        )
+        indexes = cur.fetchall()
+        for name, definition in indexes:
+            cur.execute("INSERT INTO backfill_indexes (name, definition) VALUES (%s, %s) ON CONFLICT (name) DO NOTHING",
+                        (name, definition))
+        conn.commit()
+        for name, _ in indexes:
+            cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+    conn.commit()
+    return [name for name, _ in indexes]
+
+
+def rebuild_indexes(conn) -> List[str]:
+    """Recreate the indexes saved by drop_secondary_indexes, one commit each."""
+    rebuilt = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT name, definition FROM backfill_indexes ORDER BY dropped_at, name")
+        pending = cur.fetchall()
+        if pending:
+            cur.execute("SET maintenance_work_mem = %s", (MAINTENANCE_WORK_MEM,))
+        for name, definition in pending:
+            print(f"INFO: 🏗️ Building index {name}...")
+            cur.execute("SELECT to_regclass(%s)", (name,))
+            if cur.fetchone()[0] is None:
+                cur.execute(definition)
+            cur.execute("DELETE FROM backfill_indexes WHERE name = %s", (name,))
+            conn.commit()
+            rebuilt.append(name)
+        if rebuilt:
+            cur.execute("ANALYZE articles")
+    conn.commit()
+    return rebuilt
+
+
+def create_staging(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS articles_backfill (
+                link_name TEXT, title TEXT, link TEXT, published TEXT, published_at TIMESTAMPTZ,
+                summary TEXT, authors TEXT[], tags TEXT[]
+            ) ON COMMIT DELETE ROWS
+            """
+        )
+    conn.commit()
+
+
+def copy_rows(conn, payload: str):
+    with conn.cursor() as cur:
+        cur.copy_expert(
+            f"COPY articles_backfill ({', '.join(COLUMNS)}) FROM STDIN "
+            "WITH (FORMAT csv, FORCE_NULL (published_at))",
+            io.StringIO(payload)
+        )
+
+
+def merge_staging(conn, files: List[Dict[str, Any]], enqueue: bool = True) -> int:
+    """
+    Move the staged rows into articles (first row per link wins, existing
+    links are skipped) and record `files` as loaded, in one transaction.
+
+    Args:
+        conn: Database connection
+        files: Staged files to record as loaded
+        enqueue: Let the articles triggers queue the new rows for
+            embed_worker.py; off when the embed phase embeds them
+
+    Returns:
+        Number of new articles
+    """
+    from psycopg2.extras import execute_values
+
+    from .embed_worker import SKIP_QUEUE_SETTING
+
+    columns = ", ".join(COLUMNS)
+    with conn.cursor() as cur:
+        if not enqueue:
+            cur.execute("SELECT set_config(%s, 'on', true)", (SKIP_QUEUE_SETTING,))
+        cur.execute(
+            f"""
+            INSERT INTO articles ({columns})
+            SELECT DISTINCT ON (link) {columns} FROM articles_backfill ORDER BY link
+            ON CONFLICT (link) DO NOTHING
+            """
+        )
+        stored = cur.rowcount
+        execute_values(
+            cur,
+            """
+            INSERT INTO backfill_files (path, bytes, mtime, rows) VALUES %s
+            ON CONFLICT (path) DO UPDATE SET bytes = EXCLUDED.bytes, mtime = EXCLUDED.mtime,
+                rows = EXCLUDED.rows, loaded_at = now()
+            """,
+            [(f['path'], f['bytes'], f['mtime'], f['rows']) for f in files]
+        )
+    conn.commit()
+    return stored
+
+
+# -----------------------------
+# Phases
+# -----------------------------
+class PhaseTimer:
+    """Rows and seconds per phase."""
+
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, float]] = {}
+
+    def add(self, phase: str, seconds: float, rows: int = 0):
+        p = self.phases.setdefault(phase, {'rows': 0, 'seconds': 0.0})
+        p['rows'] += rows
+        p['seconds'] += seconds
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            phase: {'rows': int(p['rows']), 'seconds': round(p['seconds'], 3),
+                    'rows_per_s': round(p['rows'] / p['seconds'], 1) if p['seconds'] else 0.0}
+            for phase, p in self.phases.items()
+        }
+
+
+def bounded(executor: ProcessPoolExecutor, fn, jobs: List[tuple], in_flight: int) -> Iterator[Any]:
+    """Results of fn(*job), at most `in_flight` jobs queued at a time (completion order)."""
+    jobs = iter(jobs)
+    pending = set()
+    while True:
+        for job in jobs:
+            pending.add(executor.submit(fn, *job))
+            if len(pending) >= in_flight:
+                break
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def load_phase(conn, executor: ProcessPoolExecutor, files: List[str], translate: bool, workers: int,
+               flush_rows: int, timer: PhaseTimer, enqueue: bool = True) -> Dict[str, int]:
+    create_staging(conn)
+    totals = {'files': 0, 'failed': 0, 'rows': 0, 'invalid': 0, 'stored': 0}
+    staged: List[Dict[str, Any]] = []
+    staged_rows = 0
+
+    def flush():
+        nonlocal staged, staged_rows
+        if not staged:
+            return
+        start = time.perf_counter()
+        stored = merge_staging(conn, staged, enqueue)
+        timer.add("merge", time.perf_counter() - start, staged_rows)
+        totals['stored'] += stored
+        print(f"INFO: ✅ Merged {staged_rows} rows from {len(staged)} files ({stored} new).")
+        staged, staged_rows = [], 0
+
+    wait_start = time.perf_counter()
+    for result in bounded(executor, load_file, [(f, translate) for f in files], workers * 2):
+        timer.add("read", time.perf_counter() - wait_start, result['rows'])
+        timer.add("read (worker cpu)", result['seconds'], result['rows'])
+        if 'error' in result:
+            totals['failed'] += 1
+            print(f"WARNING: ⚠️ Could not read {result['path']}: {result['error']}")
+        else:
+            start = time.perf_counter()
+            copy_rows(conn, result['csv'])
+            timer.add("copy", time.perf_counter() - start, result['rows'])
+            stat = os.stat(result['path'])
+            staged.append({'path': result['path'], 'bytes': stat.st_size, 'mtime': stat.st_mtime,
+                           'rows': result['rows']})
+            staged_rows += result['rows']
+            totals['files'] += 1
+            totals['rows'] += result['rows']
+            totals['invalid'] += result['invalid']
+            if staged_rows >= flush_rows:
+                flush()
+        wait_start = time.perf_counter()
+    flush()
+    return totals
+
+
+def embed_phase(conn, executor: ProcessPoolExecutor, batch_size: int, workers: int,
+                timer: PhaseTimer) -> int:
+    from .vector_db import EMBED_DIM, ensure_embedding_column
+
+    ensure_embedding_column(conn)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS embeddings_backfill (id INT, embedding vector({EMBED_DIM})) "
+            "ON COMMIT DELETE ROWS"
+        )
+        # Rows merged by an earlier --skip-embed run were queued for embed_worker.py; done here instead
+        cur.execute("SELECT to_regclass('embedding_jobs')")
+        queued = cur.fetchone()[0] is not None
+    conn.commit()
+
+    def batches() -> Iterator[Tuple[list]]:
+        last_id = 0
+        while True:
+            start = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, title, summary FROM articles WHERE embedding IS NULL AND id > %s ORDER BY id LIMIT %s",
+                    (last_id, batch_size)
+                )
+                rows = cur.fetchall()
+            timer.add("embed (select)", time.perf_counter() - start, len(rows))
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield (rows,)
+
+    embedded = 0
+    wait_start = time.perf_counter()
+    for payload in bounded(executor, embed_rows, batches(), workers * 2):
+        rows = payload.count("\n")
+        timer.add("embed (encode)", time.perf_counter() - wait_start, rows)
+        start = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.copy_expert("COPY embeddings_backfill (id, embedding) FROM STDIN", io.StringIO(payload))
+            cur.execute("UPDATE articles a SET embedding = e.embedding FROM embeddings_backfill e WHERE a.id = e.id")
+            if queued:
+                cur.execute("DELETE FROM embedding_jobs j USING embeddings_backfill e WHERE j.article_id = e.id")
+        conn.commit()
+        timer.add("embed (update)", time.perf_counter() - start, rows)
+        embedded += rows
+        print(f"INFO: 🧠 Embedded {embedded} articles...")
+        wait_start = time.perf_counter()
+    return embedded
+
+
+def print_phase_summary(phases: Dict[str, Dict[str, float]]):
+    print(f"\n⚙️ PHASES:")
+    print(f"   {'phase':<20}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+    for name, p in phases.items():
+        print(f"   {name:<20}{p['rows']:>10}{p['seconds']:>10.2f}{p['rows_per_s']:>12.1f}")
+
+
+def run_backfill(paths: List[str], translate: bool = True, workers: int = BACKFILL_WORKERS,
+                 flush_rows: int = FLUSH_ROWS, embed_batch: int = EMBED_BATCH, embed: bool = True,
+                 reload: bool = False) -> Dict[str, Any]:
+    """
+    Load archive files, embed the new rows and rebuild the indexes.
+
+    Args:
+        paths: Files or directories to load
+        translate: Translate feed entries (article dumps are never translated)
+        workers: Reader / encoder processes
+        flush_rows: Staged rows per merge transaction
+        embed_batch: Articles per embedding batch
+        embed: Run the embed phase
+        reload: Load files again even if backfill_files records them
+
+    Returns:
+        Totals and per-phase rows/sec
+    """
+    from .storage import connect_storage, create_articles_table
+
+    timer = PhaseTimer()
+    started = time.perf_counter()
+    conn = connect_storage()
+    try:
+        with conn.cursor() as cur:
+            # Not on every start: create_articles_table would rebuild the dropped indexes
+            cur.execute("SELECT to_regclass('articles')")
+            if cur.fetchone()[0] is None:
+                create_articles_table(cur)
+        conn.commit()
+        ensure_backfill_tables(conn)
+
+        files = list_files(paths)
+        done = {} if reload else loaded_files(conn)
+        pending = []
+        for path in files:
+            stat = os.stat(path)
+            if done.get(path) != (stat.st_size, stat.st_mtime):
+                pending.append(path)
+        print(f"INFO: 📦 {len(files)} files, {len(files) - len(pending)} already loaded, {len(pending)} to load.")
+
+        # Nothing to load: leave the indexes alone (rebuild_indexes below only
+        # finishes what an interrupted backfill dropped)
+        if pending:
+            start = time.perf_counter()
+            dropped = drop_secondary_indexes(conn)
+            timer.add("drop indexes", time.perf_counter() - start)
+            if dropped:
+                print(f"INFO: Dropped {len(dropped)} indexes until the load finishes: {', '.join(dropped)}")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            start = time.perf_counter()
+            # The embed phase encodes the new rows: keep them out of the embedding queue
+            totals = load_phase(conn, executor, pending, translate, workers, flush_rows, timer, enqueue=not embed)
+            timer.add("load (wall)", time.perf_counter() - start, totals['rows'])
+
+            embedded = 0
+            if embed:
+                start = time.perf_counter()
+                embedded = embed_phase(conn, executor, embed_batch, workers, timer)
+                timer.add("embed (wall)", time.perf_counter() - start, embedded)
+
+        start = time.perf_counter()
+        rebuilt = rebuild_indexes(conn)
+        if rebuilt:
+            with conn.cursor() as cur:
+                cur.execute("SELECT count(*) FROM articles")
+                total_rows = cur.fetchone()[0]
+            timer.add("index", time.perf_counter() - start, total_rows)
+    finally:
+        conn.close()
+
+    phases = timer.summary()
+    print(f"\nINFO: 🎉 Backfill finished in {time.perf_counter() - started:.1f}s: {totals['rows']} rows read, "
+          f"{totals['stored']} new, {totals['invalid']} invalid, {totals['failed']} files failed, "
+          f"{embedded} embedded, {len(rebuilt)} indexes rebuilt.")
+    print_phase_summary(phases)
+    return {**totals, 'embedded': embedded, 'indexes_rebuilt': rebuilt,
+            'elapsed_s': round(time.perf_counter() - started, 3), 'phases': phases}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load historical feeds and article dumps")
+    parser.add_argument("paths", nargs="+", help="Archive files or directories")
+    parser.add_argument("--translated", action="store_true",
+                        help="Feed entries are already in English: skip translation")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="Reader / encoder processes")
+    parser.add_argument("--flush-rows", type=int, default=FLUSH_ROWS, help="Staged rows per merge transaction")
+    parser.add_argument("--embed-batch", type=int, default=EMBED_BATCH, help="Articles per embedding batch")
+    parser.add_argument("--skip-embed", action="store_true", help="Leave embeddings to a later run")
+    parser.add_argument("--reload", action="store_true", help="Load files again even if recorded as loaded")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    result = run_backfill(args.paths, translate=not args.translated, workers=args.workers,
+                          flush_rows=args.flush_rows, embed_batch=args.embed_batch,
+                          embed=not args.skip_embed, reload=args.reload)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
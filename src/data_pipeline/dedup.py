@@ -0,0 +1,356 @@
+"""
+DEDUP MODULE
+Responsible for grouping near-duplicate articles (syndicated wire stories) into stories
+
+The same STT story runs nearly verbatim in a dozen sister papers. In the
+parse stage, before translation, every article gets a MinHash signature
+of its title and summary word shingles: the share of equal values in two
+signatures estimates the Jaccard similarity of the two shingle sets. The
+signature is cut into BANDS bands of ROWS values; texts that share any
+band are candidates (LSH), and a candidate at THRESHOLD or above is a
+copy. With 20 bands of 6, a pair at 0.8 is a candidate 99.8% of the time,
+a pair at 0.5 27% of the time, and unrelated texts practically never.
+
+Signatures and band buckets are kept in Postgres (stories,
+story_buckets), so a copy matches a story stored by an earlier run or by
+another worker. Every article seen is recorded in story_aliases with its
+source and similarity; the first one becomes the story's canonical article.
+
+    PIPELINE_DEDUP=tag        every copy is stored, with articles.story_id set (default)
+    PIPELINE_DEDUP=collapse   only the canonical article is translated, stored and
+                              embedded; copies are kept as aliases only
+    PIPELINE_DEDUP=off
+
+Stories are committed before their articles are stored. A copy is only
+collapsed onto a canonical article that is stored (or started by the same
+batch, which is stored or retried with it); a copy of a story whose
+canonical article never made it to the articles table becomes the new
+canonical article and is stored.
+"""
+
+import hashlib
+import os
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .records import Article
+from .storage import add_column
+
+DEDUP_MODE = os.getenv("PIPELINE_DEDUP", "tag")  # tag | collapse | off
+THRESHOLD = float(os.getenv("PIPELINE_DEDUP_THRESHOLD", "0.8"))
+MIN_TOKENS = int(os.getenv("PIPELINE_DEDUP_MIN_TOKENS", "12"))
+WINDOW_DAYS = float(os.getenv("PIPELINE_DEDUP_WINDOW_DAYS", "14"))
+SHINGLE = 3
+BANDS = 20
+ROWS = 6
+NUM_PERM = BANDS * ROWS
+
+DEDUP_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS stories (
+        story_id BIGSERIAL PRIMARY KEY,
+        signature BYTEA NOT NULL,
+        canonical_link TEXT NOT NULL,
+        canonical_source TEXT,
+        copies INT NOT NULL DEFAULT 1,
+        first_seen_at TIMESTAMPTZ DEFAULT now(),
+        last_seen_at TIMESTAMPTZ DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS story_buckets (
+        band SMALLINT NOT NULL,
+        bucket BIGINT NOT NULL,
+        story_id BIGINT NOT NULL REFERENCES stories(story_id) ON DELETE CASCADE,
+        PRIMARY KEY (band, bucket, story_id)
+    );
+    CREATE TABLE IF NOT EXISTS story_aliases (
+        link TEXT PRIMARY KEY,
+        story_id BIGINT NOT NULL REFERENCES stories(story_id) ON DELETE CASCADE,
+        source TEXT NOT NULL,
+        similarity REAL NOT NULL,
+        seen_at TIMESTAMPTZ DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS idx_story_aliases_story_id ON story_aliases(story_id);
+"""
+
+
+def ensure_dedup_tables(conn):
+    """
+    Story tables, and articles.story_id, which storage.insert_article always
+    writes: call at pipeline start whatever PIPELINE_DEDUP is.
+    """
+    with conn.cursor() as cur:
+        cur.execute(DEDUP_TABLES_SQL)
+        # Copies of one wire story share a story_id
+        add_column(cur, "articles", "story_id", "BIGINT")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_articles_story_id ON articles(story_id)")
+    conn.commit()
+
+
+# -----------------------------
+# Signatures
+# -----------------------------
+_word = re.compile(r"\w+")
+
+# Multiply-shift hash functions; signatures are persisted, so the seed is fixed
+_random = np.random.RandomState(20260101)
+_A = _random.randint(1, 2 ** 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _random.randint(0, 2 ** 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def article_text(article: Union[Article, dict]) -> str:
+    return f"{article.get('title', '')} {article.get('summary', '')}"
+
+
+def minhash(text: str, min_tokens: int = MIN_TOKENS) -> Optional[np.ndarray]:
+    """
+    MinHash signature of the word shingles of `text`.
+
+    Returns:
+        NUM_PERM uint32 values, or None for texts too short to tell a copy
+        from a different story with the same wording
+    """
+    tokens = _word.findall(text.lower())
+    if len(tokens) < min_tokens:
+        return None
+    shingles = {" ".join(tokens[i:i + SHINGLE]) for i in range(len(tokens) - SHINGLE + 1)}
+    hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+                       for s in shingles], dtype=np.uint64)
+    # (shingles x permutations); uint64 products wrap, the top 32 bits are the hash
+    return ((hashes[:, None] * _A + _B) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+def band_keys(signature: np.ndarray) -> List[Tuple[int, int]]:
+    """(band, bucket) pairs; the bucket is a signed 64-bit hash of the band's values (BIGINT)."""
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, "little", signed=True)))
+    return keys
+
+
+class LSHIndex:
+    """In-memory band buckets: story id -> signature, looked up by band."""
+
+    def __init__(self, threshold: float = THRESHOLD):
+        self.threshold = threshold
+        self.buckets: Dict[Tuple[int, int], List[Any]] = defaultdict(list)
+        self.signatures: Dict[Any, np.ndarray] = {}
+
+    def add(self, story_id, signature: np.ndarray):
+        self.signatures[story_id] = signature
+        for key in band_keys(signature):
+            self.buckets[key].append(story_id)
+
+    def match(self, signature: np.ndarray) -> Optional[Tuple[Any, float]]:
+        """
+        Returns:
+            (story id, similarity) of the most similar story at or above
+            the threshold, or None
+        """
+        candidates = {story_id for key in band_keys(signature) for story_id in self.buckets.get(key, ())}
+        best = None
+        for story_id in candidates:
+            score = similarity(signature, self.signatures[story_id])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (story_id, score)
+        return best
+
+
+# -----------------------------
+# Stories in Postgres
+# -----------------------------
+def work_saved(article: Union[Article, dict]) -> Dict[str, int]:
+    """Translator calls and characters that translate_articles would spend on an article."""
+    texts = [article.get('title', ''), article.get('summary', '')]
+    texts += list(article.get('authors') or []) + list(article.get('tags') or [])
+    texts = [t for t in texts if t and t.strip()]
+    return {'calls': len(texts), 'chars': sum(len(t) for t in texts)}
+
+
+def group_duplicates(conn, articles: List[Article], source: str,
+                     mode: str = DEDUP_MODE) -> Tuple[List[Article], Dict[str, int]]:
+    """
+    Give every article a story_id, creating stories for new texts, and
+    record it as an alias of its story.
+
+    Runs under a transaction-level advisory lock, so concurrent stages and
+    workers see each other's stories. Edits of stored articles (`update`
+    set) and texts too short for a signature are passed through unchanged.
+    A copy whose story has no stored canonical article takes its place
+    instead of being dropped.
+
+    Args:
+        conn: Database connection
+        articles: Parsed, untranslated articles of one source
+        source: Source name, recorded on the aliases
+        mode: "tag" keeps the copies, "collapse" drops them
+
+    Returns:
+        (articles to translate and store,
+         {'dedup_checked', 'dedup_duplicates', 'dedup_translate_calls', 'dedup_translate_chars'})
+    """
+    counts = {'dedup_checked': 0, 'dedup_duplicates': 0, 'dedup_translate_calls': 0, 'dedup_translate_chars': 0}
+    signatures = {}
+    for i, article in enumerate(articles):
+        if article.get('update') or not article.get('link'):
+            continue
+        signature = minhash(article_text(article))
+        if signature is not None:
+            signatures[i] = signature
+    if not signatures:
+        return articles, counts
+
+    index = LSHIndex()
+    duplicates = set()
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('stories'))")
+        # Articles seen before (a retried batch, a full refresh) keep their story
+        links = [articles[i].link for i in signatures]
+        cur.execute(
+            """
+            SELECT a.link, a.story_id, a.link = s.canonical_link
+            FROM story_aliases a JOIN stories s ON s.story_id = a.story_id
+            WHERE a.link = ANY(%s)
+            """,
+            (links,)
+        )
+        known = {link: (story_id, is_canonical) for link, story_id, is_canonical in cur.fetchall()}
+
+        keys = {key for signature in signatures.values() for key in band_keys(signature)}
+        cur.execute(
+            """
+            SELECT DISTINCT s.story_id, s.signature
+            FROM story_buckets b JOIN stories s ON s.story_id = b.story_id
+            WHERE (b.band, b.bucket) IN (SELECT * FROM unnest(%s::smallint[], %s::bigint[]))
+              AND s.last_seen_at > now() - %s * interval '1 day'
+            """,
+            ([band for band, _ in keys], [bucket for _, bucket in keys], WINDOW_DAYS)
+        )
+        for story_id, signature in cur.fetchall():
+            index.add(story_id, np.frombuffer(bytes(signature), dtype=np.uint32))
+
+        # Stories this batch may collapse onto: their canonical article is stored,
+        # or it is in this batch (created below)
+        candidates = list(index.signatures) + [story_id for story_id, _ in known.values()]
+        cur.execute(
+            """
+            SELECT s.story_id FROM stories s JOIN articles a ON a.link = s.canonical_link
+            WHERE s.story_id = ANY(%s)
+            """,
+            (candidates,)
+        )
+        stored = {story_id for (story_id,) in cur.fetchall()}
+
+        def promote(story_id: int, article: Article):
+            """Make `article` the canonical article of a story whose canonical one was never stored."""
+            cur.execute("UPDATE stories SET canonical_link = %s, canonical_source = %s WHERE story_id = %s",
+                        (article.link, source, story_id))
+            stored.add(story_id)
+
+        for i, signature in signatures.items():
+            article = articles[i]
+            counts['dedup_checked'] += 1
+            if article.link in known:
+                story_id, is_canonical = known[article.link]
+                article.story_id = story_id
+                if is_canonical:
+                    stored.add(story_id)
+                elif story_id in stored:
+                    duplicates.add(i)
+                else:
+                    promote(story_id, article)
+                continue
+
+            match = index.match(signature)
+            if match:
+                story_id, score = match
+                if story_id in stored:
+                    duplicates.add(i)
+                else:
+                    promote(story_id, article)
+                cur.execute("UPDATE stories SET copies = copies + 1, last_seen_at = now() WHERE story_id = %s",
+                            (story_id,))
+            else:
+                score = 1.0
+                cur.execute(
+                    """
+                    INSERT INTO stories (signature, canonical_link, canonical_source)
+                    VALUES (%s, %s, %s) RETURNING story_id
+                    """,
+                    (signature.tobytes(), article.link, source)
+                )
+                story_id = cur.fetchone()[0]
+                keys = band_keys(signature)
+                cur.execute(
+                    """
+                    INSERT INTO story_buckets (band, bucket, story_id)
+                    SELECT band, bucket, %s FROM unnest(%s::smallint[], %s::bigint[]) AS k(band, bucket)
+                    ON CONFLICT DO NOTHING
+                    """,
+                    (story_id, [band for band, _ in keys], [bucket for _, bucket in keys])
+                )
+                index.add(story_id, signature)
+                stored.add(story_id)
+            cur.execute(
+                """
+                INSERT INTO story_aliases (link, story_id, source, similarity) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (link) DO NOTHING
+                """,
+                (article.link, story_id, source, score)
+            )
+            article.story_id = story_id
+    conn.commit()
+
+    for i in duplicates:
+        saved = work_saved(articles[i])
+        counts['dedup_duplicates'] += 1
+        counts['dedup_translate_calls'] += saved['calls']
+        counts['dedup_translate_chars'] += saved['chars']
+    if duplicates:
+        print(f"INFO: 🔁 {len(duplicates)} of {len(signatures)} articles from {source} are copies of known stories.")
+    if mode == "collapse":
+        articles = [article for i, article in enumerate(articles) if i not in duplicates]
+    return articles, counts
+
+
+# -----------------------------
+# Report
+# -----------------------------
+def dedup_report(counts: Dict[str, int], mode: str = DEDUP_MODE) -> Dict[str, Any]:
+    """
+    Dedup rate and the translation / embedding work the copies cost (mode
+    "tag") or that was skipped (mode "collapse").
+
+    Args:
+        counts: Sums of group_duplicates() counts
+    """
+    checked = counts.get('dedup_checked', 0)
+    duplicates = counts.get('dedup_duplicates', 0)
+    return {
+        'mode': mode,
+        'checked': checked,
+        'duplicates': duplicates,
+        'dedup_rate': round(duplicates / checked, 4) if checked else 0.0,
+        'skipped': mode == "collapse",
+        'translate_calls': counts.get('dedup_translate_calls', 0),
+        'translate_chars': counts.get('dedup_translate_chars', 0),
+        'embeddings': duplicates,
+    }
+
+
+def print_dedup_summary(report: Dict[str, Any]):
+    if report['mode'] == "off":
+        return
+    work = "saved" if report['skipped'] else "spent on copies (PIPELINE_DEDUP=collapse skips it)"
+    print(f"\n🔁 NEAR-DUPLICATES ({report['mode']}):")
+    print(f"   - Copies of known stories: {report['duplicates']} of {report['checked']} "
+          f"({report['dedup_rate'] * 100:.1f}%)")
+    print(f"   - Translation {work}: {report['translate_calls']} calls, {report['translate_chars']} characters")
+    print(f"   - Embeddings {work}: {report['embeddings']}")
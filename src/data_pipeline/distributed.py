@@ -0,0 +1,391 @@
+"""
+DISTRIBUTED MODULE
+Responsible for sharing the sources between ingestion workers through a lease table
+
+Any number of workers (processes, containers, hosts) can run against one
+Postgres. Each worker repeatedly leases a shard of due sources from
+source_leases, runs it through the staged pipeline (main.build_stages) and
+releases it. A source is due when no live lease holds it and it was not
+finished within the last --interval seconds.
+
+    python -m src.data_pipeline.distributed --once              # one worker, every due source
+    python -m src.data_pipeline.distributed --spawn 4 --once    # four local workers, one Postgres
+    python -m src.data_pipeline.distributed                     # keep polling (--interval)
+
+Leases are claimed with FOR UPDATE SKIP LOCKED, so concurrent workers never
+get the same source, and last for --lease-ttl seconds. A heartbeat thread
+extends the leases of a live worker; a worker that dies stops heartbeating
+and its sources are claimed again once the lease runs out. A worker that
+loses a lease (e.g. paused past the TTL) can overlap with the next owner
+for that source; storage skips existing links and the high-water mark only
+moves forward (state.py), so the overlap costs work, not duplicates.
+
+A source that failed is not marked finished: it is due again after
+PIPELINE_SOURCE_RETRY_S. main.run_pipeline and the Airflow tasks (tasks.py)
+lease the sources they process too, so they can run next to the workers.
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+LEASE_TTL_S = float(os.getenv("PIPELINE_LEASE_TTL_S", "120"))
+SOURCE_INTERVAL_S = float(os.getenv("PIPELINE_SOURCE_INTERVAL_S", "900"))
+SHARD_SIZE = int(os.getenv("PIPELINE_SHARD_SIZE", os.getenv("PIPELINE_FETCH_WORKERS", "8")))
+IDLE_S = float(os.getenv("PIPELINE_WORKER_IDLE_S", "30"))
+# A failed source is due again after this long, whatever --interval says
+RETRY_S = float(os.getenv("PIPELINE_SOURCE_RETRY_S", "60"))
+
+LEASE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS source_leases (
+        source TEXT PRIMARY KEY,
+        worker_id TEXT,
+        leased_until TIMESTAMPTZ,
+        heartbeat_at TIMESTAMPTZ,
+        claimed_at TIMESTAMPTZ,
+        claims BIGINT NOT NULL DEFAULT 0,
+        last_finished_at TIMESTAMPTZ,
+        last_worker_id TEXT,
+        last_status TEXT,
+        last_error_at TIMESTAMPTZ
+    );
+    ALTER TABLE source_leases ADD COLUMN IF NOT EXISTS last_error_at TIMESTAMPTZ;
+"""
+
+
+def worker_name(index: int = 0) -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+# -----------------------------
+# Leases
+# -----------------------------
+def ensure_lease_table(conn, sources: List[str]):
+    """Create source_leases and add a row for every source not in it yet."""
+    with conn.cursor() as cur:
+        cur.execute(LEASE_TABLE_SQL)
+        cur.execute("INSERT INTO source_leases (source) SELECT unnest(%s::text[]) ON CONFLICT (source) DO NOTHING",
+                    (sources,))
+    conn.commit()
+
+
+def claim_sources(conn, worker_id: str, sources: List[str], limit: int, ttl: float = LEASE_TTL_S,
+                  interval: float = SOURCE_INTERVAL_S, retry: float = RETRY_S) -> List[str]:
+    """
+    Lease up to `limit` due sources, least recently finished first. Leases
+    `worker_id` already holds are taken again (e.g. a retried Airflow task).
+
+    Returns:
+        Names of the leased sources
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE source_leases l
+            SET worker_id = %(worker)s, claimed_at = clock_timestamp(), heartbeat_at = clock_timestamp(),
+                leased_until = clock_timestamp() + make_interval(secs => %(ttl)s), claims = l.claims + 1
+            FROM (
+                SELECT source FROM source_leases
+                WHERE source = ANY(%(sources)s)
+                  AND (worker_id IS NULL OR worker_id = %(worker)s OR leased_until < clock_timestamp())
+                  AND (last_finished_at IS NULL
+                       OR last_finished_at < clock_timestamp() - make_interval(secs => %(interval)s))
+                  AND (last_error_at IS NULL
+                       OR last_error_at < clock_timestamp() - make_interval(secs => %(retry)s))
+                ORDER BY last_finished_at NULLS FIRST, source
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            ) due
+            WHERE l.source = due.source
+            RETURNING l.source
+            """,
+            {'worker': worker_id, 'ttl': ttl, 'sources': sources, 'interval': interval, 'retry': retry,
+             'limit': limit}
+        )
+        claimed = [source for (source,) in cur.fetchall()]
+    conn.commit()
+    return claimed
+
+
+def renew_leases(conn, worker_id: str, ttl: float = LEASE_TTL_S) -> int:
+    """Extend every lease `worker_id` holds. Returns the number of leases."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE source_leases
+            SET leased_until = clock_timestamp() + make_interval(secs => %s), heartbeat_at = clock_timestamp()
+            WHERE worker_id = %s
+            """,
+            (ttl, worker_id)
+        )
+        renewed = cur.rowcount
+    conn.commit()
+    return renewed
+
+
+def release_sources(conn, worker_id: str, sources: List[str], status: Dict[str, str]) -> List[str]:
+    """
+    Give the leases back and mark the sources finished, except those with
+    status 'error': they keep their last finish and are retried after
+    RETRY_S.
+
+    Returns:
+        Sources whose lease had already passed to another worker
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE source_leases l
+            SET worker_id = NULL, leased_until = NULL,
+                last_finished_at = CASE WHEN s.status = 'error' THEN l.last_finished_at ELSE clock_timestamp() END,
+                last_error_at = CASE WHEN s.status = 'error' THEN clock_timestamp() END,
+                last_worker_id = %s, last_status = s.status
+            FROM unnest(%s::text[], %s::text[]) AS s(source, status)
+            WHERE l.source = s.source AND l.worker_id = %s
+            RETURNING l.source
+            """,
+            (worker_id, sources, [status.get(s, 'error') for s in sources], worker_id)
+        )
+        released = {source for (source,) in cur.fetchall()}
+    conn.commit()
+    return [s for s in sources if s not in released]
+
+
+class Heartbeat:
+    """
+    Renews a worker's leases every ttl/3 seconds on its own connection, and
+    the heartbeat of its pipeline_runs row if `run_id` is given.
+    """
+
+    def __init__(self, worker_id: str, ttl: float = LEASE_TTL_S, run_id: Optional[str] = None):
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.run_id = run_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f"heartbeat-{worker_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _beat(self):
+        from .state import touch_run
+        from .storage import connect_storage
+
+        conn = None
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                conn = conn if conn is not None and not conn.closed else connect_storage()
+                renew_leases(conn, self.worker_id, self.ttl)
+                if self.run_id:
+                    touch_run(conn, self.run_id)
+            except Exception as e:
+                # The leases expire on their own if this keeps failing
+                print(f"WARNING: ⚠️ Lease heartbeat of {self.worker_id} failed: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+def load_sources(sources_file: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    (name, url) of the sources to share: main.finland_rss_feeds, or a
+    manifest of recorded feeds ([{'name', 'file'}], see benchmarks/) for
+    local tests without the network.
+    """
+    if sources_file:
+        with open(sources_file, encoding="utf-8") as f:
+            manifest = json.load(f)
+        base = os.path.dirname(os.path.abspath(sources_file))
+        return [(m['name'], m.get('url') or os.path.join(base, m['file'])) for m in manifest]
+
+    from .main import finland_rss_feeds
+    return [(name, url) for name, url in finland_rss_feeds if url]
+
+
+def item_source(item) -> str:
+    """Source name of a pipeline item: a (name, ...) tuple or a store batch."""
+    return item['source'] if isinstance(item, dict) else item[0]
+
+
+def source_status(sources: List[str], finished: List[str], failures: List[tuple]) -> Dict[str, str]:
+    """
+    {source: 'stored' | 'no-new' | 'error'} of one pipeline run: sources that
+    reached the end are stored, those a stage dropped with an error failed,
+    and the others had nothing new.
+
+    Args:
+        sources: Sources put into the pipeline
+        finished: Sources of the items the last stage produced
+        failures: Pipeline.failures
+    """
+    failed = {item_source(item) for _, item in failures}
+    done = set(finished)
+    return {name: 'error' if name in failed else 'stored' if name in done else 'no-new' for name in sources}
+
+
+def run_shard(conn, shard: List[str], urls: Dict[str, str], run_id: str) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    Run one shard through the staged pipeline.
+
+    Returns:
+        ({source: 'stored' | 'no-new' | 'error'}, Pipeline.summary() plus counts)
+    """
+    from .engine import Pipeline
+    from .main import build_stages, close_store_connections, take_run_counts
+    from .state import load_source_states
+
+    states = load_source_states(conn)
+    items = [(name, urls[name], states.get(name), run_id) for name in shard]
+    pipeline = Pipeline(build_stages())
+    finished = []
+    counts = {'processed': 0, 'embedded': 0, 'new': 0, 'updated': 0}
+    take_run_counts()
+    try:
+        for result in pipeline.run(items):
+            finished.append(result['source'])
+            counts['processed'] += result['processed']
+            counts['embedded'] += result['embedded']
+            counts['new'] += result['stored']
+            counts['updated'] += result.get('updated', 0)
+    finally:
+        close_store_connections()
+    run_counts = take_run_counts()
+    counts['unchanged'] = run_counts.get('unchanged', 0)
+    counts['duplicates'] = run_counts.get('dedup_duplicates', 0)
+    summary = pipeline.summary()
+    status = source_status(shard, finished, pipeline.failures)
+    failed = [name for name, s in status.items() if s == 'error']
+    if failed:
+        print(f"WARNING: ⚠️ Stage errors for {', '.join(failed)}; retrying them after {RETRY_S:.0f}s")
+    return status, {**counts, 'stages': summary}
+
+
+def run_worker(worker_id: Optional[str] = None, sources: Optional[List[Tuple[str, str]]] = None,
+               once: bool = False, shard_size: int = SHARD_SIZE, ttl: float = LEASE_TTL_S,
+               interval: float = SOURCE_INTERVAL_S, stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    Lease, process and release shards until `stop` is set (or, with
+    `once`, until no source is due).
+
+    Returns:
+        Totals of this worker: shards, sources, articles processed
+    """
+    from .dedup import ensure_dedup_tables
+    from .state import ensure_state_tables
+    from .storage import connect_storage, ensure_articles_table
+    from .vector_db import ensure_embedding_column
+
+    worker_id = worker_id or worker_name()
+    sources = sources if sources is not None else load_sources()
+    urls = dict(sources)
+    stop = stop or threading.Event()
+    run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{worker_id}"
+    totals = {'worker_id': worker_id, 'shards': 0, 'sources': 0, 'processed': 0, 'embedded': 0,
+              'new': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0, 'lost_leases': 0}
+
+    conn = connect_storage()
+    try:
+        ensure_articles_table(conn)
+        ensure_embedding_column(conn)
+        ensure_state_tables(conn)
+        ensure_dedup_tables(conn)
+        ensure_lease_table(conn, list(urls))
+        print(f"INFO: 🚀 Ingestion worker {worker_id} started ({len(urls)} sources, shards of {shard_size}).")
+        with Heartbeat(worker_id, ttl):
+            while not stop.is_set():
+                shard = claim_sources(conn, worker_id, list(urls), shard_size, ttl, interval)
+                if not shard:
+                    if once:
+                        break
+                    stop.wait(IDLE_S)
+                    continue
+
+                print(f"INFO: 📥 {worker_id} leased {len(shard)} sources: {', '.join(shard)}")
+                status = {name: 'error' for name in shard}
+                try:
+                    status, result = run_shard(conn, shard, urls, run_id)
+                    for key in ('processed', 'embedded', 'new', 'updated', 'unchanged', 'duplicates'):
+                        totals[key] += result[key]
+                finally:
+                    lost = release_sources(conn, worker_id, shard, status)
+                if lost:
+                    totals['lost_leases'] += len(lost)
+                    print(f"WARNING: ⚠️ {worker_id} lost the lease of {', '.join(lost)} before finishing")
+                totals['shards'] += 1
+                totals['sources'] += len(shard)
+    finally:
+        conn.close()
+    print(f"INFO: ✅ Worker {worker_id} done: {totals['sources']} sources in {totals['shards']} shards, "
+          f"{totals['processed']} articles ({totals['new']} new, {totals['updated']} updated, "
+          f"{totals['unchanged']} unchanged, {totals['duplicates']} wire copies).")
+    return totals
+
+
+def _spawned_worker(index: int, kwargs: Dict[str, Any], results):
+    results.put(run_worker(worker_name(index), **kwargs))
+
+
+def spawn_workers(count: int, **kwargs) -> List[Dict[str, Any]]:
+    """Run `count` workers in separate processes (local multi-worker testing)."""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_spawned_worker, args=(i, kwargs, results), name=f"ingest-worker-{i}")
+                 for i in range(count)]
+    for process in processes:
+        process.start()
+    totals = []
+    try:
+        # Read before join: a child blocks on exit until its result is consumed
+        while len(totals) < count:
+            try:
+                totals.append(results.get(timeout=1))
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes):
+                    break
+    finally:
+        for process in processes:
+            process.join()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestion worker: lease sources from Postgres and process them")
+    parser.add_argument("--once", action="store_true", help="Exit when no source is due instead of polling")
+    parser.add_argument("--spawn", type=int, default=1, help="Start this many worker processes")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Sources leased at a time")
+    parser.add_argument("--lease-ttl", type=float, default=LEASE_TTL_S, help="Seconds a lease lasts without heartbeat")
+    parser.add_argument("--interval", type=float, default=SOURCE_INTERVAL_S,
+                        help="Seconds before a finished source is due again")
+    parser.add_argument("--sources-file", help="manifest.json of recorded feeds instead of the configured feeds")
+    args = parser.parse_args(argv)
+
+    kwargs = {'sources': load_sources(args.sources_file), 'once': args.once, 'shard_size': args.shard_size,
+              'ttl': args.lease_ttl, 'interval': args.interval}
+    start = time.perf_counter()
+    totals = spawn_workers(args.spawn, **kwargs) if args.spawn > 1 else [run_worker(**kwargs)]
+    print(f"\nINFO: 🎉 {len(totals)} workers finished in {time.perf_counter() - start:.1f}s.")
+    for t in totals:
+        print(f"   {t['worker_id']:<40} {t['sources']:>5} sources {t['shards']:>4} shards "
+              f"{t['processed']:>7} articles {t['lost_leases']:>3} lost leases")
+
+
+if __name__ == "__main__":
+    main()
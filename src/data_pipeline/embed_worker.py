@@ -0,0 +1,421 @@
+"""
+EMBED WORKER MODULE
+Responsible for embedding articles as they are written, from a job queue in Postgres
+
+Triggers on articles enqueue a job in embedding_jobs for every inserted row
+without an embedding and every row whose title or summary changed, then
+NOTIFY embedding_jobs. Workers LISTEN on that channel (and poll, in case a
+notification is missed), claim a batch with FOR UPDATE SKIP LOCKED, encode
+it with vector_db.encode_batch and write the batch back with one COPY and
+one UPDATE. Any number of workers can run, in processes or on hosts:
+
+    python -m src.data_pipeline.embed_worker --processes 4
+    docker compose up -d --scale embed-worker=3
+
+A claim is a short transaction (claimed_at, claimed_by); the job is only
+deleted together with the embedding write. Claims of a crashed worker
+expire after EMBED_WORKER_CLAIM_TIMEOUT_S. A job whose article changes
+while it is claimed gets a new version, so the stale result is discarded
+and the article is embedded again. A job whose claim expired
+EMBED_WORKER_MAX_ATTEMPTS times is dead-lettered (dead_at) and left alone
+until the article changes again.
+
+The inline embed stage (PIPELINE_EMBED_MODE=inline) deletes the jobs of the
+rows it embeds, so only one of the two does the encoding. Sessions that
+embed their own bulk writes (backfill.py) SET LOCAL SKIP_QUEUE_SETTING to
+'on' and the triggers enqueue nothing.
+
+Prometheus metrics on EMBED_WORKER_METRICS_PORT: queue depth, age of the
+oldest job (embedding_queue_lag_seconds), dead-lettered jobs,
+enqueue-to-write lag per job, batch times and errors.
+"""
+
+import argparse
+import io
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+CHANNEL = "embedding_jobs"
+BATCH_SIZE = int(os.getenv("EMBED_WORKER_BATCH_SIZE", "500"))
+PROCESSES = int(os.getenv("EMBED_WORKER_PROCESSES", "1"))
+POLL_S = float(os.getenv("EMBED_WORKER_POLL_S", "30"))
+CLAIM_TIMEOUT_S = float(os.getenv("EMBED_WORKER_CLAIM_TIMEOUT_S", "300"))
+MAX_ATTEMPTS = int(os.getenv("EMBED_WORKER_MAX_ATTEMPTS", "5"))
+METRICS_PORT = int(os.getenv("EMBED_WORKER_METRICS_PORT", "9101"))
+METRICS_INTERVAL_S = float(os.getenv("EMBED_WORKER_METRICS_INTERVAL_S", "15"))
+# Transaction-local setting that turns the enqueue triggers off
+SKIP_QUEUE_SETTING = "pipeline.skip_embedding_queue"
+
+EMBEDDING_QUEUE_SQL = """
+    CREATE TABLE IF NOT EXISTS embedding_jobs (
+        article_id INT PRIMARY KEY REFERENCES articles(id) ON DELETE CASCADE,
+        version INT NOT NULL DEFAULT 1,
+        enqueued_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp(),
+        claimed_at TIMESTAMPTZ,
+        claimed_by TEXT,
+        attempts INT NOT NULL DEFAULT 0,
+        dead_at TIMESTAMPTZ
+    );
+    ALTER TABLE embedding_jobs ADD COLUMN IF NOT EXISTS dead_at TIMESTAMPTZ;
+    CREATE INDEX IF NOT EXISTS idx_embedding_jobs_enqueued_at ON embedding_jobs(enqueued_at);
+
+    CREATE OR REPLACE FUNCTION enqueue_embedding_jobs() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF current_setting('pipeline.skip_embedding_queue', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO embedding_jobs (article_id)
+            SELECT id FROM new_rows WHERE embedding IS NULL
+            ON CONFLICT (article_id) DO UPDATE
+                SET version = embedding_jobs.version + 1, claimed_at = NULL, attempts = 0, dead_at = NULL;
+        ELSE
+            INSERT INTO embedding_jobs (article_id)
+            SELECT n.id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE n.title IS DISTINCT FROM o.title OR n.summary IS DISTINCT FROM o.summary
+            ON CONFLICT (article_id) DO UPDATE
+                SET version = embedding_jobs.version + 1, claimed_at = NULL, attempts = 0, dead_at = NULL;
+        END IF;
+        IF FOUND THEN
+            PERFORM pg_notify('embedding_jobs', '');
+        END IF;
+        RETURN NULL;
+    END $$;
+
+    -- Statement level: a COPY or a bulk INSERT ... SELECT enqueues in one statement
+    DROP TRIGGER IF EXISTS articles_enqueue_embedding_insert ON articles;
+    CREATE TRIGGER articles_enqueue_embedding_insert AFTER INSERT ON articles
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enqueue_embedding_jobs();
+    DROP TRIGGER IF EXISTS articles_enqueue_embedding_update ON articles;
+    CREATE TRIGGER articles_enqueue_embedding_update AFTER UPDATE ON articles
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION enqueue_embedding_jobs();
+"""
+
+
+def ensure_embedding_queue(conn) -> int:
+    """
+    Create the queue table and the triggers, and enqueue the articles that
+    still have no (or a stale) embedding, e.g. rows written before the
+    triggers existed.
+
+    Returns:
+        Number of jobs enqueued for existing rows
+    """
+    from .vector_db import ensure_embedding_column
+
+    ensure_embedding_column(conn)
+    with conn.cursor() as cur:
+        # Workers starting together must not replace the triggers concurrently
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('embedding_jobs'))")
+        cur.execute(EMBEDDING_QUEUE_SQL)
+        cur.execute(
+            """
+            INSERT INTO embedding_jobs (article_id)
+            SELECT id FROM articles WHERE embedding IS NULL OR embedding_stale
+            ON CONFLICT (article_id) DO NOTHING
+            """
+        )
+        enqueued = cur.rowcount
+        if enqueued:
+            cur.execute("SELECT pg_notify(%s, '')", (CHANNEL,))
+    conn.commit()
+    return enqueued
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
+_metrics: Optional[Dict[str, Any]] = None
+
+
+def metrics() -> Dict[str, Any]:
+    """Created on first use: PROMETHEUS_MULTIPROC_DIR must be set before prometheus_client is imported."""
+    global _metrics
+    if _metrics is None:
+        from prometheus_client import Counter, Gauge, Histogram
+
+        _metrics = {
+            'depth': Gauge("embedding_queue_depth", "Articles waiting for an embedding",
+                           multiprocess_mode="livemax"),
+            'lag': Gauge("embedding_queue_lag_seconds", "Age of the oldest job in the embedding queue",
+                         multiprocess_mode="livemax"),
+            'dead': Gauge("embedding_queue_dead_jobs", f"Jobs given up on after {MAX_ATTEMPTS} attempts",
+                          multiprocess_mode="livemax"),
+            'job_lag': Histogram("embedding_job_lag_seconds", "Time from enqueue to embedding written",
+                                 buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600)),
+            'batch': Histogram("embedding_batch_seconds", "Claim, encode and write time of one batch",
+                               ["phase"], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+            'embedded': Counter("embedding_jobs_processed_total", "Embeddings written by the workers"),
+            'stale': Counter("embedding_jobs_stale_total", "Results dropped because the article changed meanwhile"),
+            'errors': Counter("embedding_worker_errors_total", "Batches that failed and were left to expire"),
+        }
+    return _metrics
+
+
+def queue_stats(conn) -> Tuple[int, float, int]:
+    """(pending jobs, age in seconds of the oldest one, dead-lettered jobs)"""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT count(*) FILTER (WHERE dead_at IS NULL),
+                   COALESCE(EXTRACT(EPOCH FROM clock_timestamp() - min(enqueued_at) FILTER (WHERE dead_at IS NULL)), 0),
+                   count(*) FILTER (WHERE dead_at IS NOT NULL)
+            FROM embedding_jobs
+            """
+        )
+        depth, lag, dead = cur.fetchone()
+    conn.commit()
+    return depth, float(lag), dead
+
+
+def watch_queue(stop: threading.Event, interval: float = METRICS_INTERVAL_S):
+    """Refresh the depth and lag gauges until `stop` is set."""
+    from .storage import connect_storage
+
+    conn = None
+    while not stop.is_set():
+        try:
+            conn = conn if conn is not None and not conn.closed else connect_storage()
+            depth, lag, dead = queue_stats(conn)
+            metrics()['depth'].set(depth)
+            metrics()['lag'].set(lag)
+            metrics()['dead'].set(dead)
+        except Exception as e:
+            print(f"WARNING: ⚠️ Could not read the embedding queue: {e}")
+            if conn is not None:
+                conn.close()
+            conn = None
+        stop.wait(interval)
+    if conn is not None:
+        conn.close()
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+def claim_jobs(conn, worker_id: str, batch_size: int) -> List[Tuple[int, int]]:
+    """
+    Claim up to `batch_size` of the oldest unclaimed (or expired) jobs.
+    Expired claims that used up their attempts are dead-lettered first.
+
+    Returns:
+        [(article_id, version)]
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE embedding_jobs SET dead_at = clock_timestamp()
+            WHERE dead_at IS NULL AND attempts >= %s
+              AND claimed_at < clock_timestamp() - make_interval(secs => %s)
+            """,
+            (MAX_ATTEMPTS, CLAIM_TIMEOUT_S)
+        )
+        if cur.rowcount:
+            print(f"WARNING: ⚠️ {cur.rowcount} embedding jobs dead-lettered after {MAX_ATTEMPTS} attempts.")
+        cur.execute(
+            """
+            UPDATE embedding_jobs j
+            SET claimed_at = clock_timestamp(), claimed_by = %s, attempts = j.attempts + 1
+            FROM (
+                SELECT article_id FROM embedding_jobs
+                WHERE (claimed_at IS NULL OR claimed_at < clock_timestamp() - make_interval(secs => %s))
+                  AND dead_at IS NULL AND attempts < %s
+                ORDER BY enqueued_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ) c
+            WHERE j.article_id = c.article_id
+            RETURNING j.article_id, j.version
+            """,
+            (worker_id, CLAIM_TIMEOUT_S, MAX_ATTEMPTS, batch_size)
+        )
+        jobs = cur.fetchall()
+    conn.commit()
+    return jobs
+
+
+def encode_jobs(conn, jobs: List[Tuple[int, int]]) -> str:
+    """COPY payload (article_id, version, embedding) of the claimed jobs."""
+    from .vector_db import EMBED_DIM, embedding_text, encode_batch, vector_literal
+
+    versions = dict(jobs)
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, title, summary FROM articles WHERE id = ANY(%s)", (list(versions),))
+        rows = cur.fetchall()
+    vectors = encode_batch([embedding_text({'title': t, 'summary': s}) for _, t, s in rows], EMBED_DIM)
+    return "".join(f"{row[0]}\t{versions[row[0]]}\t{vector_literal(v)}\n" for row, v in zip(rows, vectors))
+
+
+def write_embeddings(conn, payload: str) -> List[float]:
+    """
+    Store a batch and delete its jobs in one transaction. Results whose job
+    version moved on (the article changed after the claim) are dropped.
+
+    Returns:
+        Enqueue-to-write lag in seconds of every job written
+    """
+    from .vector_db import EMBED_DIM
+
+    with conn.cursor() as cur:
+        cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS embedding_results (article_id INT, version INT, "
+            f"embedding vector({EMBED_DIM})) ON COMMIT DELETE ROWS"
+        )
+        cur.copy_expert("COPY embedding_results (article_id, version, embedding) FROM STDIN", io.StringIO(payload))
+        cur.execute(
+            """
+            WITH done AS (
+                DELETE FROM embedding_jobs j USING embedding_results r
+                WHERE j.article_id = r.article_id AND j.version = r.version
+                RETURNING j.article_id, j.enqueued_at
+            ), written AS (
+                UPDATE articles a SET embedding = r.embedding, embedding_stale = FALSE
+                FROM done d JOIN embedding_results r ON r.article_id = d.article_id
+                WHERE a.id = d.article_id
+                RETURNING a.id
+            )
+            SELECT EXTRACT(EPOCH FROM clock_timestamp() - d.enqueued_at) FROM done d JOIN written w ON w.id = d.article_id
+            """
+        )
+        lags = [float(lag) for (lag,) in cur.fetchall()]
+    conn.commit()
+    return lags
+
+
+def process_batch(conn, worker_id: str, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Claim, encode and write one batch.
+
+    Returns:
+        Number of jobs claimed (0 when the queue is empty)
+    """
+    m = metrics()
+    start = time.perf_counter()
+    jobs = claim_jobs(conn, worker_id, batch_size)
+    m['batch'].labels("claim").observe(time.perf_counter() - start)
+    if not jobs:
+        return 0
+
+    start = time.perf_counter()
+    payload = encode_jobs(conn, jobs)
+    m['batch'].labels("encode").observe(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    lags = write_embeddings(conn, payload)
+    m['batch'].labels("write").observe(time.perf_counter() - start)
+
+    for lag in lags:
+        m['job_lag'].observe(lag)
+    m['embedded'].inc(len(lags))
+    m['stale'].inc(len(jobs) - len(lags))
+    print(f"INFO: ✅ {worker_id} embedded {len(lags)} articles"
+          f"{f', max lag {max(lags):.1f}s' if lags else ''}.")
+    return len(jobs)
+
+
+def wait_for_jobs(listen_conn, timeout: float):
+    """Block until a NOTIFY on the channel arrives (or `timeout` passes)."""
+    if select.select([listen_conn], [], [], timeout) != ([], [], []):
+        listen_conn.poll()
+        listen_conn.notifies.clear()
+
+
+def run_worker(worker_id: str, batch_size: int = BATCH_SIZE, stop: Optional[threading.Event] = None):
+    """
+    Work the queue until `stop` is set: drain it batch by batch, then sleep
+    until the next NOTIFY (or POLL_S, for claims that expired meanwhile).
+    """
+    from .storage import connect_storage
+
+    stop = stop or threading.Event()
+    conn = connect_storage()
+    listen_conn = connect_storage()
+    listen_conn.autocommit = True
+    try:
+        with listen_conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        print(f"INFO: 🧠 Embedding worker {worker_id} listening on {CHANNEL}.")
+        while not stop.is_set():
+            try:
+                claimed = process_batch(conn, worker_id, batch_size)
+            except Exception as e:
+                conn.rollback()
+                metrics()['errors'].inc()
+                print(f"ERROR: ❌ Embedding batch failed in {worker_id}: {e}")
+                claimed = 0
+                stop.wait(1)
+            if not claimed:
+                wait_for_jobs(listen_conn, POLL_S)
+    finally:
+        conn.close()
+        listen_conn.close()
+
+
+def _worker_process(index: int, batch_size: int):
+    run_worker(f"{socket.gethostname()}-{os.getpid()}-{index}", batch_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed articles from the embedding_jobs queue")
+    parser.add_argument("--processes", type=int, default=PROCESSES, help="Worker processes on this host")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Jobs claimed per batch")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Prometheus port (0 disables)")
+    args = parser.parse_args(argv)
+
+    # Worker processes write their samples to files the metrics endpoint aggregates
+    if args.processes > 1:
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="embed-worker-metrics-"))
+
+    from .storage import connect_storage
+
+    conn = connect_storage()
+    try:
+        enqueued = ensure_embedding_queue(conn)
+    finally:
+        conn.close()
+    print(f"INFO: ✅ Embedding queue ready ({enqueued} existing articles enqueued).")
+
+    stop = threading.Event()
+    if args.metrics_port:
+        from prometheus_client import CollectorRegistry, REGISTRY, start_http_server
+
+        registry = REGISTRY
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        start_http_server(args.metrics_port, registry=registry)
+        threading.Thread(target=watch_queue, args=(stop,), name="embedding-queue-metrics", daemon=True).start()
+
+    if args.processes <= 1:
+        try:
+            _worker_process(0, args.batch_size)
+        finally:
+            stop.set()
+        return
+
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_worker_process, args=(i, args.batch_size), name=f"embed-worker-{i}")
+               for i in range(args.processes)]
+    for process in workers:
+        process.start()
+    try:
+        for process in workers:
+            process.join()
+    finally:
+        stop.set()
+        for process in workers:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+ENGINE MODULE
+Responsible for running pipeline stages concurrently, connected by bounded queues
+
+Each stage is a function taking one item and returning (or yielding) zero or
+more items for the next stage. Stages run in their own worker threads, so
+the network (fetch), the translator and the database are busy at the same
+time. Stages marked kind="process" hand each item to a process pool (for CPU
+bound work such as encoding); their function must be picklable and return a
+list. Bounded queues give backpressure: a slow stage blocks the ones before
+it instead of letting items pile up in memory.
+
+    stages = [Stage("fetch", fetch_source, workers=8), Stage("store", store, workers=2)]
+    for result in Pipeline(stages).run(sources):
+        ...
+"""
+
+import contextlib
+import contextvars
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    One step of the pipeline.
+
+    Args:
+        name: Stage name used in stats and logs
+        fn: item -> item, list/generator of items, or None to drop the item
+        workers: Concurrent workers (threads, or processes for kind="process")
+        kind: "thread" for I/O bound stages, "process" for CPU bound ones
+        queue_size: Capacity of the stage's input queue
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    kind: str = "thread"
+    queue_size: int = QUEUE_SIZE
+
+
+@dataclass
+class StageStats:
+    """Counters for one stage; wait times are summed over its workers."""
+    workers: int
+    items_in: int = 0
+    items_out: int = 0
+    errors: int = 0
+    busy_s: float = 0.0
+    wait_in_s: float = 0.0    # waiting for input (starved by the previous stage)
+    wait_out_s: float = 0.0   # waiting for room downstream (backpressure)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        wall = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        return {
+            'workers': self.workers,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'errors': self.errors,
+            'wall_s': round(wall, 3),
+            'busy_s': round(self.busy_s, 3),
+            'throughput_per_s': round(self.items_in / wall, 2) if wall > 0 else 0.0,
+            'utilization': round(self.busy_s / (wall * self.workers), 3) if wall > 0 else 0.0,
+            'queue_wait_in_s': round(self.wait_in_s, 3),
+            'queue_wait_out_s': round(self.wait_out_s, 3),
+        }
+
+
+def _as_items(result) -> Iterable[Any]:
+    if result is None:
+        return ()
+    # Tuples are single items (e.g. (name, articles)); lists and generators fan out
+    if isinstance(result, list) or hasattr(result, '__next__'):
+        return result
+    return (result,)
+
+
+class Pipeline:
+    """
+    Run `stages` over a stream of items.
+
+    `run()` is a generator: it yields what the last stage produces, in
+    completion order, while the stages keep working. Exceptions in a stage
+    function are counted and logged, and the item is dropped (the rest of
+    the run continues, the item is kept in `failures`), like the per-source
+    error handling of the serial loop.
+    """
+
+    def __init__(self, stages: List[Stage], serial_stage_context: Callable[[str], Any] = None):
+        self.stages = stages
+        # Wraps every stage call in run_serial, e.g. profiling.profile_stage
+        # (per-stage profilers can't tell concurrent stages apart)
+        self.serial_stage_context = serial_stage_context or (lambda name: contextlib.nullcontext())
+        self.stats: Dict[str, StageStats] = {s.name: StageStats(workers=s.workers) for s in stages}
+        # (stage name, item) of every item a stage dropped with an error
+        self.failures: List[tuple] = []
+        self._queues = [queue.Queue(maxsize=s.queue_size) for s in stages]
+        self._output: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._pools: Dict[str, ProcessPoolExecutor] = {}
+
+    def run(self, items: Iterable[Any]) -> Iterator[Any]:
+        # Processes are started before any thread, and with spawn, so no
+        # worker inherits a half-held lock from a running thread
+        for stage in self.stages:
+            if stage.kind == "process":
+                self._pools[stage.name] = ProcessPoolExecutor(
+                    max_workers=stage.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+
+        threads = [self._start(self._feed, items)]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            for _ in range(stage.workers):
+                threads.append(self._start(self._work, index, remaining))
+
+        done = False
+        try:
+            while not done:
+                item = self._output.get()
+                done = item is _DONE
+                if not done:
+                    yield item
+        finally:
+            # A consumer that stops early still lets the stages drain
+            while not done:
+                done = self._output.get() is _DONE
+            for thread in threads:
+                thread.join()
+            for pool in self._pools.values():
+                pool.shutdown()
+
+    def run_serial(self, items: Iterable[Any]) -> Iterator[Any]:
+        """
+        Reference executor: push each item through every stage in the calling
+        thread, one at a time (the behaviour of the old per-source loop).
+        Same functions, same outputs, same stats; no queues or workers.
+        """
+        for item in items:
+            yield from self._serial(0, item)
+        for stats in self.stats.values():
+            stats.finished = stats.finished or time.perf_counter()
+
+    def _serial(self, index: int, item) -> Iterator[Any]:
+        if index == len(self.stages):
+            yield item
+            return
+        stage = self.stages[index]
+        stats = self.stats[stage.name]
+        stats.started = stats.started or time.perf_counter()
+        start = time.perf_counter()
+        try:
+            with self.serial_stage_context(stage.name):
+                outputs = list(_as_items(stage.fn(item)))
+        except Exception as e:
+            print(f"ERROR in pipeline stage {stage.name}: {e}")
+            self.failures.append((stage.name, item))
+            outputs = None
+        stats.busy_s += time.perf_counter() - start
+        stats.items_in += 1
+        stats.items_out += len(outputs or [])
+        stats.errors += outputs is None
+        stats.finished = time.perf_counter()
+        for output in outputs or []:
+            yield from self._serial(index + 1, output)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def _start(self, target, *args) -> threading.Thread:
+        # Each worker gets its own copy of the caller's context (current span)
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(target, *args), daemon=True)
+        thread.start()
+        return thread
+
+    def _put(self, q: queue.Queue, item, stats: Optional[StageStats]):
+        start = time.perf_counter()
+        q.put(item)
+        if stats is not None:
+            with stats.lock:
+                stats.wait_out_s += time.perf_counter() - start
+
+    def _feed(self, items: Iterable[Any]):
+        first = self._queues[0]
+        try:
+            for item in items:
+                self._put(first, item, None)
+        except Exception as e:
+            print(f"ERROR reading pipeline input: {e}")
+        finally:
+            for _ in range(self.stages[0].workers):
+                first.put(_DONE)
+
+    def _work(self, index: int, remaining: List[int]):
+        stage = self.stages[index]
+        stats = self.stats[stage.name]
+        inbox = self._queues[index]
+        last = index == len(self.stages) - 1
+        outbox = self._output if last else self._queues[index + 1]
+        pool = self._pools.get(stage.name)
+
+        while True:
+            start = time.perf_counter()
+            item = inbox.get()
+            waited = time.perf_counter() - start
+            if item is _DONE:
+                break
+            with stats.lock:
+                if stats.started is None:
+                    stats.started = start + waited
+
+            busy, produced, error = 0.0, 0, False
+            start = time.perf_counter()
+            try:
+                result = pool.submit(stage.fn, item).result() if pool else stage.fn(item)
+                # Generators are advanced lazily: each output is handed on
+                # before the next one is produced
+                for output in _as_items(result):
+                    busy += time.perf_counter() - start
+                    self._put(outbox, output, stats)
+                    produced += 1
+                    start = time.perf_counter()
+            except Exception as e:
+                print(f"ERROR in pipeline stage {stage.name}: {e}")
+                error = True
+            busy += time.perf_counter() - start
+            with stats.lock:
+                stats.wait_in_s += waited
+                stats.busy_s += busy
+                stats.items_in += 1
+                stats.items_out += produced
+                stats.errors += error
+                if error:
+                    self.failures.append((stage.name, item))
+
+        # The last worker of a stage tells every worker of the next one
+        with stats.lock:
+            remaining[0] -= 1
+            closing = remaining[0] == 0
+            if closing:
+                stats.finished = time.perf_counter()
+        if closing:
+            downstream = 1 if last else self.stages[index + 1].workers
+            for _ in range(downstream):
+                outbox.put(_DONE)
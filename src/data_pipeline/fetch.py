@@ -5,6 +5,9 @@ Responsible for downloading RSS feeds from Finnish news sources
 
 import feedparser
 
+from .profiling import profiled
+from .records import to_entry, to_xcom
+
 
 def install_packages(**context):
     """Install required packages if they're not available"""
@@ -32,6 +35,7 @@ def install_packages(**context):
     return "Packages installed successfully"
 
 
+@profiled("fetch_rss_data")
 def fetch_rss_data(**context):
     """
     Task 1: Fetch data from RSS feeds
@@ -108,20 +112,10 @@ def fetch_rss_data(**context):
             
             
             
-            # Convert feed entries to serializable format for XCom
-            entries = []
-            for entry in feed.entries:
-                entry_data = {
-                    'title': entry.get('title', ''),
-                    'link': entry.get('link', ''),
-                    'published': entry.get('published', ''),
-                    'summary': entry.get('summary', ''),
-                    'authors': [author.get('name', '') for author in entry.get('authors', [])] if entry.get('authors') else [],
-                    'tags': [tag.get('term', '') for tag in entry.get('tags', [])] if entry.get('tags') else []
-                }
-                entries.append(entry_data)
+            # Convert feed entries to Entry records (one JSON array each in XCom)
+            entries = [to_entry(entry) for entry in feed.entries]
             
-            fetched_data[name] = entries
+            fetched_data[name] = to_xcom(entries)
             successful_fetches += 1
             print(f"✅ Successfully fetched {len(entries)} entries from {name}")
             
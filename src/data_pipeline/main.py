@@ -3,13 +3,28 @@ MAIN MODULE
 Responsible for pipeline orchestration, summary, and final processing
 """
 
+import argparse
+import contextlib
+import os
+import threading
+from collections import Counter
+import time
 from datetime import datetime
 from typing import Dict, Any
 import json
-from .fetch import get_data_from_rss, fetch_rss_data
-from .parse import parse_rss_feed_articles
-from .storage import connect_storage, store_data, get_data
-from .vector_db import vectordb
+from . import profiling
+from .dedup import DEDUP_MODE, dedup_report, ensure_dedup_tables, group_duplicates, print_dedup_summary
+from .distributed import Heartbeat, claim_sources, ensure_lease_table, release_sources, source_status
+from .engine import Pipeline, Stage
+from .state import (DETECT_EDITS, FULL_REFRESH, begin_run, detect_changes, edit_window_start, ensure_state_tables,
+                    finish_run, high_water_mark, load_source_states, pending_sources, save_source_state, unseen_entries)
+from .feed_stream import read_feed
+from .fetch import fetch_rss_data
+from .parse import parse_rss_feed_articles, translate_articles
+from .records import encode
+from .storage import connect_storage, ensure_articles_table, store_data, get_data
+from .tracing import attach_parent_from_env, init_tracing, shutdown_tracing, span
+from .vector_db import embed_batch, embed_missing, ensure_embedding_column
 
 finland_rss_feeds = [
     ("Finland Today RSS Feed", "https://finlandtoday.fi/feed"),
@@ -79,12 +94,17 @@ def pipeline_summary(**context):
     
     # Get storage results
     storage_results = ti.xcom_pull(task_ids='store_rss_data')
+
+    # Per-stage profiles, pushed only when PIPELINE_PROFILE is on
+    profile_results = {}
+    for task_id in ('fetch_rss_data', 'transform_rss_data', 'store_rss_data'):
+        profile_results.update(ti.xcom_pull(task_ids=task_id, key='profile') or {})
     
     print("\n🎉 PIPELINE COMPLETED SUCCESSFULLY!")
     print("="*70)
     
     # Detailed summary
-    summary = generate_pipeline_summary(fetch_results, transform_results, storage_results)
+    summary = generate_pipeline_summary(fetch_results, transform_results, storage_results, profile_results)
     
     # Print summary
     print_pipeline_summary(summary)
@@ -107,7 +127,8 @@ def pipeline_summary(**context):
     return final_summary
 
 
-def generate_pipeline_summary(fetch_results: dict, transform_results: dict, storage_results: dict) -> dict:
+def generate_pipeline_summary(fetch_results: dict, transform_results: dict, storage_results: dict,
+                              profile_results: dict = None) -> dict:
     """
     Generate comprehensive pipeline summary
     
@@ -115,6 +136,7 @@ def generate_pipeline_summary(fetch_results: dict, transform_results: dict, stor
         fetch_results: Results from fetch task
         transform_results: Results from transform task  
         storage_results: Results from storage task
+        profile_results: Per-stage wall/CPU/memory table, if profiling was on
     
     Returns:
         Dictionary with pipeline summary
@@ -170,6 +192,9 @@ def generate_pipeline_summary(fetch_results: dict, transform_results: dict, stor
         'data_quality_score': calculate_data_quality_score(summary),
         'sources_health': calculate_sources_health(summary)
     }
+
+    if profile_results:
+        summary['profile_summary'] = profile_results
     
     return summary
 
@@ -225,6 +250,8 @@ def print_pipeline_summary(summary: dict):
         print(f"   - Data quality score: {overall_summary.get('data_quality_score', 0)}/100")
         print(f"   - Sources health: {overall_summary.get('sources_health', 0)}%")
 
+    profiling.print_profile_summary(summary.get('profile_summary', {}))
+
 
 def calculate_efficiency_rate(summary: dict) -> float:
     """
@@ -500,48 +527,310 @@ def perform_cleanup_tasks(summary: dict) -> dict:
         return {'status': 'failed', 'error': str(e)}
 
 
-def run_pipeline():
+def text_bytes(items: list, fields: tuple = ('title', 'summary')) -> int:
+    """
+    Approximate payload size: UTF-8 bytes of the main text fields
+    
+    Args:
+        items: Entry or Article records (or dictionaries)
+        fields: Text fields to count
+    
+    Returns:
+        Total size in bytes
+    """
+    return sum(len(str(item.get(f) or '').encode('utf-8')) for item in items for f in fields)
+
+
+# -----------------------------
+# Staged ingestion (see engine.py)
+# -----------------------------
+PIPELINE_ENGINE = os.getenv("PIPELINE_ENGINE", "staged")  # staged | serial
+FETCH_WORKERS = int(os.getenv("PIPELINE_FETCH_WORKERS", "8"))
+CLEAN_WORKERS = int(os.getenv("PIPELINE_CLEAN_WORKERS", "2"))
+TRANSLATE_WORKERS = int(os.getenv("PIPELINE_TRANSLATE_WORKERS", "8"))
+STORE_WORKERS = int(os.getenv("PIPELINE_STORE_WORKERS", "2"))
+EMBED_WORKERS = int(os.getenv("PIPELINE_EMBED_WORKERS", "2"))
+# inline: the embed stage encodes each batch; queue: embed_worker.py does (the
+# articles triggers enqueue every stored row)
+EMBED_MODE = os.getenv("PIPELINE_EMBED_MODE", "inline")
+
+# Store (and, for edit detection, fetch) workers keep one connection each
+# for the whole run
+_store_local = threading.local()
+_store_connections = []
+_store_lock = threading.Lock()
+
+# Counts kept by the fetch and clean workers (unchanged entries,
+# near-duplicates); new and updated articles are counted by the store stage
+_run_counts = Counter()
+_run_counts_lock = threading.Lock()
+
+
+def store_connection():
+    conn = getattr(_store_local, 'conn', None)
+    if conn is None:
+        conn = connect_storage()
+        _store_local.conn = conn
+        with _store_lock:
+            _store_connections.append(conn)
+    return conn
+
+
+def close_store_connections():
+    with _store_lock:
+        while _store_connections:
+            _store_connections.pop().close()
+    _store_local.__dict__.clear()
+
+
+def add_run_counts(counts: Dict[str, int]):
+    with _run_counts_lock:
+        _run_counts.update(counts)
+
+
+def take_run_counts() -> Dict[str, int]:
+    """Counts added since the last call"""
+    with _run_counts_lock:
+        counts = dict(_run_counts)
+        _run_counts.clear()
+    return counts
+
+
+def fetch_source(source: tuple):
+    """
+    Stage 1: download one RSS source and keep the entries past its
+    high-water mark, plus (PIPELINE_DETECT_EDITS) the stored entries whose
+    title or summary changed
+    
+    Args:
+        source: (name, url, source_state row or None, run id)
+    
+    Returns:
+        (name, new and edited feed entries, mark to save once stored), or
+        None when nothing new or edited was fetched
+    """
+    name, url, state, run_id = source
+    edited = []
+    with span("fetch", {"source.name": name, "source.url": url}) as current:
+        if DETECT_EDITS:
+            # Edits sit behind the mark too: read on through the edit window and
+            # compare content hashes with the stored rows (state.detect_changes)
+            since = edit_window_start()
+            feed, read = read_feed(url, state, since)
+            new_entries, edited, changes = detect_changes(store_connection(), feed or [], state, since)
+            add_run_counts({'unchanged': changes['unchanged']})
+        else:
+            # Streams the feed and stops at the last stored entry (feed_stream.py)
+            feed, read = read_feed(url, state)
+            new_entries = unseen_entries(feed or [], state)
+        current.set_attribute("rows", len(feed or []))
+        current.set_attribute("rows.new", len(new_entries))
+        current.set_attribute("rows.edited", len(edited))
+        current.set_attribute("bytes", text_bytes(new_entries + edited))
+        current.set_attribute("parser", read['parser'])
+        current.set_attribute("stopped_early", read['stopped'])
+    if feed is None:
+        print(f"WARNING: ⚠️ No data fetched from {name}, skipping...")
+        return None
+    if not new_entries and not edited:
+        print(f"INFO: ⏭️ No new entries from {name}.")
+        return None
+    print(f"INFO: ✅ Fetched {len(new_entries)} new and {len(edited)} edited entries from {name}"
+          f"{' (stopped early)' if read['stopped'] else ''}.")
+    return name, new_entries + edited, high_water_mark(new_entries, run_id)
+
+
+def clean_source(item: tuple):
+    """
+    Stage 2: parse entries into articles and strip their HTML, then group
+    copies of the same wire story (dedup.py; with PIPELINE_DEDUP=collapse
+    the copies go no further)
+    """
+    name, feed, mark = item
+    with span("parse", {"source.name": name, "rows.in": len(feed)}) as current:
+        articles = parse_rss_feed_articles(feed, name, translate=False)
+        if DEDUP_MODE != "off" and articles:
+            conn = store_connection()
+            try:
+                articles, counts = group_duplicates(conn, articles, name)
+                add_run_counts(counts)
+                current.set_attribute("rows.duplicates", counts['dedup_duplicates'])
+            except Exception as e:
+                conn.rollback()
+                print(f"WARNING: ⚠️ Near-duplicate check failed for {name} ({e}), storing every article")
+        current.set_attribute("rows", len(articles))
+        current.set_attribute("bytes", text_bytes(articles))
+    return name, articles, mark
+
+
+def translate_source(item: tuple):
+    """Stage 3: translate the text fields to English"""
+    name, articles, mark = item
+    with span("translate", {"source.name": name, "rows": len(articles)}) as current:
+        articles = translate_articles(articles)
+        current.set_attribute("bytes", text_bytes(articles))
+    print(f"INFO: ✅ Parsed {len(articles)} articles from {name}.")
+    return name, articles, mark
+
+
+def store_source(item: tuple) -> dict:
+    """
+    Stage 4: insert the new articles (duplicates by link are skipped) and
+    update the edited ones, then advance the source's high-water mark
+    
+    Returns:
+        Batch dictionary for the embed stage; the articles travel to the
+        embedding process msgpack-encoded (records.encode)
     """
-    Legacy function: Run the complete pipeline (for backward compatibility)
-    This function can be used when running the pipeline outside of Airflow
+    name, articles, mark = item
+    counts = {}
+    if articles or mark:
+        conn = store_connection()
+        if articles:
+            with span("store", {"source.name": name, "rows": len(articles)}) as current:
+                counts = store_data(articles, conn) or {}
+                current.set_attribute("rows.stored", counts.get('stored', 0))
+                current.set_attribute("rows.updated", counts.get('updated', 0))
+                current.set_attribute("rows.skipped", counts.get('skipped', 0))
+            print("INFO: ✅ Data stored successfully.")
+        # Only after the articles are committed: a crash before this line
+        # means the batch is fetched again (and deduplicated by link). A
+        # batch of collapsed wire copies has no articles but moves the mark.
+        # A batch with failed rows keeps the old mark so they are retried.
+        if counts.get('errors', 0):
+            print(f"WARNING: ⚠️ {name}: {counts['errors']} article(s) failed to store, mark not advanced")
+        else:
+            save_source_state(conn, name, mark, counts.get('stored', 0))
+    return {'source': name, 'articles': encode(articles), 'processed': len(articles),
+            'stored': counts.get('stored', 0), 'updated': counts.get('updated', 0),
+            'skipped': counts.get('skipped', 0)}
+
+
+def queued_embedding(batch: dict) -> dict:
+    """Embed stage with PIPELINE_EMBED_MODE=queue: the stored rows are already queued"""
+    result = {k: v for k, v in batch.items() if k != 'articles'}
+    result['embedded'] = 0
+    return result
+
+
+def build_stages(**overrides) -> list:
     """
-   
+    Stages of the ingestion pipeline; any stage function can be replaced by
+    name (e.g. store=..., embed=...) for tests and benchmarks.
     
+    Returns:
+        List of engine.Stage, fetch -> clean -> translate -> store -> embed
+    """
+    functions = {
+        'fetch': fetch_source,
+        'clean': clean_source,
+        'translate': translate_source,
+        'store': store_source,
+        'embed': embed_batch if EMBED_MODE == 'inline' else queued_embedding,
+        **overrides,
+    }
+    return [
+        Stage('fetch', functions['fetch'], workers=FETCH_WORKERS),
+        Stage('clean', functions['clean'], workers=CLEAN_WORKERS),
+        Stage('translate', functions['translate'], workers=TRANSLATE_WORKERS),
+        Stage('store', functions['store'], workers=STORE_WORKERS),
+        # Encoding is CPU bound: separate processes, each with its own connection
+        Stage('embed', functions['embed'], workers=EMBED_WORKERS, kind='process'),
+    ]
+
+
+def print_stage_summary(stages: Dict[str, Dict[str, Any]]):
+    """
+    Print per-stage throughput and queue waits
     
+    Args:
+        stages: Pipeline.summary()
+    """
+    print(f"\n⚙️ STAGES:")
+    print(f"   {'stage':<11}{'workers':>8}{'in':>6}{'out':>6}{'errors':>7}{'items/s':>9}{'busy %':>8}"
+          f"{'wait in s':>11}{'wait out s':>12}")
+    for name, s in stages.items():
+        print(f"   {name:<11}{s['workers']:>8}{s['items_in']:>6}{s['items_out']:>6}{s['errors']:>7}"
+              f"{s['throughput_per_s']:>9.2f}{s['utilization'] * 100:>8.0f}"
+              f"{s['queue_wait_in_s']:>11.2f}{s['queue_wait_out_s']:>12.2f}")
+
+
+def run_pipeline(engine: str = PIPELINE_ENGINE, full_refresh: bool = FULL_REFRESH):
+    """
+    Run the complete pipeline outside of Airflow: every source flows through
+    fetch -> clean -> translate -> store -> embed. With engine="staged" the
+    stages run concurrently; "serial" handles one source at a time.
     
-    print("INFO: 🚀 Starting the data pipeline...")
+    Only entries past each source's high-water mark are processed, and a
+    run that crashed is resumed; full_refresh processes everything again.
+    """
+    print(f"INFO: 🚀 Starting the data pipeline ({engine}{', full refresh' if full_refresh else ''})...")
     
     # STEP 1: Connect to DB
     print("STEP 1: Connecting to storage...")
     conn = connect_storage()
     print("INFO: ✅ Successfully connected to storage.")
-    
-    total_articles_processed = 0
+    ensure_articles_table(conn)
+    ensure_embedding_column(conn)
+    ensure_state_tables(conn)
+    ensure_dedup_tables(conn)
+    run_id, committed = begin_run(conn, full_refresh)
+    states = {} if full_refresh else load_source_states(conn)
     
     # STEP 2: Process each RSS feed
+    sources = []
     for name, url in finland_rss_feeds:
-        print(f"\nProcessing: {name} - {url}")
         if not url:
             print(f"WARNING: ⚠️ No RSS URL for {name}, skipping...")
             continue
-        
-        # Fetch
-        feed = get_data_from_rss(url)
-        if not feed:
-            print(f"WARNING: ⚠️ No data fetched from {name}, skipping...")
-            continue
-        print(f"INFO: ✅ Fetched {len(feed)} entries from {name}.")
+        sources.append((name, url))
+    sources = [(name, url, states.get(name), run_id) for name, url in pending_sources(sources, committed)]
 
-        
-        # Transform
-        parsed_articles = parse_rss_feed_articles(feed, name)
-        print(f"INFO: ✅ Parsed {len(parsed_articles)} articles from {name}.")
-        
-        if parsed_articles:
-            # Store
-            store_data(parsed_articles, conn)
-            total_articles_processed += len(parsed_articles)
-            print("INFO: ✅ Data stored successfully.")
+    # Sources an ingestion worker (distributed.py) is processing are left to it
+    worker_id = f"pipeline-{run_id}"
+    names = [name for name, *_ in sources]
+    ensure_lease_table(conn, names)
+    leased = claim_sources(conn, worker_id, names, len(names), interval=0, retry=0)
+    busy = [name for name in names if name not in leased]
+    if busy:
+        print(f"INFO: ⏭️ Leased by ingestion workers, skipping: {', '.join(busy)}")
+    sources = [source for source in sources if source[0] in leased]
+
+    pipeline = Pipeline(build_stages(), serial_stage_context=profiling.profile_stage)
+    total_articles_processed = 0
+    total_embedded = 0
+    articles = {'new': 0, 'updated': 0, 'unchanged': 0}
+    finished = []
+    take_run_counts()
+    start = time.perf_counter()
+    # Keeps this run's leases and its pipeline_runs row fresh, so neither is
+    # taken over by another runner while it is live
+    with Heartbeat(worker_id, run_id=run_id):
+        try:
+            # Serial runs profile each stage (run_serial wraps them); a staged run
+            # only gets the overall timings and memory, its stages share threads
+            ingest = (profiling.profile_stage("ingest", cpu_profile=False) if engine == "staged"
+                      else contextlib.nullcontext())
+            with ingest:
+                results = pipeline.run(sources) if engine == "staged" else pipeline.run_serial(sources)
+                for result in results:
+                    finished.append(result['source'])
+                    total_articles_processed += result['processed']
+                    total_embedded += result['embedded']
+                    articles['new'] += result['stored']
+                    articles['updated'] += result.get('updated', 0)
+        finally:
+            close_store_connections()
+            release_sources(conn, worker_id, leased, source_status(leased, finished, pipeline.failures))
+        counts = take_run_counts()
+        articles['unchanged'] = counts.get('unchanged', 0)
+        dedup = dedup_report(counts)
+
+        # Rows left without an embedding by earlier runs
+        if EMBED_MODE == 'inline':
+            total_embedded += embed_missing(conn)
+        finish_run(conn, run_id, 'completed', total_articles_processed)
+    elapsed = time.perf_counter() - start
     
     # STEP 3: Final summary
     text = get_data(conn=conn)
@@ -549,18 +838,59 @@ def run_pipeline():
     
     # Close connection
     conn.close()
-    print(f"\nINFO: 🎉 Data pipeline completed successfully.")
+    stages = pipeline.summary()
+    print(f"\nINFO: 🎉 Data pipeline completed successfully in {elapsed:.1f}s.")
     print(f"Total articles processed: {total_articles_processed}")
-
-    
-    
+    print(f"Articles: {articles['new']} new, {articles['updated']} updated, {articles['unchanged']} unchanged")
+    print_dedup_summary(dedup)
+    print_stage_summary(stages)
 
     return {
         'status': 'completed',
+        'run_id': run_id,
         'total_articles_processed': total_articles_processed,
-        'sources_processed': len(finland_rss_feeds)
+        'articles': articles,
+        'dedup': dedup,
+        'sources_processed': len(finland_rss_feeds),
+        'sources_resumed': len(committed),
+        'embedded': total_embedded,
+        'elapsed_s': round(elapsed, 3),
+        'stages': stages,
+        'profile': profiling.write_reports()
     }
 
+def main(argv=None):
+    """
+    Container entry point: ingest and embed every source.
+    The run joins the trace passed in TRACEPARENT, if any.
+    """
+    parser = argparse.ArgumentParser(description="Run the RSS ingestion pipeline")
+    parser.add_argument("--profile", action="store_true", default=profiling.PROFILE_ENABLED,
+                        help="Profile CPU and memory per stage (or set PIPELINE_PROFILE=true)")
+    parser.add_argument("--profile-dir", default=profiling.PROFILE_DIR,
+                        help="Where .pstats and allocation reports are written")
+    parser.add_argument("--engine", choices=["staged", "serial"], default=PIPELINE_ENGINE,
+                        help="Run stages concurrently (default) or one source at a time; "
+                             "per-stage cProfile output needs serial")
+    parser.add_argument("--full-refresh", action="store_true", default=FULL_REFRESH,
+                        help="Ignore source high-water marks and any crashed run; reprocess every entry "
+                             "(or set PIPELINE_FULL_REFRESH=true)")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profiling.enable(args.profile_dir)
+    init_tracing()
+    attach_parent_from_env()
+    try:
+        with span("pipeline", {"sources": len(finland_rss_feeds)}) as current:
+            result = run_pipeline(args.engine, args.full_refresh)
+            current.set_attribute("rows", result['total_articles_processed'])
+            current.set_attribute("rows.embedded", result['embedded'])
+        profiling.print_profile_summary(profiling.write_reports())
+    finally:
+        shutdown_tracing()
+        profiling.disable()
+
+
 if __name__ == "__main__":
-    run_pipeline()
-    vectordb()
+    main()
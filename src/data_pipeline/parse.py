@@ -3,12 +3,18 @@ TRANSFORM MODULE
 Responsible for cleaning, translating, and structuring RSS feed data
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from deep_translator import GoogleTranslator
 import re
 from bs4 import BeautifulSoup
 
+from .profiling import profiled
+from .records import Article, Entry, from_xcom, to_entry, to_xcom
 
+
+@profiled("transform_rss_data")
 def transform_rss_data(**context):
     """
     Task 2: Transform/Parse the fetched RSS data
@@ -38,18 +44,18 @@ def transform_rss_data(**context):
         print(f"Processing {len(entries)} entries...")
         
         articles = []
-        for i, entry in enumerate(entries, 1):
+        for i, entry in enumerate(from_xcom(entries, Entry), 1):
             try:
                 # Transform each article
-                article = {
-                    "link_name": source_name,
-                    'title': translate_to_english(entry.get('title', '')),
-                    'link': entry.get('link', ''),
-                    'published': entry.get('published', ''),
-                    'summary': translate_to_english(clean_summary_bs4(entry.get('summary', ''))),
-                    'authors': [translate_to_english(author) for author in entry.get('authors', [])],
-                    'tags': [translate_to_english(tag) for tag in entry.get('tags', [])]
-                }
+                article = Article(
+                    link_name=source_name,
+                    title=translate_to_english(entry.title),
+                    link=entry.link,
+                    published=entry.published,
+                    summary=translate_to_english(clean_summary_bs4(entry.summary)),
+                    authors=[translate_to_english(author) for author in entry.authors],
+                    tags=[translate_to_english(tag) for tag in entry.tags]
+                )
                 articles.append(article)
                 
                 if i % 10 == 0:  # Progress indicator
@@ -59,15 +65,15 @@ def transform_rss_data(**context):
                 print(f"❌ Error transforming article {i}: {e}")
                 continue
         
-        transformed_data[source_name] = articles
+        transformed_data[source_name] = to_xcom(articles)
         total_articles += len(articles)
         print(f"✅ Transformed {len(articles)} articles from {source_name}")
         
         # Show sample articles
         print("📖 Sample transformed articles:")
         for i, article in enumerate(articles[:2], 1):
-            title = article.get('title', 'No title')[:50]
-            summary = article.get('summary', 'No summary')[:30]
+            title = (article.title or 'No title')[:50]
+            summary = (article.summary or 'No summary')[:30]
             print(f"   {i}. {title}...")
             print(f"      Summary: {summary}...")
     
@@ -79,16 +85,18 @@ def transform_rss_data(**context):
     return transformed_data
 
 
-def parse_rss_feed_articles(feed: list, name: str) -> List[Dict[str, Any]]:
+def parse_rss_feed_articles(feed: list, name: str, translate: bool = True) -> List[Article]:
     """
     Helper function: Parse articles from RSS feed entries
     
     Args:
-        feed: List of RSS feed entries
+        feed: List of RSS feed entries (Entry records or feedparser entries)
         name: Name of the RSS source
+        translate: Translate text fields to English (pass False to run
+            `translate_articles` as a separate step)
     
     Returns:
-        List of dictionaries with parsed article data
+        List of Article records
     """
     try:
         articles = []
@@ -100,28 +108,58 @@ def parse_rss_feed_articles(feed: list, name: str) -> List[Dict[str, Any]]:
         
         for entry in feed:
             try:
-                article = {
-                    "link_name": name,
-                    'title': translate_to_english(entry.get('title', '')),
-                    'link': entry.get('link', ''),
-                    'published': entry.get('published', ''),
-                    'summary': translate_to_english(clean_summary_bs4(entry.get('summary', ''))),
-                    'authors': [translate_to_english(author.get('name', '')) for author in entry.get('authors', [])] if entry.get('authors') else [],
-                    'tags': [translate_to_english(tag.get('term', '')) for tag in entry.get('tags', [])] if entry.get('tags') else []
-                }
+                entry = to_entry(entry)
+                article = Article(
+                    link_name=name,
+                    title=entry.title,
+                    link=entry.link,
+                    published=entry.published,
+                    summary=clean_summary_bs4(entry.summary),
+                    authors=entry.authors,
+                    tags=entry.tags,
+                    content_hash=entry.content_hash,
+                    update=entry.update
+                )
                 articles.append(article)
             except Exception as e:
                 print(f"Error parsing individual article: {e}")
                 continue
                 
         print(f"Successfully parsed {len(articles)} articles from {name}")
-        return articles
+        return translate_articles(articles) if translate else articles
         
     except Exception as e:
         print(f"Failed to parse articles from {name}: {e}")
         return []
 
 
+def translate_articles(articles: List[Union[Article, Dict[str, Any]]]) -> List[Union[Article, Dict[str, Any]]]:
+    """
+    Translate the text fields of parsed articles to English in place.
+    Edits of stored articles only translate the fields listed in `update`.
+    
+    Args:
+        articles: Articles from parse_rss_feed_articles(..., translate=False)
+    
+    Returns:
+        The same list, translated
+    """
+    for article in articles:
+        try:
+            update = article.get('update')
+            if update:
+                for field in update:
+                    article[field] = translate_to_english(article.get(field, ''))
+                continue
+            article['title'] = translate_to_english(article.get('title', ''))
+            article['summary'] = translate_to_english(article.get('summary', ''))
+            article['authors'] = [translate_to_english(author) for author in article.get('authors', [])]
+            article['tags'] = [translate_to_english(tag) for tag in article.get('tags', [])]
+        except Exception as e:
+            print(f"Error translating article: {e}")
+    return articles
+
+
 def translate_to_english(text: str) -> str:
     """
     Translate Finnish text to English using Google Translator
@@ -214,12 +252,39 @@ def clean_summary_regex(html_summary: str) -> str:
     return text
 
 
-def validate_article_data(article: dict) -> bool:
+def parse_published(published: str) -> Optional[datetime]:
+    """
+    Parse an RSS (RFC 822) or Atom (ISO 8601) publication date
+    
+    Args:
+        published: Date string as found in the feed
+    
+    Returns:
+        Timezone-aware datetime, or None if the string can't be parsed
+    """
+    if not published:
+        return None
+    
+    try:
+        parsed = parsedate_to_datetime(published)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(published.strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    
+    # Naive dates are assumed to be UTC
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def validate_article_data(article: Union[Article, dict]) -> bool:
     """
     Validate that article data contains required fields
     
     Args:
-        article: Article dictionary to validate
+        article: Article record or dictionary to validate
     
     Returns:
         True if article is valid, False otherwise
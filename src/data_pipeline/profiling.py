@@ -0,0 +1,261 @@
+"""
+PROFILING MODULE
+Responsible for opt-in CPU and memory profiling of pipeline stages
+
+Enabled with PIPELINE_PROFILE=true or `python -m src.data_pipeline.main --profile`.
+For every stage (the Airflow task functions and, with --engine serial, fetch,
+clean, translate, store and embed; with --engine staged the whole "ingest"
+run) it records:
+    - a cProfile profile, written as <stage>.pstats
+      (inspect with `python -m pstats` or snakeviz); not for "ingest", whose
+      thread only waits on the stage workers
+    - the tracemalloc peak and the top allocations of the costliest call,
+      written as <stage>.allocations.txt
+    - wall time, CPU time and peak RSS, returned as a summary table
+
+Files go to PIPELINE_PROFILE_DIR/<run id>/. Disabled stages cost one
+function call and a flag check.
+"""
+
+import cProfile
+import functools
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import psutil
+
+PROFILE_ENABLED = os.getenv("PIPELINE_PROFILE", "false").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PIPELINE_PROFILE_DIR", "profiles")
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PIPELINE_PROFILE_TOP_ALLOCATIONS", "15"))
+PROFILE_RSS_INTERVAL = float(os.getenv("PIPELINE_PROFILE_RSS_INTERVAL", "0.05"))
+# Keeps allocation tracebacks this deep; deeper is slower
+TRACEMALLOC_FRAMES = int(os.getenv("PIPELINE_PROFILE_TRACEMALLOC_FRAMES", "5"))
+
+MB = 1024 * 1024
+
+_enabled = False
+_run_dir: Optional[str] = None
+_stages: Dict[str, Dict[str, Any]] = {}
+_profilers: Dict[str, cProfile.Profile] = {}
+_active_profiler: Optional[str] = None
+_sampler = None
+_lock = threading.Lock()
+
+
+class RssSampler(threading.Thread):
+    """
+    Polls the process RSS in the background and raises the peak of every
+    stage that is currently running (stages can nest).
+    """
+
+    def __init__(self, interval: float = PROFILE_RSS_INTERVAL):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.process = psutil.Process()
+        # Keyed by id(): records of nested stages can compare equal
+        self.active: Dict[int, Dict[str, Any]] = {}
+        self.halted = threading.Event()
+
+    def rss(self) -> int:
+        return self.process.memory_info().rss
+
+    def track(self, record: Dict[str, Any]):
+        record["rss_peak"] = self.rss()
+        with _lock:
+            self.active[id(record)] = record
+
+    def untrack(self, record: Dict[str, Any]):
+        self.sample()
+        with _lock:
+            del self.active[id(record)]
+
+    def sample(self):
+        rss = self.rss()
+        with _lock:
+            for record in self.active.values():
+                record["rss_peak"] = max(record["rss_peak"], rss)
+
+    def run(self):
+        while not self.halted.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.halted.set()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable(directory: str = PROFILE_DIR, run_id: Optional[str] = None) -> str:
+    """
+    Turn profiling on for this process (idempotent).
+
+    Args:
+        directory: Base directory for profile files
+        run_id: Sub-directory name; defaults to a timestamp and the pid
+
+    Returns:
+        Directory the profiles are written to
+    """
+    global _enabled, _run_dir, _sampler
+    if _enabled:
+        return _run_dir
+
+    run_id = run_id or f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    _run_dir = os.path.join(directory, run_id)
+    os.makedirs(_run_dir, exist_ok=True)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    _sampler = RssSampler()
+    _sampler.start()
+    _enabled = True
+    print(f"INFO: 🔬 Profiling enabled, writing to {_run_dir}")
+    return _run_dir
+
+
+def fold_traced_peak():
+    """Raise the tracemalloc peak of every running stage to the current one."""
+    peak = tracemalloc.get_traced_memory()[1]
+    with _lock:
+        for record in _sampler.active.values():
+            record["traced_peak"] = max(record.get("traced_peak", 0), peak)
+
+
+@contextmanager
+def profile_stage(name: str, cpu_profile: bool = True):
+    """
+    Profile one execution of a stage; repeated executions (one per source)
+    accumulate under the same name.
+
+    Only the outermost running stage is cProfiled, since a process can have
+    a single active profiler; nested stages still get timings and memory.
+    With cpu_profile=False the stage only gets timings and memory and leaves
+    the profiler to the stages it wraps.
+    """
+    global _active_profiler
+    if not _enabled:
+        yield
+        return
+
+    stage = _stages.setdefault(name, {
+        "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "tracemalloc_peak_mb": 0.0,
+        "rss_peak_mb": 0.0, "rss_growth_mb": 0.0, "top_allocations": [],
+    })
+    record: Dict[str, Any] = {"traced_peak": 0}
+    # reset_peak() is process-wide: keep the peak the running (outer) stages
+    # reached so far before resetting it for this one
+    fold_traced_peak()
+    _sampler.track(record)
+    rss_start = record["rss_peak"]
+    tracemalloc.reset_peak()
+    traced_start = tracemalloc.get_traced_memory()[0]
+    snapshot_start = tracemalloc.take_snapshot()
+
+    profiler = None
+    if cpu_profile and _active_profiler is None:
+        profiler = _profilers.setdefault(name, cProfile.Profile())
+        _active_profiler = name
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            _active_profiler = None
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        fold_traced_peak()
+        traced_peak = (record["traced_peak"] - traced_start) / MB
+        _sampler.untrack(record)
+
+        stage["calls"] += 1
+        stage["wall_s"] += wall
+        stage["cpu_s"] += cpu
+        stage["rss_peak_mb"] = max(stage["rss_peak_mb"], record["rss_peak"] / MB)
+        stage["rss_growth_mb"] = max(stage["rss_growth_mb"], (record["rss_peak"] - rss_start) / MB)
+        if traced_peak >= stage["tracemalloc_peak_mb"]:
+            # Keep the allocation breakdown of the costliest call only
+            stage["tracemalloc_peak_mb"] = traced_peak
+            diff = tracemalloc.take_snapshot().compare_to(snapshot_start, "lineno")
+            stage["top_allocations"] = [str(d) for d in diff[:PROFILE_TOP_ALLOCATIONS]]
+
+
+def profiled(name: str):
+    """
+    Decorator for Airflow task functions: profile the call when enabled and
+    push the stage table to XCom under the key "profile".
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if PROFILE_ENABLED:
+                enable()
+            if not _enabled:
+                return func(*args, **kwargs)
+            with profile_stage(name):
+                result = func(*args, **kwargs)
+            summary = write_reports()
+            print_profile_summary(summary)
+            ti = kwargs.get("ti")
+            if ti is not None:
+                ti.xcom_push(key="profile", value=summary)
+            return result
+        return wrapper
+    return decorator
+
+
+def write_reports() -> Dict[str, Dict[str, Any]]:
+    """
+    Write .pstats and allocation files for every stage profiled so far.
+
+    Returns:
+        {stage: {calls, wall_s, cpu_s, tracemalloc_peak_mb, rss_peak_mb, rss_growth_mb}}
+    """
+    if not _enabled:
+        return {}
+
+    summary = {}
+    for name, stage in _stages.items():
+        profiler = _profilers.get(name)
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(_run_dir, f"{name}.pstats"))
+        with open(os.path.join(_run_dir, f"{name}.allocations.txt"), "w", encoding="utf-8") as f:
+            f.write(f"{name}: tracemalloc peak {stage['tracemalloc_peak_mb']:.1f} MB\n")
+            f.write("\n".join(stage["top_allocations"]) + "\n")
+        summary[name] = {k: round(v, 3) if isinstance(v, float) else v
+                         for k, v in stage.items() if k != "top_allocations"}
+    return summary
+
+
+def print_profile_summary(summary: Dict[str, Dict[str, Any]]):
+    """
+    Print the per-stage table.
+
+    Args:
+        summary: Output of write_reports()
+    """
+    if not summary:
+        return
+    print(f"\n🔬 PROFILE ({_run_dir or PROFILE_DIR}):")
+    print(f"   {'stage':<16}{'calls':>6}{'wall s':>10}{'cpu s':>10}{'py peak MB':>12}{'rss peak MB':>13}{'rss +MB':>9}")
+    for name, s in summary.items():
+        print(f"   {name:<16}{s['calls']:>6}{s['wall_s']:>10.2f}{s['cpu_s']:>10.2f}"
+              f"{s['tracemalloc_peak_mb']:>12.1f}{s['rss_peak_mb']:>13.1f}{s['rss_growth_mb']:>9.1f}")
+
+
+def disable():
+    """Stop the RSS sampler and tracemalloc (profile data is kept)."""
+    global _enabled
+    if _sampler is not None:
+        _sampler.stop()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled = False
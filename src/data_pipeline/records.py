@@ -0,0 +1,140 @@
+"""
+RECORDS MODULE
+Responsible for the typed records that travel between pipeline stages
+
+Entry is one feed item as fetched, Article one parsed article. Both are
+msgspec Structs:
+    - array_like: encoded as a positional array, so field names are not
+      repeated for every record (msgpack between processes, JSON in XCom)
+    - gc=False: they only hold strings and lists of strings, so the cycle
+      collector can skip them
+    - no FeedParserDict (or lxml element) stays alive once converted
+
+For code written against dicts, records also support article.get(name),
+article[name] and article[name] = value.
+
+An Article with a non-empty `update` is an edit of a stored article (see
+state.detect_changes): only the listed fields are translated and written.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Type, TypeVar, Union
+
+import msgspec
+
+R = TypeVar("R", bound="Record")
+
+
+class Record(msgspec.Struct, array_like=True, gc=False):
+    """Dict-style access on top of the struct fields."""
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name, default)
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name: str, value: Any):
+        setattr(self, name, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return msgspec.structs.asdict(self)
+
+
+class Entry(Record):
+    title: str = ""
+    link: str = ""
+    id: str = ""
+    published: str = ""
+    summary: str = ""
+    authors: List[str] = []
+    tags: List[str] = []
+    # Change detection (state.detect_changes): hash of the source text, and
+    # for an edited stored article the fields to translate and update again
+    content_hash: str = ""
+    update: List[str] = []
+
+
+class Article(Record):
+    link_name: str
+    title: str = ""
+    link: str = ""
+    published: str = ""
+    summary: str = ""
+    authors: List[str] = []
+    tags: List[str] = []
+    content_hash: str = ""
+    update: List[str] = []
+    # Near-duplicate group (dedup.group_duplicates)
+    story_id: Optional[int] = None
+
+
+def _names(values, key: str) -> List[str]:
+    # feedparser: [{'name': ...}] / [{'term': ...}]; records: plain strings
+    names = []
+    for value in values or []:
+        name = value.get(key, '') if hasattr(value, 'get') else value
+        if name:
+            names.append(name)
+    return names
+
+
+def to_entry(entry) -> Entry:
+    """
+    Copy the fields the pipeline uses out of a feedparser entry (or a
+    stream dict), so the source object can be freed.
+    """
+    if isinstance(entry, Entry):
+        return entry
+    return Entry(
+        title=entry.get('title', '') or '',
+        link=entry.get('link', '') or '',
+        id=entry.get('id', '') or entry.get('guid', '') or '',
+        published=entry.get('published', '') or '',
+        summary=entry.get('summary', '') or '',
+        authors=_names(entry.get('authors'), 'name'),
+        tags=_names(entry.get('tags'), 'term'),
+        content_hash=entry.get('content_hash', '') or '',
+        update=list(entry.get('update') or []),
+    )
+
+
+def from_dict(data: Dict[str, Any], kind: Type[R] = Article) -> R:
+    """Build a record from a dict; unknown keys are ignored."""
+    return kind(**{name: data[name] for name in kind.__struct_fields__ if data.get(name) is not None})
+
+
+def to_article(article: Union[Article, Dict[str, Any]]) -> Article:
+    return article if isinstance(article, Article) else from_dict(article, Article)
+
+
+# -----------------------------
+# Handoff
+# -----------------------------
+_encoder = msgspec.msgpack.Encoder()
+_decoders = {Entry: msgspec.msgpack.Decoder(List[Entry]), Article: msgspec.msgpack.Decoder(List[Article])}
+
+
+def encode(records: Iterable[Record]) -> bytes:
+    """msgpack encoding of a list of records."""
+    return _encoder.encode(list(records))
+
+
+def decode(data: bytes, kind: Type[R] = Article) -> List[R]:
+    return _decoders[kind].decode(data)
+
+
+def to_xcom(records: Iterable[Record]) -> list:
+    """JSON-compatible form (one array per record) for XCom."""
+    return msgspec.to_builtins(list(records))
+
+
+def from_xcom(value, kind: Type[R] = Article) -> List[R]:
+    """Inverse of to_xcom; also accepts lists of dicts pushed by older runs."""
+    if not value:
+        return []
+    if isinstance(value[0], dict):
+        return [from_dict(v, kind) for v in value]
+    return msgspec.convert(value, List[kind])
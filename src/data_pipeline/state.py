@@ -0,0 +1,369 @@
+"""
+STATE MODULE
+Responsible for per-source high-water marks and run bookkeeping
+
+source_state keeps, per source, the newest entry already stored (GUID, link
+and publication time) and the run that stored it. Fetch drops everything at
+or behind that mark, so a run only parses, translates and stores what is
+new. The mark only moves after the source's articles are committed, so a
+crashed run loses at most the batch that was in flight.
+
+pipeline_runs records every standalone run. A live run renews its
+heartbeat_at (distributed.Heartbeat); a run left in "running" state without
+a heartbeat for PIPELINE_RUN_STALE_S (crashed) is resumed by the next one,
+which skips the sources the crashed run already committed. A run that is
+still live is left alone, and the new one starts beside it. --full-refresh
+ignores both.
+
+Publishers edit headlines and summaries after publication. With
+PIPELINE_DETECT_EDITS on, fetch also reads the stored entries published
+within the last PIPELINE_EDIT_WINDOW_HOURS and compares a hash of each
+one's source title and summary (articles.content_hash) with the stored
+one: only entries whose hash changed go on, marked with the fields to
+translate and update again. Older entries are neither read nor checked.
+"""
+
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .parse import clean_summary_regex, parse_published
+from .storage import add_column
+
+FULL_REFRESH = os.getenv("PIPELINE_FULL_REFRESH", "false").lower() in ("1", "true", "yes")
+DETECT_EDITS = os.getenv("PIPELINE_DETECT_EDITS", "true").lower() in ("1", "true", "yes")
+# Stored entries published this recently are checked for edits
+EDIT_WINDOW_HOURS = float(os.getenv("PIPELINE_EDIT_WINDOW_HOURS", "48"))
+# A running run without a heartbeat for this long has crashed (live runs beat
+# every PIPELINE_LEASE_TTL_S / 3, see distributed.Heartbeat)
+RUN_STALE_S = float(os.getenv("PIPELINE_RUN_STALE_S", "600"))
+
+STATE_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS source_state (
+        source TEXT PRIMARY KEY,
+        last_guid TEXT,
+        last_link TEXT,
+        last_published_at TIMESTAMPTZ,
+        last_run_id TEXT,
+        last_success_at TIMESTAMPTZ,
+        articles_total BIGINT DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS pipeline_runs (
+        run_id TEXT PRIMARY KEY,
+        started_at TIMESTAMPTZ DEFAULT now(),
+        finished_at TIMESTAMPTZ,
+        status TEXT NOT NULL DEFAULT 'running',
+        full_refresh BOOLEAN DEFAULT FALSE,
+        articles_processed BIGINT,
+        heartbeat_at TIMESTAMPTZ
+    );
+    ALTER TABLE pipeline_runs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+"""
+
+
+def ensure_state_tables(conn):
+    with conn.cursor() as cur:
+        cur.execute(STATE_TABLES_SQL)
+        # Edit detection (articles itself is created by init.sql / storage.py);
+        # add_column skips the locking ALTER once the columns exist
+        cur.execute("SELECT to_regclass('articles')")
+        if cur.fetchone()[0] is not None:
+            add_column(cur, "articles", "content_hash", "TEXT")
+            add_column(cur, "articles", "embedding_stale", "BOOLEAN NOT NULL DEFAULT FALSE")
+    conn.commit()
+
+
+# -----------------------------
+# High-water marks
+# -----------------------------
+def entry_guid(entry) -> str:
+    return entry.get('id') or entry.get('guid') or entry.get('link', '')
+
+
+def load_source_states(conn) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns:
+        {source: {'last_guid', 'last_link', 'last_published_at', 'last_run_id'}}
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT source, last_guid, last_link, last_published_at, last_run_id FROM source_state")
+        return {
+            source: {'last_guid': guid, 'last_link': link, 'last_published_at': published_at, 'last_run_id': run_id}
+            for source, guid, link, published_at, run_id in cur.fetchall()
+        }
+
+
+def unseen_entries(entries: list, state: Optional[Dict[str, Any]]) -> list:
+    """
+    Entries newer than the source's high-water mark.
+
+    Feeds list newest first, so reading stops at the last stored entry;
+    entries published before the mark are dropped too, for feeds that
+    reorder or re-publish items.
+
+    Args:
+        entries: Feed entries in feed order
+        state: Row of load_source_states(), or None for a new source
+
+    Returns:
+        The new entries, in feed order
+    """
+    if not state:
+        return list(entries)
+
+    new = []
+    watermark = state.get('last_published_at')
+    for entry in entries:
+        if entry_guid(entry) == state.get('last_guid') or entry.get('link') == state.get('last_link'):
+            break
+        published = parse_published(entry.get('published', ''))
+        if watermark and published and published < watermark:
+            continue
+        new.append(entry)
+    return new
+
+
+def high_water_mark(entries: list, run_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Mark to record once `entries` are stored: the newest entry by
+    publication time (the first one if no entry has a date).
+
+    Returns:
+        {'run_id', 'guid', 'link', 'published_at' (ISO string)}, or None
+        without entries
+    """
+    if not entries:
+        return None
+    dated = [(parse_published(e.get('published', '')), i) for i, e in enumerate(entries)]
+    dated = [(published, i) for published, i in dated if published]
+    newest = entries[max(dated)[1]] if dated else entries[0]
+    published = max(dated)[0] if dated else None
+    return {
+        'run_id': run_id,
+        'guid': entry_guid(newest),
+        'link': newest.get('link', ''),
+        'published_at': published.isoformat() if published else None,
+    }
+
+
+def save_source_state(conn, source: str, mark: Optional[Dict[str, Any]], stored: int = 0):
+    """
+    Advance the source's mark after its articles are committed. The
+    publication watermark never moves backwards.
+    """
+    if not mark:
+        return
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO source_state (source, last_guid, last_link, last_published_at, last_run_id,
+                                      last_success_at, articles_total)
+            VALUES (%s, %s, %s, %s, %s, now(), %s)
+            ON CONFLICT (source) DO UPDATE SET
+                last_guid = EXCLUDED.last_guid,
+                last_link = EXCLUDED.last_link,
+                last_published_at = GREATEST(source_state.last_published_at, EXCLUDED.last_published_at),
+                last_run_id = EXCLUDED.last_run_id,
+                last_success_at = now(),
+                articles_total = source_state.articles_total + EXCLUDED.articles_total
+            """,
+            (source, mark['guid'], mark['link'], mark['published_at'], mark['run_id'], stored)
+        )
+    conn.commit()
+
+
+# -----------------------------
+# Change detection
+# -----------------------------
+HASHED_FIELDS = ('title', 'summary')
+
+
+def _digest(text: str) -> str:
+    # Markup and whitespace are not content: a new image URL is not an edit
+    text = " ".join(clean_summary_regex(text or '').split())
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def content_hash(entry) -> str:
+    """
+    Hash of an entry's source (untranslated) title and summary, one digest
+    per field so an edit can be narrowed down to the fields it touched.
+
+    Returns:
+        '<title digest>:<summary digest>'
+    """
+    return ":".join(_digest(entry.get(field, '')) for field in HASHED_FIELDS)
+
+
+def changed_fields(old: Optional[str], new: str) -> List[str]:
+    """Fields whose digest differs between two content_hash() values."""
+    if not old:
+        return list(HASHED_FIELDS)
+    return [field for field, a, b in zip(HASHED_FIELDS, old.split(":"), new.split(":")) if a != b]
+
+
+def stored_hashes(conn, links: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Returns:
+        {link: content_hash} of the links already stored; the hash is None
+        for rows stored before content hashes existed
+    """
+    if not links:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute("SELECT link, content_hash FROM articles WHERE link = ANY(%s)", (list(links),))
+        return dict(cur.fetchall())
+
+
+def adopt_hashes(conn, hashes: Dict[str, str]):
+    """
+    Record the current hash of rows stored without one, without touching
+    their text. The caller commits.
+    """
+    if not hashes:
+        return
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE articles a SET content_hash = v.content_hash
+            FROM unnest(%s::text[], %s::text[]) AS v(link, content_hash)
+            WHERE a.link = v.link AND a.content_hash IS NULL
+            """,
+            (list(hashes), list(hashes.values()))
+        )
+
+
+def edit_window_start() -> datetime:
+    """Entries published before this are no longer checked for edits."""
+    return datetime.now(timezone.utc) - timedelta(hours=EDIT_WINDOW_HOURS)
+
+
+def detect_changes(conn, entries: list, state: Optional[Dict[str, Any]],
+                   edits_since: Optional[datetime] = None) -> Tuple[list, list, Dict[str, int]]:
+    """
+    Split a feed into new entries and edited stored entries.
+
+    Only entries past the high-water mark or published since `edits_since`
+    (undated ones too) are looked at; each gets its content_hash. A stored
+    entry is edited when its hash differs from the stored one; its `update`
+    lists the fields that changed. Stored rows without a hash (older runs)
+    are assumed current and get the hash recorded. Entries not stored are
+    new if they are past the high-water mark (unseen_entries), and dropped
+    otherwise.
+
+    Args:
+        conn: Database connection
+        entries: Entry records in feed order
+        state: Row of load_source_states(), or None
+        edits_since: Start of the edit window (edit_window_start()), or
+            None to check every entry
+
+    Returns:
+        (new entries, edited entries, {'new', 'edited', 'unchanged'})
+    """
+    unseen = {id(entry) for entry in unseen_entries(entries, state)}
+    if edits_since is not None:
+        recent = []
+        for entry in entries:
+            published = parse_published(entry.get('published', ''))
+            if id(entry) in unseen or not published or published >= edits_since:
+                recent.append(entry)
+        entries = recent
+    for entry in entries:
+        entry.content_hash = content_hash(entry)
+
+    new, edited, adopted = [], [], {}
+    # Always end the transaction: an idle one keeps a lock on articles that
+    # blocks the store stage's DDL for the rest of the run
+    try:
+        stored = stored_hashes(conn, [entry.link for entry in entries if entry.link])
+        for entry in entries:
+            if entry.link not in stored:
+                if id(entry) in unseen:
+                    new.append(entry)
+            elif stored[entry.link] is None:
+                adopted[entry.link] = entry.content_hash
+            elif stored[entry.link] != entry.content_hash:
+                entry.update = changed_fields(stored[entry.link], entry.content_hash)
+                edited.append(entry)
+        adopt_hashes(conn, adopted)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    unchanged = sum(1 for entry in entries if entry.link in stored) - len(edited)
+    return new, edited, {'new': len(new), 'edited': len(edited), 'unchanged': unchanged}
+
+
+# -----------------------------
+# Runs
+# -----------------------------
+def begin_run(conn, full_refresh: bool = FULL_REFRESH, stale_s: float = RUN_STALE_S) -> Tuple[str, Set[str]]:
+    """
+    Start a run, or resume the last one that crashed: still "running", but
+    without a heartbeat for `stale_s`. Live runs are never resumed or
+    abandoned.
+
+    Returns:
+        (run id, sources the resumed run already committed)
+    """
+    stale = """
+        status = 'running'
+        AND COALESCE(heartbeat_at, started_at) < now() - make_interval(secs => %s)
+    """
+    with conn.cursor() as cur:
+        row = None
+        if not full_refresh:
+            # Claimed by renewing its heartbeat, so two starting runners can't both resume it
+            cur.execute(
+                f"""
+                UPDATE pipeline_runs SET heartbeat_at = now()
+                WHERE run_id = (
+                    SELECT run_id FROM pipeline_runs WHERE {stale}
+                    ORDER BY started_at DESC LIMIT 1 FOR UPDATE SKIP LOCKED
+                )
+                RETURNING run_id
+                """,
+                (stale_s,)
+            )
+            row = cur.fetchone()
+        if row:
+            run_id = row[0]
+            cur.execute("SELECT source FROM source_state WHERE last_run_id = %s", (run_id,))
+            done = {source for (source,) in cur.fetchall()}
+            conn.commit()
+            print(f"INFO: ♻️ Resuming run {run_id}: {len(done)} sources already committed.")
+            return run_id, done
+
+        cur.execute(f"UPDATE pipeline_runs SET status = 'abandoned', finished_at = now() WHERE {stale}", (stale_s,))
+        run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        cur.execute("INSERT INTO pipeline_runs (run_id, full_refresh, heartbeat_at) VALUES (%s, %s, now())",
+                    (run_id, full_refresh))
+    conn.commit()
+    return run_id, set()
+
+
+def touch_run(conn, run_id: str):
+    """Renew a live run's heartbeat so begin_run doesn't take it for crashed."""
+    with conn.cursor() as cur:
+        cur.execute("UPDATE pipeline_runs SET heartbeat_at = now() WHERE run_id = %s AND status = 'running'",
+                    (run_id,))
+    conn.commit()
+
+
+def finish_run(conn, run_id: str, status: str, articles_processed: int):
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE pipeline_runs SET status = %s, finished_at = now(), articles_processed = %s WHERE run_id = %s",
+            (status, articles_processed, run_id)
+        )
+    conn.commit()
+
+
+def pending_sources(sources: List[Tuple[str, str]], done: Set[str]) -> List[Tuple[str, str]]:
+    skipped = [name for name, _ in sources if name in done]
+    if skipped:
+        print(f"INFO: ⏭️ Skipping {len(skipped)} sources committed before the crash.")
+    return [(name, url) for name, url in sources if name not in done]
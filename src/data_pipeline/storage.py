@@ -6,11 +6,15 @@ Responsible for database operations and data persistence
 import psycopg2
 import os 
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union
 
+from .profiling import profiled
+from .records import Article, from_xcom
 
 
 
+
+@profiled("store_rss_data")
 def store_rss_data(**context):
     """
     Task 3: Store the transformed data in PostgreSQL
@@ -41,6 +45,7 @@ def store_rss_data(**context):
         processing_errors = 0
         
         for source_name, articles in transformed_data.items():
+            articles = from_xcom(articles, Article)
             if not articles:
                 print(f"⚠️ No articles to store for {source_name}")
                 continue
@@ -172,6 +177,30 @@ def connect_storage():
         raise
 
 
+def add_column(cursor, table: str, column: str, definition: str):
+    """
+    ALTER TABLE ... ADD COLUMN, only if the column is missing: even with
+    IF NOT EXISTS the ALTER waits for and takes an ACCESS EXCLUSIVE lock.
+    """
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s",
+        (table, column)
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+
+
+def ensure_articles_table(conn):
+    """
+    One-time setup at pipeline start (storage/init.sql does the same): the
+    articles table, its columns and indexes. store_data runs no DDL.
+    """
+    with conn.cursor() as cursor:
+        create_articles_table(cursor)
+    conn.commit()
+
+
 def create_articles_table(cursor):
     """
     Create the articles table if it doesn't exist
@@ -208,6 +237,23 @@ def create_articles_table(cursor):
             CREATE INDEX IF NOT EXISTS idx_articles_published ON articles(published);
         """)
         
+        # Retrieval filters: source + date range (btree) and tags (GIN)
+        add_column(cursor, "articles", "published_at", "TIMESTAMPTZ")
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_articles_link_name_published_at ON articles(link_name, published_at);
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_articles_published_at ON articles(published_at);
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_articles_tags ON articles USING GIN (tags);
+        """)
+        
+        backfill_published_at(cursor)
+        
         print("✅ Articles table and indexes ensured")
         
     except Exception as e:
@@ -215,12 +261,47 @@ def create_articles_table(cursor):
         raise
 
 
-def validate_article_for_storage(article: dict) -> bool:
+def backfill_published_at(cursor, batch_size: int = 1000) -> int:
+    """
+    Fill published_at for rows stored before the column existed.
+    Unparseable dates fall back to created_at so every row stays filterable.
+    
+    Args:
+        cursor: Database cursor
+        batch_size: Rows updated per statement
+    
+    Returns:
+        Number of rows updated
+    """
+    from psycopg2.extras import execute_values
+    from .parse import parse_published
+    
+    cursor.execute("SELECT id, published, created_at FROM articles WHERE published_at IS NULL")
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+    
+    values = [(row_id, parse_published(published) or created_at) for row_id, published, created_at in rows]
+    execute_values(
+        cursor,
+        """
+        UPDATE articles AS a SET published_at = v.published_at::timestamptz
+        FROM (VALUES %s) AS v(id, published_at)
+        WHERE a.id = v.id
+        """,
+        values,
+        page_size=batch_size
+    )
+    print(f"✅ Backfilled published_at for {len(values)} articles")
+    return len(values)
+
+
+def validate_article_for_storage(article: Union[Article, dict]) -> bool:
     """
     Validate article data before storage
     
     Args:
-        article: Article dictionary to validate
+        article: Article record or dictionary to validate
     
     Returns:
         True if valid, False otherwise
@@ -264,74 +345,127 @@ def article_exists(cursor, link: str) -> bool:
         return False
 
 
-def insert_article(cursor, article: dict):
+def insert_article(cursor, article: Union[Article, dict]):
     """
     Insert a single article into the database
     
     Args:
         cursor: Database cursor
-        article: Article dictionary to insert
+        article: Article record or dictionary to insert
     """
+    from .parse import parse_published
+    
     cursor.execute(
         """
-        INSERT INTO articles (link_name, title, link, published, summary, authors, tags)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        INSERT INTO articles (link_name, title, link, published, published_at, summary, authors, tags,
+                              content_hash, story_id)
+        VALUES (%s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP), %s, %s, %s, %s, %s)
         """,
         (
             article.get('link_name', ''),
             article.get('title', ''),
             article.get('link', ''),
             article.get('published', ''),
+            parse_published(article.get('published', '')),
             article.get('summary', ''),
             article.get('authors', []),
-            article.get('tags', [])
+            article.get('tags', []),
+            article.get('content_hash') or None,
+            article.get('story_id')
         )
     )
 
 
-def store_data(articles: List[Dict[str, Any]], conn):
+def update_article(cursor, article: Union[Article, dict]) -> bool:
+    """
+    Write an edit of a stored article: only the fields in article['update'],
+    the new content hash and updated_at. The embedding is kept for search
+    but marked stale, so it is computed again.
+    
+    Args:
+        cursor: Database cursor
+        article: Article record (or dictionary) with 'update' set
+    
+    Returns:
+        True if a row was updated
+    """
+    from psycopg2 import sql
+    
+    fields = [field for field in article.get('update') or [] if field in ('title', 'summary')]
+    if not fields:
+        return False
+    cursor.execute(
+        sql.SQL("""
+        UPDATE articles SET {}, content_hash = %s, updated_at = CURRENT_TIMESTAMP, embedding_stale = TRUE
+        WHERE link = %s
+        """).format(sql.SQL(", ").join([sql.SQL("{} = %s").format(sql.Identifier(field)) for field in fields])),
+        [article.get(field, '') for field in fields] + [article.get('content_hash') or None, article.get('link', '')]
+    )
+    return cursor.rowcount > 0
+
+
+def store_data(articles: List[Union[Article, Dict[str, Any]]], conn):
     """
     Legacy function: Store articles in database (for backward compatibility)
     
     Args:
-        articles: List of article dictionaries
+        articles: List of Article records (or article dictionaries); those
+            with 'update' set are edits of stored articles
         conn: Database connection
+    
+    Returns:
+        Dictionary with stored, updated, skipped and failed ('errors') counts
     """
     cursor = conn.cursor()
    
     
     try:
-        create_articles_table(cursor)
-        
         stored_count = 0
+        updated_count = 0
         skipped_count = 0
+        error_count = 0
         
         for article in articles:
+            # A failing article only undoes itself, not the rows before it
+            cursor.execute("SAVEPOINT store_article")
             try:
                 if not validate_article_for_storage(article):
+                    cursor.execute("RELEASE SAVEPOINT store_article")
                     continue
                 
-                if article_exists(cursor, article.get('link', '')):
+                if article.get('update'):
+                    # Only the changed fields of an edit are translated: never insert it as new
+                    if update_article(cursor, article):
+                        updated_count += 1
+                        print(f"✅ Updated ({', '.join(article['update'])}): {article.get('title', 'No title')[:50]}...")
+                    else:
+                        skipped_count += 1
+                        print(f"Edited article is no longer stored: {article.get('title', 'No title')[:50]}...")
+                elif article_exists(cursor, article.get('link', '')):
                     skipped_count += 1
                     print(f"Article already exists: {article.get('title', 'No title')[:50]}...")
                 else:
                     insert_article(cursor, article)
                     stored_count += 1
                     print(f"✅ Stored: {article.get('title', 'No title')[:50]}...")
+                cursor.execute("RELEASE SAVEPOINT store_article")
                     
             except psycopg2.IntegrityError:
                 skipped_count += 1
-                conn.rollback()
+                cursor.execute("ROLLBACK TO SAVEPOINT store_article")
                 continue
             except Exception as e:
                 print(f"Error storing article: {e}")
-                conn.rollback()
+                error_count += 1
+                cursor.execute("ROLLBACK TO SAVEPOINT store_article")
                 continue
                 
         
         conn.commit()
         
-        print(f"Storage complete - Stored: {stored_count}, Skipped: {skipped_count}")
+        print(f"Storage complete - Stored: {stored_count}, Updated: {updated_count}, Skipped: {skipped_count}, "
+              f"Errors: {error_count}")
+        return {'stored': stored_count, 'updated': updated_count, 'skipped': skipped_count, 'errors': error_count}
         
     except Exception as error:
         print(f"Failed to store data: {error}")
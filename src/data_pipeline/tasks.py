@@ -0,0 +1,423 @@
+"""
+TASKS MODULE
+Responsible for the per-source Airflow tasks (see dags/my_pipeline.py)
+
+Every step runs in its own container and hands its output to the next one
+as a Parquet file on a shared volume; only a small reference goes through
+XCom:
+
+    python -m src.data_pipeline.tasks sources   --run-dir DIR
+    python -m src.data_pipeline.tasks fetch     --run-dir DIR --source NAME
+    python -m src.data_pipeline.tasks transform --run-dir DIR --input REF
+    python -m src.data_pipeline.tasks store     --run-dir DIR --input REF
+    python -m src.data_pipeline.tasks embed
+    python -m src.data_pipeline.tasks summary   --run-dir DIR
+    python -m src.data_pipeline.tasks cleanup   --run-dir DIR
+
+A reference is {'source', 'path', 'rows', 'bytes', 'mark'}; path is None
+when a source had nothing (new) to hand on, and mark is the high-water mark
+(state.py) that store saves once the rows are committed. Fetch skips entries
+behind the mark unless --full-refresh or PIPELINE_FULL_REFRESH is set, except
+stored entries published within PIPELINE_EDIT_WINDOW_HOURS whose text was
+edited (PIPELINE_DETECT_EDITS). Fetch leases the source in source_leases
+(distributed.py) for the run and store releases it, so a source an
+ingestion worker is processing is skipped; the lease lasts
+PIPELINE_TASK_LEASE_TTL_S in case a step fails for good. The result of each
+step is pickled to PIPELINE_XCOM_PATH, which
+DockerOperator(retrieve_output=True) reads back as the task's XCom, and
+also printed as JSON. Each step writes the same
+reference next to its Parquet file, so the summary can be built from the
+run directory instead of the metadata DB.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import re
+import shutil
+from typing import Any, Dict, List, Optional, Type
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .dedup import DEDUP_MODE, dedup_report, ensure_dedup_tables, group_duplicates
+from .distributed import claim_sources, ensure_lease_table, release_sources
+from .feed_stream import read_feed
+from .parse import parse_rss_feed_articles, translate_articles
+from .records import Article, Entry, R, from_dict
+from .state import (DETECT_EDITS, FULL_REFRESH, detect_changes, edit_window_start, ensure_state_tables,
+                    high_water_mark, save_source_state, unseen_entries)
+from .storage import connect_storage, ensure_articles_table, store_data
+from .tracing import attach_parent_from_env, init_tracing, shutdown_tracing, span
+
+HANDOFF_DIR = os.getenv("PIPELINE_HANDOFF_DIR", "/data/handoff")
+XCOM_PATH = os.getenv("PIPELINE_XCOM_PATH", "/tmp/script.out")
+PARQUET_COMPRESSION = os.getenv("PIPELINE_PARQUET_COMPRESSION", "zstd")
+# No heartbeat between the containers of a run: the lease covers all its steps
+TASK_LEASE_TTL_S = float(os.getenv("PIPELINE_TASK_LEASE_TTL_S", "3600"))
+
+ENTRY_SCHEMA = pa.schema([
+    ("title", pa.string()),
+    ("link", pa.string()),
+    ("published", pa.string()),
+    ("summary", pa.string()),
+    ("authors", pa.list_(pa.string())),
+    ("tags", pa.list_(pa.string())),
+    ("content_hash", pa.string()),
+    ("update", pa.list_(pa.string())),
+])
+
+ARTICLE_SCHEMA = pa.schema([("link_name", pa.string())] + list(ENTRY_SCHEMA) + [("story_id", pa.int64())])
+
+
+# -----------------------------
+# Handoff files
+# -----------------------------
+def slugify(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", value).strip("_") or "source"
+
+
+def run_directory(run_id: str, base: str = HANDOFF_DIR) -> str:
+    """Directory holding the handoff files of one DAG run."""
+    return os.path.join(base, slugify(run_id))
+
+
+def write_table(rows: list, schema: pa.Schema, run_dir: str, step: str,
+                source: str) -> Dict[str, Any]:
+    """
+    Write `rows` (records or dictionaries) as <run_dir>/<step>/<source>.parquet
+    (plus its .json reference).
+
+    Returns:
+        Reference dictionary for the next step
+    """
+    ref = {'source': source, 'path': None, 'rows': len(rows), 'bytes': 0}
+    if rows:
+        directory = os.path.join(run_dir, step)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, slugify(source) + ".parquet")
+        table = pa.table({name: [row.get(name) for row in rows] for name in schema.names}, schema=schema)
+        # Write-then-rename: a retried task never leaves a half file behind
+        pq.write_table(table, path + ".tmp", compression=PARQUET_COMPRESSION)
+        os.replace(path + ".tmp", path)
+        ref.update(path=path, bytes=os.path.getsize(path))
+    return write_ref(ref, run_dir, step, source)
+
+
+def write_ref(ref: Dict[str, Any], run_dir: str, step: str, source: str) -> Dict[str, Any]:
+    directory = os.path.join(run_dir, step)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, slugify(source) + ".json"), "w", encoding="utf-8") as f:
+        json.dump(ref, f)
+    return ref
+
+
+def read_table(ref: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if not ref.get('path'):
+        return []
+    return pq.read_table(ref['path']).to_pylist()
+
+
+def read_records(ref: Dict[str, Any], kind: Type[R]) -> List[R]:
+    return [from_dict(row, kind) for row in read_table(ref)]
+
+
+def parse_ref(value: str) -> Dict[str, Any]:
+    ref = json.loads(value) if isinstance(value, str) else value
+    if not isinstance(ref, dict) or 'source' not in ref:
+        raise ValueError(f"Not a handoff reference: {value!r}")
+    return ref
+
+
+# -----------------------------
+# Steps
+# -----------------------------
+def list_sources(run_dir: str) -> List[str]:
+    """
+    Names of the sources with a feed URL, one mapped task group each.
+    Runs once per DAG run, so it also sets up the articles schema that the
+    store steps write to.
+    """
+    from .main import finland_rss_feeds
+
+    os.makedirs(run_dir, exist_ok=True)
+    conn = connect_storage()
+    try:
+        ensure_articles_table(conn)
+        ensure_state_tables(conn)
+        ensure_dedup_tables(conn)
+    finally:
+        conn.close()
+    return [name for name, url in finland_rss_feeds if url]
+
+
+def source_url(name: str) -> str:
+    from .main import finland_rss_feeds
+
+    for source, url in finland_rss_feeds:
+        if source == name and url:
+            return url
+    raise ValueError(f"Unknown source: {name}")
+
+
+def source_state(source: str) -> Optional[Dict[str, Any]]:
+    from .state import load_source_states
+
+    conn = connect_storage()
+    try:
+        ensure_state_tables(conn)
+        return load_source_states(conn).get(source)
+    finally:
+        conn.close()
+
+
+def lease_source(run_dir: str, source: str) -> Optional[str]:
+    """
+    Lease `source` for this DAG run.
+
+    Returns:
+        The lease holder id, or None when another worker holds the source
+    """
+    worker_id = f"airflow-{os.path.basename(run_dir)}"
+    conn = connect_storage()
+    try:
+        ensure_lease_table(conn, [source])
+        leased = claim_sources(conn, worker_id, [source], 1, TASK_LEASE_TTL_S, interval=0, retry=0)
+    finally:
+        conn.close()
+    return worker_id if leased else None
+
+
+def fetch_step(run_dir: str, source: str, full_refresh: bool = FULL_REFRESH) -> Dict[str, Any]:
+    url = source_url(source)
+    lease = lease_source(run_dir, source)
+    if lease is None:
+        print(f"INFO: ⏭️ {source} is leased by an ingestion worker, skipping.")
+        ref = write_table([], ENTRY_SCHEMA, run_dir, "fetch", source)
+        ref.update(mark=None, unchanged=0, lease=None)
+        return write_ref(ref, run_dir, "fetch", source)
+    state = None if full_refresh else source_state(source)
+    with span("fetch", {"source.name": source, "source.url": url}) as current:
+        since = edit_window_start() if DETECT_EDITS else None
+        feed, read = read_feed(url, state, since)
+        if feed is None:
+            # Let Airflow retry this source (and only this one)
+            raise RuntimeError(f"Fetching {source} failed")
+        if DETECT_EDITS:
+            conn = connect_storage()
+            try:
+                entries, edited, changes = detect_changes(conn, feed, state, since)
+            finally:
+                conn.close()
+        else:
+            entries, edited, changes = unseen_entries(feed, state), [], {}
+        ref = write_table(entries + edited, ENTRY_SCHEMA, run_dir, "fetch", source)
+        ref['mark'] = high_water_mark(entries, os.path.basename(run_dir))
+        ref['unchanged'] = changes.get('unchanged', 0)
+        ref['lease'] = lease
+        current.set_attribute("rows", len(feed))
+        current.set_attribute("rows.new", len(entries))
+        current.set_attribute("rows.edited", len(edited))
+        current.set_attribute("bytes", ref['bytes'])
+        current.set_attribute("parser", read['parser'])
+    print(f"INFO: ✅ Fetched {len(entries)} new and {len(edited)} edited entries from {source} "
+          f"({ref['bytes']} bytes, {read['parser']}).")
+    return write_ref(ref, run_dir, "fetch", source)
+
+
+def transform_step(run_dir: str, ref: Dict[str, Any]) -> Dict[str, Any]:
+    source = ref['source']
+    entries = read_records(ref, Entry)
+    with span("parse", {"source.name": source, "rows.in": len(entries)}) as current:
+        articles = parse_rss_feed_articles(entries, source, translate=False)
+        dedup = {}
+        if DEDUP_MODE != "off" and articles:
+            conn = connect_storage()
+            try:
+                articles, dedup = group_duplicates(conn, articles, source)
+                current.set_attribute("rows.duplicates", dedup['dedup_duplicates'])
+            except Exception as e:
+                conn.rollback()
+                print(f"WARNING: ⚠️ Near-duplicate check failed for {source} ({e}), storing every article")
+            finally:
+                conn.close()
+        current.set_attribute("rows", len(articles))
+    with span("translate", {"source.name": source, "rows": len(articles)}):
+        articles = translate_articles(articles)
+    out = write_table(articles, ARTICLE_SCHEMA, run_dir, "transform", source)
+    out['mark'] = ref.get('mark')
+    out['lease'] = ref.get('lease')
+    out['dedup'] = dedup
+    print(f"INFO: ✅ Parsed {out['rows']} articles from {source}.")
+    return write_ref(out, run_dir, "transform", source)
+
+
+def store_step(run_dir: str, ref: Dict[str, Any]) -> Dict[str, Any]:
+    source = ref['source']
+    articles = read_records(ref, Article)
+    counts = {}
+    # A batch of collapsed wire copies has no articles but still moves the mark
+    if articles or ref.get('mark'):
+        conn = connect_storage()
+        try:
+            if articles:
+                with span("store", {"source.name": source, "rows": len(articles)}) as current:
+                    counts = store_data(articles, conn) or {}
+                    current.set_attribute("rows.stored", counts.get('stored', 0))
+                    current.set_attribute("rows.updated", counts.get('updated', 0))
+                    current.set_attribute("rows.skipped", counts.get('skipped', 0))
+            # Failed rows keep the old mark so the next run fetches them again
+            if counts.get('errors', 0):
+                print(f"WARNING: ⚠️ {source}: {counts['errors']} article(s) failed to store, mark not advanced")
+            else:
+                ensure_state_tables(conn)
+                save_source_state(conn, source, ref.get('mark'), counts.get('stored', 0))
+        finally:
+            conn.close()
+    if ref.get('lease'):
+        status = 'error' if counts.get('errors', 0) else 'stored' if articles else 'no-new'
+        conn = connect_storage()
+        try:
+            release_sources(conn, ref['lease'], [source], {source: status})
+        finally:
+            conn.close()
+    result = {'source': source, 'processed': len(articles), 'stored': counts.get('stored', 0),
+              'updated': counts.get('updated', 0), 'skipped': counts.get('skipped', 0)}
+    write_ref(result, run_dir, "store", source)
+    return result
+
+
+def embed_step() -> Dict[str, Any]:
+    from .vector_db import embed_missing, ensure_embedding_column
+
+    conn = connect_storage()
+    try:
+        ensure_embedding_column(conn)
+        with span("embed") as current:
+            embedded = embed_missing(conn)
+            current.set_attribute("rows", embedded)
+    finally:
+        conn.close()
+    return {'embedded': embedded}
+
+
+def summary_step(run_dir: str) -> Dict[str, Any]:
+    """
+    Per-step totals of a run, read from the reference files.
+
+    Args:
+        run_dir: Handoff directory of the run
+
+    Returns:
+        {step: {'sources', 'rows', 'bytes'}} plus the store counts (new,
+        updated, skipped; unchanged entries are counted by fetch), the
+        near-duplicate report and the sources that never got past fetch
+    """
+    refs: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for step in ("fetch", "transform", "store"):
+        directory = os.path.join(run_dir, step)
+        refs[step] = {}
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    ref = json.load(f)
+                refs[step][ref['source']] = ref
+
+    summary: Dict[str, Any] = {
+        step: {'sources': len(r), 'rows': sum(x.get('rows', 0) for x in r.values()),
+               'bytes': sum(x.get('bytes', 0) for x in r.values())}
+        for step, r in refs.items() if step != "store"
+    }
+    stored = refs["store"].values()
+    summary['store'] = {'sources': len(refs["store"]),
+                        'stored': sum(x['stored'] for x in stored),
+                        'updated': sum(x.get('updated', 0) for x in stored),
+                        'unchanged': sum(x.get('unchanged', 0) for x in refs["fetch"].values()),
+                        'skipped': sum(x['skipped'] for x in stored)}
+    dedup = {}
+    for ref in refs["transform"].values():
+        for key, value in (ref.get('dedup') or {}).items():
+            dedup[key] = dedup.get(key, 0) + value
+    summary['dedup'] = dedup_report(dedup)
+    summary['incomplete_sources'] = sorted(set(refs["fetch"]) - set(refs["store"]))
+
+    print("\n📊 RUN SUMMARY:")
+    for step in ("fetch", "transform"):
+        s = summary[step]
+        print(f"   - {step}: {s['sources']} sources, {s['rows']} rows, {s['bytes'] / 1024:.1f} KiB")
+    print(f"   - store: {summary['store']['stored']} new, {summary['store']['updated']} updated, "
+          f"{summary['store']['unchanged']} unchanged, {summary['store']['skipped']} skipped")
+    if summary['dedup']['checked']:
+        d = summary['dedup']
+        print(f"   - near-duplicates: {d['duplicates']} of {d['checked']} ({d['dedup_rate'] * 100:.1f}%), "
+              f"{d['translate_calls']} translator calls and {d['embeddings']} embeddings "
+              f"{'saved' if d['skipped'] else 'spent on copies'}")
+    if summary['incomplete_sources']:
+        print(f"   - incomplete: {', '.join(summary['incomplete_sources'])}")
+    return summary
+
+
+def cleanup_step(run_dir: str) -> Dict[str, Any]:
+    """Remove the handoff files of a finished run."""
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(run_dir) for f in files)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    print(f"INFO: 🧹 Removed {run_dir} ({size / 1024:.1f} KiB).")
+    return {'removed': run_dir, 'bytes': size}
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def push_result(result: Any, path: Optional[str] = XCOM_PATH):
+    """Hand the step result to DockerOperator (pickle) and the log (JSON)."""
+    if path:
+        with open(path, "wb") as f:
+            pickle.dump(result, f)
+    print(json.dumps(result, default=str))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one per-source pipeline step")
+    parser.add_argument("step", choices=["sources", "fetch", "transform", "store", "embed", "summary", "cleanup"])
+    parser.add_argument("--run-dir", help="Handoff directory of the DAG run")
+    parser.add_argument("--run-id", help="DAG run id (alternative to --run-dir)")
+    parser.add_argument("--source", help="Source name (fetch)")
+    parser.add_argument("--input", help="Reference from the previous step, JSON (transform, store)")
+    parser.add_argument("--full-refresh", action="store_true", default=FULL_REFRESH,
+                        help="Fetch every entry, ignoring the source's high-water mark")
+    parser.add_argument("--xcom-path", default=XCOM_PATH, help="Where the pickled result is written")
+    args = parser.parse_args(argv)
+
+    run_dir = args.run_dir or (run_directory(args.run_id) if args.run_id else None)
+    if args.step != "embed" and not run_dir:
+        parser.error(f"{args.step} needs --run-dir or --run-id")
+    if args.step == "fetch" and not args.source:
+        parser.error("fetch needs --source")
+    if args.step in ("transform", "store") and not args.input:
+        parser.error(f"{args.step} needs --input")
+
+    init_tracing()
+    attach_parent_from_env()
+    try:
+        if args.step == "sources":
+            result = list_sources(run_dir)
+        elif args.step == "fetch":
+            result = fetch_step(run_dir, args.source, args.full_refresh)
+        elif args.step == "transform":
+            result = transform_step(run_dir, parse_ref(args.input))
+        elif args.step == "store":
+            result = store_step(run_dir, parse_ref(args.input))
+        elif args.step == "embed":
+            result = embed_step()
+        elif args.step == "summary":
+            result = summary_step(run_dir)
+        else:
+            result = cleanup_step(run_dir)
+    finally:
+        shutdown_tracing()
+    push_result(result, args.xcom_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+TRACING MODULE
+Responsible for OpenTelemetry setup and span helpers for the pipeline and
+the API / RAG path (src.ml_logic and src.api import it from here)
+
+Exporter is chosen with OTEL_TRACES_EXPORTER:
+    none (default)  tracing disabled, spans are no-ops
+    console         one JSON span per line on stdout
+    file            one JSON span per line appended to OTEL_TRACES_FILE
+    otlp            OTLP exporter (OTEL_EXPORTER_OTLP_ENDPOINT / _PROTOCOL)
+
+The pipeline picks up a parent trace from the TRACEPARENT / TRACESTATE
+environment variables, which the Airflow DAG passes to the DockerOperator
+container. The API honours incoming `traceparent` headers, so a client or
+proxy that traces its calls sees the /ask stages as children of its own span.
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+from opentelemetry.trace import Status, StatusCode
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "data-pipeline")
+
+_provider: Optional[TracerProvider] = None
+
+
+def _one_line(span) -> str:
+    return span.to_json(indent=None) + os.linesep
+
+
+def build_exporter(kind: str):
+    """
+    Create the span exporter named by OTEL_TRACES_EXPORTER.
+
+    Args:
+        kind: console | file | otlp
+
+    Returns:
+        Tuple of (exporter, use_batch_processor)
+    """
+    if kind == "console":
+        return ConsoleSpanExporter(formatter=_one_line), False
+    if kind == "file":
+        path = os.getenv("OTEL_TRACES_FILE", "traces.jsonl")
+        return ConsoleSpanExporter(out=open(path, "a", encoding="utf-8"), formatter=_one_line), True
+    if kind == "otlp":
+        if os.getenv("OTEL_EXPORTER_OTLP_PROTOCOL", "http/protobuf").startswith("grpc"):
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        else:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(), True
+    raise ValueError(f"Unknown OTEL_TRACES_EXPORTER: {kind}")
+
+
+def init_tracing(service_name: str = SERVICE_NAME) -> bool:
+    """
+    Install the global tracer provider (once per process).
+
+    Returns:
+        True if spans are exported, False if tracing is disabled
+    """
+    global _provider
+    if _provider is not None:
+        return True
+
+    kind = os.getenv("OTEL_TRACES_EXPORTER", "none").lower()
+    if kind in ("", "none"):
+        return False
+
+    try:
+        exporter, batch = build_exporter(kind)
+    except Exception as e:
+        print(f"⚠️ Tracing disabled: {e}")
+        return False
+
+    _provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    _provider.add_span_processor(BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    print(f"INFO: 🔭 Tracing enabled ({kind}) for {service_name}")
+    return True
+
+
+def shutdown_tracing():
+    """Flush pending spans; call before the container exits or the app shuts down."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def attach_parent_from_env():
+    """
+    Make the trace passed in TRACEPARENT the current context.
+
+    Returns:
+        Token for otel_context.detach, or None without a TRACEPARENT
+    """
+    traceparent = os.getenv("TRACEPARENT")
+    if not traceparent:
+        return None
+    carrier = {"traceparent": traceparent}
+    if os.getenv("TRACESTATE"):
+        carrier["tracestate"] = os.environ["TRACESTATE"]
+    return otel_context.attach(TraceContextTextMapPropagator().extract(carrier))
+
+
+def extract_context(headers: Dict[str, str]):
+    """
+    Parent context from W3C trace headers (traceparent / tracestate).
+
+    Returns:
+        Context to start the request span in (empty if no header)
+    """
+    return TraceContextTextMapPropagator().extract(headers)
+
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None, parent=None):
+    """
+    Start a span as the current span; exceptions are recorded and re-raised.
+
+    Args:
+        name: Span name, e.g. "source.fetch" or "rag.vector_search"
+        attributes: Initial attributes (None values are dropped)
+        parent: Explicit parent context (default: the current span)
+
+    Yields:
+        The span, so row counts and bytes can be added once known
+    """
+    tracer = trace.get_tracer("src")
+    with tracer.start_as_current_span(name, context=parent, record_exception=False,
+                                      set_status_on_exception=False) as current:
+        set_attributes(current, attributes)
+        try:
+            yield current
+        except Exception as e:
+            current.record_exception(e)
+            current.set_status(Status(StatusCode.ERROR, str(e)))
+            raise
+
+
+def set_attributes(current, attributes: Optional[Dict[str, Any]]):
+    for key, value in (attributes or {}).items():
+        if value is not None:
+            current.set_attribute(key, value)
@@ -2,6 +2,7 @@ import os
 import re
 import math
 import hashlib
+from functools import lru_cache
 from typing import List, Dict, Optional, Iterable, Tuple
 from dotenv import load_dotenv
 
@@ -10,6 +11,8 @@ import psycopg2
 import psycopg2.extras
 import numpy as np
 
+from .records import decode
+
 DB_URL = os.getenv("DB_URL")
 EMBED_DIM = int(os.getenv("EMBED_DIM", "512"))
 TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
@@ -44,6 +47,44 @@ def encode_custom(text: str, dim: int = EMBED_DIM, use_bigrams: bool = True):
     return vec
 
 
+@lru_cache(maxsize=1 << 20)
+def _cached_bucket(key: str, dim: int) -> int:
+    return hash_str_to_bucket(key, dim)
+
+
+def encode_batch(texts: List[str], dim: int = EMBED_DIM, use_bigrams: bool = True) -> np.ndarray:
+    """
+    encode_custom for many texts at once: token buckets are memoized
+    (news text repeats most tokens) and the counts, log1p and norms are
+    computed on one matrix.
+
+    Returns:
+        float32 array of shape (len(texts), dim), row i == encode_custom(texts[i])
+    """
+    flat = []
+    for i, text in enumerate(texts):
+        toks = tokenize(text or "")
+        offset = i * dim
+        flat.extend(offset + _cached_bucket(f"uni::{t}", dim) for t in toks)
+        if use_bigrams and len(toks) >= 2:
+            flat.extend(offset + _cached_bucket(f"bi::{a}|{b}", dim) for a, b in zip(toks, toks[1:]))
+    counts = np.bincount(np.asarray(flat, dtype=np.int64), minlength=len(texts) * dim)
+    matrix = counts.astype(np.float32).reshape(len(texts), dim)
+    np.log1p(matrix, out=matrix)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def vector_literal(vector) -> str:
+    """pgvector text form; hashed vectors are mostly zeros, so only the rest is formatted."""
+    parts = ["0"] * len(vector)
+    nonzero = vector.nonzero()[0]
+    for i, value in zip(nonzero.tolist(), vector[nonzero].tolist()):
+        parts[i] = repr(value)
+    return "[" + ",".join(parts) + "]"
+
+
 class vectordatabasePg:
     def __init__(self):
         try:
@@ -210,3 +251,106 @@ def vectordb():
     embedd_articles = vectordatabase.upsert_articles()
 
     return embedd_articles
+
+
+def embedding_text(article: dict) -> str:
+    # Same choice as upsert_articles: the summary, or the title when it is empty
+    summary = article.get("summary")
+    return summary if summary and summary.strip() else article.get("title", "")
+
+
+def ensure_embedding_column(conn):
+    from .storage import add_column
+
+    with conn.cursor() as cur:
+        add_column(cur, "articles", "embedding", f"vector({EMBED_DIM})")
+        # Set when an edit changed the text (storage.update_article)
+        add_column(cur, "articles", "embedding_stale", "BOOLEAN NOT NULL DEFAULT FALSE")
+    conn.commit()
+
+
+# One connection per embedding worker process (see main.build_stages)
+_worker_db = None
+
+
+def embedding_queue_exists(cur) -> bool:
+    """True once embed_worker.py has created the embedding_jobs queue."""
+    cur.execute("SELECT to_regclass('embedding_jobs')")
+    return cur.fetchone()[0] is not None
+
+
+def embed_batch(batch: dict) -> dict:
+    """
+    Pipeline stage: encode the articles of one source and store their
+    embeddings, matched by link. Runs in a worker process.
+
+    Args:
+        batch: {'source', 'articles', ...} from the store stage; articles
+            as records.encode() bytes or a list of records/dictionaries
+
+    Returns:
+        The batch without the articles, plus the 'embedded' count
+    """
+    global _worker_db
+    if _worker_db is None or _worker_db.conn is None or _worker_db.conn.closed:
+        _worker_db = vectordatabasePg()
+    if _worker_db.conn is None:
+        raise RuntimeError("No DB connection for embedding")
+
+    articles = batch["articles"]
+    if isinstance(articles, bytes):
+        articles = decode(articles)
+    rows = [(encode_custom(embedding_text(a), EMBED_DIM).tolist(), a["link"])
+            for a in articles if a.get("link") and not a.get("update")]
+    edited = [a["link"] for a in articles if a.get("link") and a.get("update")]
+    with _worker_db.conn.cursor() as cur:
+        if edited:
+            # An edit only carries its changed fields translated: embed the stored text
+            cur.execute("SELECT link, title, summary FROM articles WHERE link = ANY(%s)", (edited,))
+            rows += [(encode_custom(embedding_text({"title": title, "summary": summary}), EMBED_DIM).tolist(), link)
+                     for link, title, summary in cur.fetchall()]
+        psycopg2.extras.execute_batch(
+            cur, "UPDATE articles SET embedding = %s, embedding_stale = FALSE WHERE link = %s", rows
+        )
+        # The articles triggers queued these rows for embed_worker.py; done here instead
+        if rows and embedding_queue_exists(cur):
+            cur.execute(
+                "DELETE FROM embedding_jobs j USING articles a WHERE j.article_id = a.id AND a.link = ANY(%s)",
+                ([link for _, link in rows],)
+            )
+    result = {k: v for k, v in batch.items() if k != "articles"}
+    result["embedded"] = len(rows)
+    return result
+
+
+def embed_missing(conn, batch_size: int = 500) -> int:
+    """
+    Embed every article that has no embedding yet (rows from earlier runs
+    whose embedding step failed) or whose embedding is stale after an
+    edit. Cheap when there are none.
+
+    Returns:
+        Number of articles embedded
+    """
+    total = 0
+    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+        queued = embedding_queue_exists(cur)
+        while True:
+            cur.execute(
+                "SELECT id, title, summary FROM articles WHERE embedding IS NULL OR embedding_stale "
+                "ORDER BY id LIMIT %s",
+                (batch_size,)
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+            psycopg2.extras.execute_batch(
+                cur,
+                "UPDATE articles SET embedding = %s, embedding_stale = FALSE WHERE id = %s",
+                [(encode_custom(embedding_text(r), EMBED_DIM).tolist(), r["id"]) for r in rows]
+            )
+            if queued:
+                cur.execute("DELETE FROM embedding_jobs WHERE article_id = ANY(%s)", ([r["id"] for r in rows],))
+            conn.commit()
+            total += len(rows)
+    return total
@@ -0,0 +1,160 @@
+import os
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Candidates fetched from pgvector before re-ranking
+RAG_CANDIDATE_K = int(os.getenv("RAG_CANDIDATE_K", "20"))
+# Upper bound on documents placed in the prompt
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "5"))
+# 1.0 = pure relevance, 0.0 = pure diversity
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+# Hits below this cosine similarity to the question are dropped
+RAG_MIN_SIMILARITY = float(os.getenv("RAG_MIN_SIMILARITY", "0.05"))
+# Candidates at least this similar to an already selected hit count as duplicates
+RAG_DUPLICATE_SIMILARITY = float(os.getenv("RAG_DUPLICATE_SIMILARITY", "0.92"))
+# Approximate token budget for the context block of the prompt
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1200"))
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token for English text).
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def parse_vector(value) -> Optional[np.ndarray]:
+    """
+    Convert a pgvector value (text '[0.1,0.2,...]' without an adapter) to a numpy array.
+    """
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float32, copy=False)
+    if isinstance(value, str):
+        value = value.strip("[]")
+        if not value:
+            return None
+        return np.array(value.split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def format_context_doc(hit: Dict[str, Any], summary: Optional[str] = None) -> str:
+    title = hit.get("title")
+    summary = hit.get("summary") if summary is None else summary
+    return f"Title: {title}\nSummary: {summary}" if summary else f"Title: {title}"
+
+
+def mmr_rerank(hits: List[Dict[str, Any]], k: int, mmr_lambda: float = RAG_MMR_LAMBDA,
+               duplicate_similarity: float = RAG_DUPLICATE_SIMILARITY) -> List[Dict[str, Any]]:
+    """
+    Maximal marginal relevance over the stored article vectors.
+
+    Each hit needs a "similarity" to the question and an "embedding". Hits
+    nearly identical to one already selected (sister-paper wire copies) are
+    skipped outright.
+    """
+    if not hits:
+        return []
+
+    vectors = [parse_vector(h.get("embedding")) for h in hits]
+    dim = next((v.shape[0] for v in vectors if v is not None), 0)
+    matrix = np.stack([v if v is not None else np.zeros(dim, dtype=np.float32) for v in vectors])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    pairwise = matrix @ matrix.T
+
+    relevance = np.array([h["similarity"] for h in hits], dtype=np.float32)
+    selected: List[int] = []
+    remaining = list(range(len(hits)))
+
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = pairwise[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(scores))
+        idx = remaining.pop(best)
+
+        if selected and redundancy[best] >= duplicate_similarity:
+            hits[idx]["duplicate_of"] = hits[selected[int(np.argmax(pairwise[idx, selected]))]].get("id")
+            continue
+        selected.append(idx)
+
+    return [hits[i] for i in selected]
+
+
+def build_context(hits: List[Dict[str, Any]], top_k: int = RAG_TOP_K,
+                  min_similarity: float = RAG_MIN_SIMILARITY,
+                  token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+                  mmr_lambda: float = RAG_MMR_LAMBDA) -> Dict[str, Any]:
+    """
+    Turn over-fetched retrieval candidates into a compact prompt context.
+
+    Steps: similarity floor -> MMR re-rank (dropping near-duplicates) ->
+    greedy fill up to the token budget, truncating the last summary that
+    does not fit whole. The number of documents therefore adapts to how many
+    distinct, relevant hits exist and how long they are.
+
+    Args:
+        hits: Rows from query_similar_articles, with "distance" and "embedding"
+        top_k: Maximum number of documents in the context
+        min_similarity: Cosine similarity floor
+        token_budget: Approximate token budget for the context
+        mmr_lambda: Relevance/diversity trade-off
+
+    Returns:
+        Dictionary with the context docs, selected hits and selection stats
+    """
+    for hit in hits:
+        hit["similarity"] = 1.0 - float(hit.get("distance", 1.0))
+
+    relevant = [h for h in hits if h["similarity"] >= min_similarity]
+    ranked = mmr_rerank(relevant, top_k, mmr_lambda)
+
+    docs: List[str] = []
+    selected: List[Dict[str, Any]] = []
+    used_tokens = 0
+    truncated = 0
+
+    for hit in ranked:
+        doc = format_context_doc(hit)
+        cost = estimate_tokens(doc) + 1  # newline separator
+        if used_tokens + cost <= token_budget:
+            docs.append(doc)
+            selected.append(hit)
+            used_tokens += cost
+            continue
+
+        # Keep the title and as much of the summary as still fits
+        header_cost = estimate_tokens(format_context_doc(hit, summary=" ")) + 1
+        room = token_budget - used_tokens - header_cost
+        if room > 16 and hit.get("summary"):
+            summary = hit["summary"][: room * CHARS_PER_TOKEN - 3].rsplit(" ", 1)[0] + "..."
+            doc = format_context_doc(hit, summary=summary)
+            docs.append(doc)
+            selected.append(hit)
+            used_tokens += estimate_tokens(doc) + 1
+            truncated += 1
+        break
+
+    return {
+        "docs": docs,
+        "hits": selected,
+        "stats": {
+            "candidates": len(hits),
+            "above_similarity_floor": len(relevant),
+            "duplicates_dropped": sum(1 for h in relevant if "duplicate_of" in h),
+            "context_docs": len(docs),
+            "context_docs_truncated": truncated,
+            "context_tokens_estimate": used_tokens,
+        },
+    }
@@ -1,11 +1,13 @@
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
-from sklearn.metrics.pairwise import cosine_similarity
-import chromadb
 import os
 
 
 def process_exceddings(text):
+    # torch/transformers and chromadb take seconds to import; only pay for
+    # them when this backend actually runs
+    import chromadb
+    from sentence_transformers import SentenceTransformer
+
     load_dotenv()
 
     print("STEP 1: Preparing sentences for embeddings...")
@@ -0,0 +1,279 @@
+"""
+RETRIEVAL EXPLAIN
+Responsible for query plans of the similarity search: whether pgvector used
+the ANN index or a sequential scan, which probes/ef_search were in effect,
+buffer hits and how many candidate rows were examined.
+
+    python -m src.ml_logic.explain "What did Finnair announce?" --top-k 5 --source "Yle RSS Feed"
+
+The API exposes the same report at GET /debug/explain (see src/api/debug.py).
+Queries slower than RETRIEVAL_SLOW_QUERY_MS are sampled (at
+RETRIEVAL_SLOW_QUERY_SAMPLE_RATE) into the retrieval_slow_queries table. The
+plan is captured by re-running the query in the background, so its timings
+reflect a warm cache rather than the slow original run.
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from psycopg2.extras import Json
+
+from .filters import SearchFilters
+from .metrics import RETRIEVAL_SLOW_QUERIES
+
+SLOW_QUERY_MS = float(os.getenv("RETRIEVAL_SLOW_QUERY_MS", "500"))  # 0 disables the log
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("RETRIEVAL_SLOW_QUERY_SAMPLE_RATE", "0.2"))
+
+# pgvector knobs that change the plan or the recall of an index scan
+VECTOR_SETTINGS = (
+    "ivfflat.probes",
+    "ivfflat.iterative_scan",
+    "ivfflat.max_probes",
+    "hnsw.ef_search",
+    "hnsw.iterative_scan",
+    "hnsw.max_scan_tuples",
+    "enable_seqscan",
+    "enable_indexscan",
+    "work_mem",
+)
+
+SLOW_QUERY_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS retrieval_slow_queries (
+        id BIGSERIAL PRIMARY KEY,
+        logged_at TIMESTAMPTZ DEFAULT now(),
+        query_text TEXT NOT NULL,
+        top_k INT,
+        filters JSONB,
+        strategy TEXT,
+        duration_ms REAL,
+        index_used TEXT,
+        seq_scan BOOLEAN,
+        candidates_examined BIGINT,
+        settings JSONB,
+        plan JSONB
+    );
+    CREATE INDEX IF NOT EXISTS idx_retrieval_slow_queries_logged_at ON retrieval_slow_queries(logged_at);
+"""
+
+
+# -----------------------------
+# Plan analysis
+# -----------------------------
+def vector_settings(conn) -> Dict[str, Optional[str]]:
+    """
+    Current values of the pgvector planner/scan settings on `conn`
+    (None for settings this server does not know).
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT name, current_setting(name, true) FROM unnest(%s::text[]) AS name",
+            (list(VECTOR_SETTINGS),)
+        )
+        settings = dict(cur.fetchall())
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        row = cur.fetchone()
+        settings["pgvector"] = row[0] if row else None
+    return settings
+
+
+def walk(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+
+def rows_examined(node: Dict[str, Any]) -> float:
+    # EXPLAIN reports rows and removed rows per loop
+    loops = node.get("Actual Loops", 1)
+    return (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)
+            + node.get("Rows Removed by Index Recheck", 0)) * loops
+
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Condense an EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) plan.
+
+    Args:
+        plan: One element of the JSON EXPLAIN output
+
+    Returns:
+        Dictionary with planning/execution time, the ANN index (if its
+        ordered scan was used), every index touched, whether articles was
+        sequentially scanned, candidate rows examined, rows returned and
+        shared buffer hits/reads
+    """
+    root = plan["Plan"]
+    nodes = list(walk(root))
+    scans = [n for n in nodes if n.get("Relation Name") == "articles"]
+    ann = [n for n in scans if "<=>" in str(n.get("Order By", ""))]
+    return {
+        "planning_ms": plan.get("Planning Time"),
+        "execution_ms": plan.get("Execution Time"),
+        "ann_index": ann[0]["Index Name"] if ann else None,
+        "indexes_used": sorted({n["Index Name"] for n in nodes if "Index Name" in n}),
+        "seq_scan": any(n["Node Type"] == "Seq Scan" for n in scans),
+        "candidates_examined": int(sum(rows_examined(n) for n in scans)),
+        "rows_returned": root.get("Actual Rows"),
+        "buffers": {
+            "shared_hit": root.get("Shared Hit Blocks", 0),
+            "shared_read": root.get("Shared Read Blocks", 0),
+            "temp_written": root.get("Temp Written Blocks", 0),
+        },
+    }
+
+
+def render_plan(node: Dict[str, Any], depth: int = 0) -> List[str]:
+    """Compact text tree of a JSON plan, one line per node."""
+    target = node.get("Relation Name") or node.get("CTE Name") or ""
+    if node.get("Index Name"):
+        target += f" using {node['Index Name']}"
+    line = (
+        f"{'  ' * depth}-> {node['Node Type']}{' on ' + target if target else ''}"
+        f"  (time={node.get('Actual Total Time', 0):.2f} ms rows={node.get('Actual Rows', 0)}"
+        f" loops={node.get('Actual Loops', 1)} hit={node.get('Shared Hit Blocks', 0)}"
+        f" read={node.get('Shared Read Blocks', 0)})"
+    )
+    lines = [line]
+    for key in ("Order By", "Index Cond", "Filter", "Recheck Cond"):
+        if key in node:
+            lines.append(f"{'  ' * depth}     {key}: {node[key]}")
+    if node.get("Rows Removed by Filter"):
+        lines.append(f"{'  ' * depth}     Rows Removed by Filter: {node['Rows Removed by Filter']}")
+    for child in node.get("Plans", []):
+        lines.extend(render_plan(child, depth + 1))
+    return lines
+
+
+def explain_query(question: str, top_k: int = 5, filters: Optional[SearchFilters] = None) -> Dict[str, Any]:
+    """
+    EXPLAIN ANALYZE the similarity search for a question on a pooled connection.
+    """
+    from .vector_db import vectordatabasePg
+
+    vectordatabase = vectordatabasePg()
+    try:
+        return vectordatabase.explain_similar_articles(question, top_k=top_k, filters=filters)
+    finally:
+        vectordatabase.close()
+
+
+# -----------------------------
+# Slow-query log
+# -----------------------------
+_capture_lock = threading.Lock()
+_table_ready = False
+
+
+def maybe_log_slow_query(question: str, top_k: int, filters: Optional[SearchFilters], strategy: str,
+                         elapsed_ms: float):
+    """
+    Called after every similarity query. Over the threshold, a sample of the
+    queries is re-run with EXPLAIN ANALYZE on a background thread and its
+    plan stored; at most one capture runs per process at a time.
+    """
+    if SLOW_QUERY_MS <= 0 or elapsed_ms < SLOW_QUERY_MS:
+        return
+    logged = random.random() < SLOW_QUERY_SAMPLE_RATE and _capture_lock.acquire(blocking=False)
+    RETRIEVAL_SLOW_QUERIES.labels(strategy=strategy, logged=str(bool(logged)).lower()).inc()
+    if logged:
+        threading.Thread(
+            target=_capture_slow_query,
+            args=(question, top_k, filters, elapsed_ms),
+            name="slow-query-capture",
+            daemon=True,
+        ).start()
+
+
+def _capture_slow_query(question: str, top_k: int, filters: Optional[SearchFilters], elapsed_ms: float):
+    from .vector_db import vectordatabasePg
+
+    # Own connection: a capture must never take a slot from the request pool
+    vectordatabase = vectordatabasePg(pooled=False)
+    try:
+        report = vectordatabase.explain_similar_articles(question, top_k=top_k, filters=filters)
+        store_slow_query(vectordatabase.conn, report, elapsed_ms)
+    except Exception as e:
+        print(f"ERROR capturing slow query plan: {e}")
+    finally:
+        vectordatabase.close()
+        _capture_lock.release()
+
+
+def store_slow_query(conn, report: Dict[str, Any], duration_ms: float):
+    global _table_ready
+    with conn.cursor() as cur:
+        if not _table_ready:
+            cur.execute(SLOW_QUERY_TABLE_SQL)
+            _table_ready = True
+        cur.execute(
+            """
+            INSERT INTO retrieval_slow_queries
+                (query_text, top_k, filters, strategy, duration_ms, index_used, seq_scan,
+                 candidates_examined, settings, plan)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (report["query"], report["top_k"], Json(report["filters"]), report["strategy"], duration_ms,
+             report["ann_index"], report["seq_scan"], report["candidates_examined"],
+             Json(report["settings"]), Json(report["plan"]))
+        )
+    print(f"INFO: Logged slow similarity query ({duration_ms:.0f} ms, {report['strategy']}).")
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def print_report(report: Dict[str, Any]):
+    print(f"Query:      {report['query']!r} (top_k={report['top_k']}, filters={report['filters']})")
+    print(f"Strategy:   {report['strategy']}")
+    print(f"ANN index:  {report['ann_index'] or 'not used'}"
+          f"{'  (sequential scan on articles)' if report['seq_scan'] else ''}")
+    print(f"Indexes:    {', '.join(report['indexes_used']) or '-'}")
+    print(f"Timing:     encode {report['encode_ms']:.2f} ms, db {report['db_ms']:.2f} ms "
+          f"(planning {report['planning_ms']:.2f} ms, execution {report['execution_ms']:.2f} ms)")
+    print(f"Candidates: {report['candidates_examined']} examined, {report['rows_returned']} returned")
+    print(f"Buffers:    {report['buffers']['shared_hit']} hit, {report['buffers']['shared_read']} read, "
+          f"{report['buffers']['temp_written']} temp written")
+    print("Settings:   " + ", ".join(f"{k}={v}" for k, v in report["settings"].items() if v is not None))
+    print()
+    print("\n".join(render_plan(report["plan"]["Plan"])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE the similarity search for a question")
+    parser.add_argument("question")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--source", action="append", default=[], help="link_name filter (repeatable)")
+    parser.add_argument("--tag", action="append", default=[], help="Tag filter (repeatable)")
+    parser.add_argument("--from", dest="published_from", type=datetime.fromisoformat)
+    parser.add_argument("--to", dest="published_to", type=datetime.fromisoformat)
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    parser.add_argument("--log", action="store_true", help="Also store the plan in retrieval_slow_queries")
+    args = parser.parse_args(argv)
+
+    filters = SearchFilters(sources=args.source, tags=args.tag,
+                            published_from=args.published_from, published_to=args.published_to)
+    from .vector_db import vectordatabasePg
+
+    vectordatabase = vectordatabasePg(pooled=False)
+    try:
+        start = time.perf_counter()
+        report = vectordatabase.explain_similar_articles(args.question, top_k=args.top_k, filters=filters)
+        if args.log:
+            store_slow_query(vectordatabase.conn, report, (time.perf_counter() - start) * 1000)
+    finally:
+        vectordatabase.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
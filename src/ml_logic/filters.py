@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+
+@dataclass
+class SearchFilters:
+    """
+    Retrieval predicates pushed into the similarity SQL.
+
+    Each predicate is backed by an index on `articles`: btree on
+    (link_name, published_at) and published_at, GIN on tags.
+    """
+    sources: List[str] = field(default_factory=list)
+    published_from: Optional[datetime] = None
+    published_to: Optional[datetime] = None
+    tags: List[str] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.sources or self.published_from or self.published_to or self.tags)
+
+    def to_sql(self) -> Tuple[List[str], List[Any]]:
+        """
+        Returns:
+            (list of WHERE clauses, list of parameters in clause order)
+        """
+        clauses, params = [], []
+        if self.sources:
+            clauses.append("link_name = ANY(%s)")
+            params.append(list(self.sources))
+        if self.published_from:
+            clauses.append("published_at >= %s")
+            params.append(self.published_from)
+        if self.published_to:
+            clauses.append("published_at < %s")
+            params.append(self.published_to)
+        if self.tags:
+            clauses.append("tags && %s::text[]")
+            params.append(list(self.tags))
+        return clauses, params
+
+    def cache_key(self) -> list:
+        return [
+            sorted(self.sources),
+            self.published_from.isoformat() if self.published_from else None,
+            self.published_to.isoformat() if self.published_to else None,
+            sorted(self.tags),
+        ]
@@ -0,0 +1,298 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Optional
+
+from .metrics import LLM_FALLBACKS, LLM_HEDGES, LLM_REQUEST_SECONDS, LLM_TTFT_SECONDS
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # gemini | openai (any OpenAI-compatible server)
+# (model, fallback model) per backend; an OpenAI-compatible server may serve a
+# single model, so it gets no fallback unless LLM_FALLBACK_MODEL names one
+DEFAULT_MODELS = {
+    "gemini": ("gemini-2.5-flash", "gemini-2.5-flash-lite"),
+    "openai": ("stub", ""),
+}
+LLM_MODEL = os.getenv("LLM_MODEL", DEFAULT_MODELS.get(LLM_BACKEND, ("", ""))[0])
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", DEFAULT_MODELS.get(LLM_BACKEND, ("", ""))[1])
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() in ("1", "true", "yes")
+# Hedge delay before enough samples exist for a p95, and its lower bound
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+# At most this fraction of calls may send a second request
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+# Share of the deadline kept back for the fallback model
+LLM_FALLBACK_RESERVE = float(os.getenv("LLM_FALLBACK_RESERVE", "0.25"))
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_MAX_THREADS", "32")), thread_name_prefix="llm")
+
+
+@dataclass
+class LLMResult:
+    text: str
+    backend: str
+    model: str
+    latency: float
+    ttft: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+    hedged: bool = False
+    fallback: bool = False
+
+
+class LLMBackend:
+    """
+    One model behind one API. `generate` blocks, streams internally to
+    measure time-to-first-token and must give up after `timeout` seconds.
+    """
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def generate(self, prompt: str, timeout: float) -> LLMResult:
+        start = time.perf_counter()
+        try:
+            result = self._generate(prompt, timeout, start)
+        except Exception:
+            LLM_REQUEST_SECONDS.labels(self.name, self.model, "error").observe(time.perf_counter() - start)
+            raise
+        LLM_REQUEST_SECONDS.labels(self.name, self.model, "ok").observe(result.latency)
+        if result.ttft is not None:
+            LLM_TTFT_SECONDS.labels(self.name, self.model).observe(result.ttft)
+        return result
+
+    def _generate(self, prompt: str, timeout: float, start: float) -> LLMResult:
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._client = None
+
+    def _generate(self, prompt: str, timeout: float, start: float) -> LLMResult:
+        from google.genai import types
+        if self._client is None:
+            from .rag import get_gemini_client
+            self._client = get_gemini_client()
+
+        config = types.GenerateContentConfig(
+            http_options=types.HttpOptions(timeout=int(timeout * 1000))
+        )
+        parts, ttft, usage = [], None, None
+        for chunk in self._client.models.generate_content_stream(model=self.model, contents=prompt, config=config):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            if chunk.text:
+                parts.append(chunk.text)
+            usage = chunk.usage_metadata or usage
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"{self.model} exceeded {timeout:.1f}s")
+
+        return LLMResult(
+            text="".join(parts),
+            backend=self.name,
+            model=self.model,
+            latency=time.perf_counter() - start,
+            ttft=ttft,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            response_tokens=getattr(usage, "candidates_token_count", None),
+        )
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any server speaking the OpenAI chat completions API, including the local
+    stub in `llm_stub.py`.
+    """
+    name = "openai"
+
+    def __init__(self, model: str, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        super().__init__(model)
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL", "http://localhost:8100/v1")
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY", "stub")
+        self._client = None
+
+    def _generate(self, prompt: str, timeout: float, start: float) -> LLMResult:
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(base_url=self.base_url, api_key=self.api_key, max_retries=0)
+
+        stream = self._client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=timeout,
+        )
+        parts, ttft, usage = [], None, None
+        for chunk in stream:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            usage = chunk.usage or usage
+            if time.perf_counter() - start > timeout:
+                stream.close()
+                raise TimeoutError(f"{self.model} exceeded {timeout:.1f}s")
+
+        return LLMResult(
+            text="".join(parts),
+            backend=self.name,
+            model=self.model,
+            latency=time.perf_counter() - start,
+            ttft=ttft,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            response_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "openai": OpenAICompatibleBackend,
+}
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < 20:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientLLM:
+    """
+    Deadline-bounded generation with hedging and a fallback model.
+
+    - The primary call gets whatever time is left before the deadline.
+    - If it hasn't returned after the observed p95 latency, a second identical
+      request is sent and whichever finishes first wins (rate-limited by
+      LLM_HEDGE_MAX_RATIO so hedging can't double the load).
+    - If the primary fails or times out, the fallback model gets the rest of
+      the deadline; LLM_FALLBACK_RESERVE of it is never given to the primary.
+    """
+
+    def __init__(self, primary: LLMBackend, fallback: Optional[LLMBackend] = None,
+                 hedge: bool = LLM_HEDGE, hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 hedge_max_ratio: float = LLM_HEDGE_MAX_RATIO):
+        self.primary = primary
+        self.fallback = fallback
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.latency = LatencyTracker()
+        # Call and hedge counts are shared by every request thread
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._hedges = 0
+
+    def hedge_delay(self) -> float:
+        p95 = self.latency.percentile(0.95)
+        return max(self.hedge_min_delay, p95) if p95 is not None else self.hedge_min_delay
+
+    def generate(self, prompt: str, deadline: Optional[float] = None) -> LLMResult:
+        """
+        Args:
+            prompt: Full prompt text
+            deadline: Absolute time.monotonic() by which an answer is needed
+
+        Returns:
+            LLMResult of the first successful attempt
+        """
+        deadline = deadline or time.monotonic() + LLM_TIMEOUT
+        primary_deadline = deadline
+        if self.fallback is not None:
+            primary_deadline -= (deadline - time.monotonic()) * LLM_FALLBACK_RESERVE
+        try:
+            result = self._hedged(self.primary, prompt, primary_deadline)
+            self.latency.add(result.latency)
+            return result
+        except Exception as e:
+            remaining = deadline - time.monotonic()
+            if self.fallback is None or remaining <= 0:
+                raise
+            reason = "timeout" if isinstance(e, TimeoutError) else "error"
+            print(f"WARNING: {self.primary.model} failed ({e}); falling back to {self.fallback.model}")
+            LLM_FALLBACKS.labels(self.primary.name, reason).inc()
+            result = self.fallback.generate(prompt, remaining)
+            result.fallback = True
+            return result
+
+    def _take_hedge(self) -> bool:
+        """Reserve a hedge if the LLM_HEDGE_MAX_RATIO budget allows one."""
+        with self._lock:
+            if not self.hedge or self._hedges >= max(1, self._calls * self.hedge_max_ratio):
+                return False
+            self._hedges += 1
+            return True
+
+    def _hedged(self, backend: LLMBackend, prompt: str, deadline: float) -> LLMResult:
+        with self._lock:
+            self._calls += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("deadline already passed")
+
+        first = _executor.submit(backend.generate, prompt, remaining)
+        attempts = [first]
+
+        delay = self.hedge_delay()
+        done, _ = wait(attempts, timeout=min(delay, remaining))
+        # No hedge once the wait ran into the deadline: it could not answer in
+        # time and would only use up hedge budget
+        left = deadline - time.monotonic()
+        if not done and delay < remaining and left > 0 and self._take_hedge():
+            attempts.append(_executor.submit(backend.generate, prompt, left))
+
+        hedged = len(attempts) > 1
+        error = None
+        while attempts:
+            done, _ = wait(attempts, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                attempts.remove(future)
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                result = future.result()
+                if hedged:
+                    result.hedged = True
+                    LLM_HEDGES.labels(backend.name, "primary" if future is first else "hedge").inc()
+                return result
+
+        raise error or TimeoutError(f"{backend.model} did not answer before the deadline")
+
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm() -> ResilientLLM:
+    """
+    Process-wide LLM configured from LLM_BACKEND / LLM_MODEL / LLM_FALLBACK_MODEL.
+    """
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            backend_cls = BACKENDS[LLM_BACKEND]
+            fallback = backend_cls(LLM_FALLBACK_MODEL) if LLM_FALLBACK_MODEL else None
+            _llm = ResilientLLM(backend_cls(LLM_MODEL), fallback)
+        return _llm
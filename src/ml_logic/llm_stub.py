@@ -0,0 +1,195 @@
+"""
+LOCAL LLM STUB
+OpenAI-compatible chat completions server with configurable latency, so
+tail-latency behaviour (timeouts, hedging, fallback) can be tested offline.
+
+    python -m src.ml_logic.llm_stub --port 8100 \
+        --latency "lognormal:median=1.5,sigma=0.5" --tail-prob 0.02 --tail-latency 12
+
+Latency specs: fixed:seconds=S | uniform:low=A,high=B |
+lognormal:median=M,sigma=S | exponential:mean=M
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+from typing import Callable, Dict
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+def parse_latency_spec(spec: str) -> Callable[[random.Random], float]:
+    """
+    Turn "kind:key=value,..." into a sampler returning seconds
+    """
+    kind, _, raw = spec.partition(":")
+    params: Dict[str, float] = {}
+    for item in filter(None, raw.split(",")):
+        key, _, value = item.partition("=")
+        params[key.strip()] = float(value)
+
+    if kind == "fixed":
+        return lambda rng: params.get("seconds", 1.0)
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params.get("low", 0.5), params.get("high", 2.0))
+    if kind == "lognormal":
+        mu = math.log(params.get("median", 1.0))
+        return lambda rng: rng.lognormvariate(mu, params.get("sigma", 0.5))
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1.0 / params.get("mean", 1.0))
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubConfig:
+    def __init__(self):
+        self.latency = parse_latency_spec(os.getenv("LLM_STUB_LATENCY", "lognormal:median=1.0,sigma=0.4"))
+        # A small share of very slow calls models provider-side tail latency
+        self.tail_prob = float(os.getenv("LLM_STUB_TAIL_PROB", "0.02"))
+        self.tail_latency = float(os.getenv("LLM_STUB_TAIL_LATENCY", "10"))
+        self.error_rate = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+        # Share of the total latency spent before the first token
+        self.ttft_fraction = float(os.getenv("LLM_STUB_TTFT_FRACTION", "0.3"))
+        self.chunks = int(os.getenv("LLM_STUB_CHUNKS", "8"))
+        self.rng = random.Random(int(os.getenv("LLM_STUB_SEED", "42")))
+
+    def sample(self) -> float:
+        if self.rng.random() < self.tail_prob:
+            return self.tail_latency
+        return max(0.0, self.latency(self.rng))
+
+
+config = StubConfig()
+app = FastAPI(title="LLM stub", description="OpenAI-compatible stub with synthetic latency")
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatRequest(BaseModel):
+    model: str
+    messages: list[ChatMessage]
+    stream: bool = False
+    stream_options: dict | None = None
+
+
+def _answer_for(prompt: str) -> str:
+    titles = [line[len("Title: "):] for line in prompt.splitlines() if line.startswith("Title: ")]
+    if titles:
+        return "Based on the retrieved articles: " + "; ".join(titles[:3]) + "."
+    return "This is a stub answer."
+
+
+def _usage(prompt: str, answer: str) -> dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(answer) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: ChatRequest):
+    latency = config.sample()
+    if config.rng.random() < config.error_rate:
+        await asyncio.sleep(latency * config.ttft_fraction)
+        raise HTTPException(status_code=503, detail="stub: injected error")
+
+    prompt = "\n".join(m.content for m in request.messages)
+    answer = _answer_for(prompt)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if not request.stream:
+        await asyncio.sleep(latency)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": request.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": _usage(prompt, answer),
+        }
+
+    async def events():
+        await asyncio.sleep(latency * config.ttft_fraction)
+        words = answer.split(" ")
+        per_chunk = max(1, math.ceil(len(words) / config.chunks))
+        pieces = [" ".join(words[i:i + per_chunk]) + " " for i in range(0, len(words), per_chunk)]
+        gap = latency * (1 - config.ttft_fraction) / max(1, len(pieces))
+
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(gap)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": request.model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": request.model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        if (request.stream_options or {}).get("include_usage"):
+            usage = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": request.model,
+                "choices": [],
+                "usage": _usage(prompt, answer),
+            }
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub with synthetic latency")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", help="Latency spec, e.g. lognormal:median=1.5,sigma=0.5")
+    parser.add_argument("--tail-prob", type=float)
+    parser.add_argument("--tail-latency", type=float)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.latency:
+        config.latency = parse_latency_spec(args.latency)
+    if args.tail_prob is not None:
+        config.tail_prob = args.tail_prob
+    if args.tail_latency is not None:
+        config.tail_latency = args.tail_latency
+    if args.error_rate is not None:
+        config.error_rate = args.error_rate
+    if args.seed is not None:
+        config.rng = random.Random(args.seed)
+
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,92 @@
+"""
+RAG METRICS
+Prometheus metrics for retrieval and generation (shared by every API worker)
+
+With several workers, set PROMETHEUS_MULTIPROC_DIR before the process starts
+so every worker writes its samples there and /metrics aggregates them.
+"""
+
+from prometheus_client import Counter, Histogram
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+# Encoding, connection and vector search take milliseconds; the LLM takes seconds
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 8, 13, 20, 30, 60)
+
+# Label value for the pgvector retrieval path (the ChromaDB path would be "chroma")
+RETRIEVAL_BACKEND = "pgvector"
+
+
+# -----------------------------
+# RAG request stages
+# -----------------------------
+# Stages of /ask: db_connect, encode, vector_search, prompt_assembly, route,
+# extractive, llm_ttft, llm (total generation time)
+RAG_STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Time spent in each stage of a RAG request",
+    ["stage", "backend"],
+    buckets=STAGE_BUCKETS,
+)
+RAG_PROMPT_TOKENS = Counter(
+    "rag_prompt_tokens_total",
+    "Prompt tokens sent to the LLM (provider count, else the estimate)",
+    ["backend"],
+)
+RAG_RETRIEVED_HITS = Counter(
+    "rag_retrieved_hits_total",
+    "Candidates returned by vector search",
+    ["backend"],
+)
+RAG_CONTEXT_DOCS = Counter(
+    "rag_context_docs_total",
+    "Documents placed in the prompt context after re-ranking",
+    ["backend"],
+)
+RAG_ERRORS = Counter(
+    "rag_errors_total",
+    "Errors on the RAG path, per stage",
+    ["backend", "stage"],
+)
+RETRIEVAL_SLOW_QUERIES = Counter(
+    "retrieval_slow_queries_total",
+    "Similarity queries over RETRIEVAL_SLOW_QUERY_MS, by strategy and whether their plan was logged",
+    ["strategy", "logged"],
+)
+
+
+# -----------------------------
+# LLM backends
+# -----------------------------
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds",
+    "Wall time of a single LLM call, per backend, model and outcome",
+    ["backend", "model", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TTFT_SECONDS = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time until the first streamed chunk of an LLM call",
+    ["backend", "model"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total",
+    "Hedged LLM requests, by which attempt returned first",
+    ["backend", "winner"],
+)
+LLM_FALLBACKS = Counter(
+    "llm_fallbacks_total",
+    "Generations answered by the fallback model after the primary failed",
+    ["backend", "reason"],
+)
+
+
+# -----------------------------
+# Answer routing
+# -----------------------------
+RAG_ROUTE_SECONDS = Histogram(
+    "rag_route_seconds",
+    "End-to-end /ask latency per answer route (extractive skips the LLM)",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
@@ -1,11 +1,16 @@
 import os
-import psycopg2
-import numpy as np
+import re
+import time
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-import chromadb
-from google import genai
-from google.genai import types
+
+from .context_builder import RAG_CANDIDATE_K, build_context, estimate_tokens
+from .filters import SearchFilters
+from .llm import get_llm
+from .metrics import RAG_CONTEXT_DOCS, RAG_PROMPT_TOKENS, RAG_RETRIEVED_HITS, RAG_ROUTE_SECONDS
+from .request_stats import RequestStats
 
 
 load_dotenv()
@@ -14,6 +19,8 @@ load_dotenv()
 # Helper: Initialize Gemini API
 # -----------------------------
 def get_gemini_client():
+    from google import genai
+
     client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
     if not client:
         raise ValueError("Gemini client not initialized. Check your API key.")
@@ -24,7 +31,10 @@ def get_gemini_client():
 # 1. Answer questions using ChromaDB
 # -----------------------------
 def answer_questions(question: str):
-    
+    # ChromaDB backend only: keep torch/transformers off the Postgres path
+    import chromadb
+    from sentence_transformers import SentenceTransformer
+
     try:
         print("DEBUG: Initializing embedding model...")
         model = SentenceTransformer("all-MiniLM-L6-v2")
@@ -77,43 +87,316 @@ def answer_questions(question: str):
 
 
 # -----------------------------
-# 2. Answer questions using PostgreSQL
+# 2. Answer router: extractive fast path vs. LLM
 # -----------------------------
-def answer_question_for_postgre(question: str):
-    from .vector_db import vectordatabasePg
-    try:
+RAG_ROUTER = os.getenv("RAG_ROUTER", "true").lower() in ("1", "true", "yes")
+# Top hit must be at least this similar before a lookup is answered extractively
+ROUTER_MIN_TOP_SIMILARITY = float(os.getenv("ROUTER_MIN_TOP_SIMILARITY", "0.2"))
+# Similarity at which retrieval counts as fully confident
+ROUTER_STRONG_SIMILARITY = float(os.getenv("ROUTER_STRONG_SIMILARITY", "0.45"))
+# Hits within this margin of the top hit count as supporting it
+ROUTER_SUPPORT_MARGIN = float(os.getenv("ROUTER_SUPPORT_MARGIN", "0.1"))
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.7"))
+ROUTER_SNIPPET_CHARS = int(os.getenv("ROUTER_SNIPPET_CHARS", "280"))
+
+# Questions asking *which* articles exist rather than asking for reasoning
+LOOKUP_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r"\bwhat (did|does|has|have)\b.*\b(publish|report|write|say|cover|run)",
+    r"\b(list|show|find|give me|any|which)\b.*\b(articles?|news|stories|headlines?|reports?|coverage)\b",
+    r"\b(latest|recent|newest|today'?s?|yesterday'?s?|this week'?s?)\b.*\b(news|articles?|headlines?|stories)\b",
+    r"\b(news|articles?|headlines?|stories|coverage)\b.*\b(about|on|from|regarding|mentioning)\b",
+    r"\bwho (published|reported|wrote)\b",
+    r"\b(link|links|url|source) (to|for)\b",
+)]
+# Questions that need synthesis across articles; these always go to the LLM
+GENERATIVE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r"\bwhy\b",
+    r"\bhow (does|do|did|will|would|could|can|should|is|are|much|many)\b",
+    r"\b(explain|summari[sz]e|compare|analy[sz]e|predict|evaluate|assess)\b",
+    r"\b(impact|implications?|consequences?|opinion|trend|reasons?|cause[sd]?)\b",
+    r"\b(difference between|pros and cons|what if|should (i|we))\b",
+)]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Sources and periods named in the question itself. An extractive answer lists
+# articles as they are, so it must honour these even when the request's
+# explicit filters don't carry them.
+_SOURCE_PATTERNS = (
+    re.compile(r"\bwhat (?:did|does|has|have) (.+?) (?:publish|report|write|say|cover|run)", re.IGNORECASE),
+    re.compile(r"\b(?:[Ff]rom|[Bb]y) ([A-Z][\w-]*(?: [A-Z][\w-]*)*)"),
+)
+_RELATIVE_PERIOD = re.compile(r"\b(?:past|last) (\d+) (hour|day|week)s?\b", re.IGNORECASE)
+_NAMED_PERIOD = re.compile(r"\b(today|yesterday|this week|this month)\b", re.IGNORECASE)
+
+
+def route_question(question: str, hits: list[dict], filtered: bool = False) -> dict:
+    """
+    Decide between the extractive fast path and the generative (LLM) path.
+
+    Only uses the question text and the similarity distribution of the
+    retrieval candidates, so it costs microseconds. A question is answered
+    extractively only when it reads as a lookup, nothing in it asks for
+    reasoning, and retrieval found confident, well-supported hits.
+
+    Args:
+        question: User question
+        hits: Retrieval candidates with a "similarity" key
+        filtered: True when source/date/tag filters already narrow retrieval
+
+    Returns:
+        Dictionary with route ("extractive" | "generative"), confidence and reason
+    """
+    def decision(route, confidence, reason):
+        return {"route": route, "confidence": round(confidence, 3), "reason": reason}
+
+    if any(p.search(question) for p in GENERATIVE_PATTERNS):
+        return decision("generative", 0.0, "generative_pattern")
+    if not any(p.search(question) for p in LOOKUP_PATTERNS):
+        return decision("generative", 0.0, "no_lookup_pattern")
+
+    similarities = sorted((h.get("similarity", 0.0) for h in hits), reverse=True)
+    if not similarities or similarities[0] < ROUTER_MIN_TOP_SIMILARITY:
+        return decision("generative", 0.0, "weak_retrieval")
+
+    top = similarities[0]
+    strength = min(1.0, (top - ROUTER_MIN_TOP_SIMILARITY)
+                   / max(1e-6, ROUTER_STRONG_SIMILARITY - ROUTER_MIN_TOP_SIMILARITY))
+    # A lone strong hit over noise is less trustworthy than a cluster of them
+    support = sum(1 for s in similarities if top - s <= ROUTER_SUPPORT_MARGIN)
+    support_score = min(1.0, support / 3)
+
+    confidence = 0.4 + 0.4 * strength + 0.2 * support_score + (0.1 if filtered else 0.0)
+    confidence = min(1.0, confidence)
+    if confidence < ROUTER_MIN_CONFIDENCE:
+        return decision("generative", confidence, "low_confidence")
+    return decision("extractive", confidence, "lookup")
+
+
+def question_period(question: str, now: datetime = None) -> tuple:
+    """
+    (published_from, published_to) for a period named in the question, in UTC;
+    (None, None) when it names none.
+    """
+    now = now or datetime.now(timezone.utc)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    match = _RELATIVE_PERIOD.search(question)
+    if match:
+        return now - timedelta(**{match.group(2).lower() + "s": int(match.group(1))}), None
+    match = _NAMED_PERIOD.search(question)
+    if not match:
+        return None, None
+    period = match.group(1).lower()
+    if period == "today":
+        return midnight, None
+    if period == "yesterday":
+        return midnight - timedelta(days=1), midnight
+    if period == "this week":
+        return midnight - timedelta(days=midnight.weekday()), None
+    return midnight.replace(day=1), None
+
+
+def question_filters(question: str, filters: SearchFilters,
+                     resolve: Callable[[str], List[str]]) -> Optional[SearchFilters]:
+    """
+    Add the source and period named in the question to the explicit filters.
+
+    Only constraints the explicit filters lack are added; those the caller
+    set always win.
+
+    Args:
+        question: User question
+        filters: Explicit request filters
+        resolve: Maps a source name to stored link_name values
+
+    Returns:
+        `filters` itself when the question adds nothing, a copy with the
+        additions, or None when it names a source that matches nothing stored
+    """
+    changes = {}
+    if not (filters.published_from or filters.published_to):
+        published_from, published_to = question_period(question)
+        if published_from or published_to:
+            changes.update(published_from=published_from, published_to=published_to)
+    if not filters.sources:
+        for pattern in _SOURCE_PATTERNS:
+            match = pattern.search(question)
+            if match:
+                sources = resolve(match.group(1))
+                if not sources:
+                    return None
+                changes["sources"] = sources
+                break
+    return replace(filters, **changes) if changes else filters
+
+
+def first_sentence(text: str, max_chars: int = ROUTER_SNIPPET_CHARS) -> str:
+    text = " ".join((text or "").split())
+    sentence = _SENTENCE_END.split(text, 1)[0]
+    if len(sentence) > max_chars:
+        sentence = sentence[: max_chars - 3].rsplit(" ", 1)[0] + "..."
+    return sentence
+
+
+def build_extractive_answer(hits: list[dict]) -> str:
+    """
+    Plain-text answer listing the selected articles: title, source and date,
+    the lead sentence of the summary and the link.
+    """
+    lines = [f"Found {len(hits)} matching article{'s' if len(hits) != 1 else ''}:"]
+    for i, hit in enumerate(hits, start=1):
+        meta = ", ".join(str(v) for v in (hit.get("link_name"), hit.get("published")) if v)
+        lines.append("")
+        lines.append(f"{i}. {hit.get('title')}" + (f" ({meta})" if meta else ""))
+        snippet = first_sentence(hit.get("summary"))
+        if snippet:
+            lines.append(f"   {snippet}")
+        if hit.get("link"):
+            lines.append(f"   {hit['link']}")
+    return "\n".join(lines)
+
+
+# -----------------------------
+# 3. Answer questions using PostgreSQL
+# -----------------------------
+def build_prompt(question: str, context_docs: list[str]) -> str:
+    return (
+        "You are a helpful assistant. Use the following context to answer the question.\n\n"
+        "Context:\n" + "\n".join(context_docs) + "\n\n"
+        f"Question: {question}\n\n"
+        "Answer the question based on the context provided."
+    )
+
+
+def run_rag_query(question: str, filters: SearchFilters = None, source_hint: str = None,
+                  stats: RequestStats = None, deadline: float = None) -> dict:
+    """
+    Retrieve, assemble a token-budgeted context and generate an answer.
+
+    `filters` restrict retrieval in SQL; `source_hint` (the API's free-text
+    `context`) is resolved to matching source names and added to a copy of
+    them. A hint that matches no stored source is reported in the answer
+    rather than silently widening retrieval to every source.
+    `deadline` (time.monotonic()) bounds the LLM call.
+
+    Lookup questions with confident retrieval are answered extractively from
+    the retrieved articles without calling the LLM (see `route_question`).
+    Before that, a source or period named in the question is applied to
+    retrieval (see `question_filters`); a named source that matches nothing
+    stored sends the question to the LLM instead.
+
+    Returns the answer together with per-request stats (stage latencies,
+    candidate counts, route, prompt/response token counts).
+    """
+    from .vector_db import encode_query, vectordatabasePg
+    start = time.perf_counter()
+    stats = stats or RequestStats()
+    with stats.stage("db_connect"):
         vectordatabase = vectordatabasePg()
-        results = vectordatabase.query_similar_articles(query_text=question, top_k=5)
+    try:
+        # Copy: the caller's filters also key the coalescing and answer caches
+        filters = replace(filters) if filters else SearchFilters()
+        if source_hint and not filters.sources:
+            filters.sources = vectordatabase.resolve_sources(source_hint)
+            if not filters.sources:
+                stats.set("unresolved_source_hint", source_hint)
+                return {"answer": f"No stored source matches {source_hint!r}.", "stats": stats.as_dict()}
+        scoped = question_filters(question, filters, vectordatabase.resolve_sources) if RAG_ROUTER \
+            else filters
+
+        with stats.stage("encode"):
+            vec_str = encode_query(question)
+        with stats.stage("vector_search"):
+            results = vectordatabase.query_similar_articles(
+                query_text=question, top_k=RAG_CANDIDATE_K, filters=filters, vec_str=vec_str
+            )
+        RAG_RETRIEVED_HITS.labels(backend=stats.backend).inc(len(results))
+        stats.set("retrieved_hits", len(results))
         if not results:
-            return "No relevant articles found."
-        
-        context_docs = [ ]
+            return {"answer": "No relevant articles found.", "stats": stats.as_dict()}
 
-        for res in results:
-            title = res.get("title")
-            summary = res.get("summary")
-            context_doc = f"Title: {title}\nSummary: {summary}" if summary else f"Title: {title}"
-            context_docs.append(context_doc)
-            
+        with stats.stage("prompt_assembly"):
+            context = build_context(results)
+            prompt = build_prompt(question, context["docs"])
+        for name, value in context["stats"].items():
+            stats.set(name, value)
+        stats.set("prompt_tokens_estimate", estimate_tokens(prompt))
+        RAG_CONTEXT_DOCS.labels(backend=stats.backend).inc(len(context["docs"]))
 
+        if not context["docs"]:
+            return {"answer": "No relevant articles found.", "stats": stats.as_dict()}
 
-        prompt = (
-            "You are a helpful assistant. Use the following context to answer the question.\n\n"
-            "Context:\n" + "\n".join(context_docs) + "\n\n"
-            f"Question: {question}\n\n"
-            "Answer the question based on the context provided."
-        )
+        with stats.stage("route"):
+            decision = route_question(question, results, filtered=not filters.is_empty()) if RAG_ROUTER \
+                else {"route": "generative", "confidence": 0.0, "reason": "router_disabled"}
+        if decision["route"] == "extractive" and scoped is None:
+            decision = {"route": "generative", "confidence": decision["confidence"], "reason": "unresolved_filter"}
+        elif decision["route"] == "extractive" and scoped is not filters:
+            # List only what matches the source/period the question names;
+            # the LLM path keeps the broader context
+            with stats.stage("vector_search_scoped"):
+                scoped_results = vectordatabase.query_similar_articles(
+                    query_text=question, top_k=RAG_CANDIDATE_K, filters=scoped, vec_str=vec_str
+                )
+                scoped_context = build_context(scoped_results)
+            decision = route_question(question, scoped_results, filtered=True) if scoped_context["docs"] \
+                else {"route": "generative", "confidence": 0.0, "reason": "no_scoped_hits"}
+            if decision["route"] == "extractive":
+                context = scoped_context
+        # Retrieval is done: hand the connection back before the LLM call
+        vectordatabase.close()
+        stats.set("route", decision["route"])
+        stats.set("route_confidence", decision["confidence"])
+        stats.set("route_reason", decision["reason"])
 
-        # Get Gemini client
-        client = get_gemini_client()
+        if decision["route"] == "extractive":
+            with stats.stage("extractive"):
+                answer = build_extractive_answer(context["hits"])
+            return _finish(answer, decision, stats, start)
 
-        # Call Gemini API
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
+        # Deadline-bounded, hedged call with fallback model
+        with stats.stage("llm"):
+            result = get_llm().generate(prompt, deadline=deadline)
+
+        stats.set("llm_backend", result.backend)
+        stats.set("llm_model", result.model)
+        stats.set("llm_hedged", result.hedged)
+        stats.set("llm_fallback", result.fallback)
+        stats.set("prompt_tokens", result.prompt_tokens)
+        stats.set("response_tokens", result.response_tokens)
+        if result.ttft is not None:
+            stats.observe("llm_ttft", result.ttft)
+        RAG_PROMPT_TOKENS.labels(backend=stats.backend).inc(
+            result.prompt_tokens or stats.counters["prompt_tokens_estimate"]
         )
 
-        return response.candidates[0].content.parts[0].text
+        return _finish(result.text, decision, stats, start)
+    finally:
+        vectordatabase.close()
+
+
+def _finish(answer: str, decision: dict, stats: RequestStats, start: float) -> dict:
+    elapsed = time.perf_counter() - start
+    RAG_ROUTE_SECONDS.labels(route=decision["route"]).observe(elapsed)
+    print(f"INFO: route={decision['route']} confidence={decision['confidence']} "
+          f"reason={decision['reason']} latency_ms={elapsed * 1000:.1f}")
+    print(f"INFO: RAG stats {stats.as_dict()}")
+    return {"answer": answer, "stats": stats.as_dict()}
+
+
+def is_cacheable(result: dict) -> bool:
+    """
+    Whether a run_rag_query result may be reused for other requests: a routed
+    answer (extractive, or generated by the primary model), never an answer
+    from the fallback model or a run that stopped before routing.
+    """
+    stats = result.get("stats") or {}
+    return bool(result.get("answer")) and "route" in stats and not stats.get("llm_fallback")
+
+
+def answer_question_for_postgre(question: str):
+    try:
+        return run_rag_query(question)["answer"]
 
     except Exception as e:
         print(f"ERROR in answer_question_for_postgre: {e}")
@@ -121,10 +404,12 @@ def answer_question_for_postgre(question: str):
 
 
 # -----------------------------
-# 3. Process embeddings & store in ChromaDB
+# 4. Process embeddings & store in ChromaDB
 # -----------------------------
 def process_and_store_embeddings(documents: list[str]):
-    
+    import chromadb
+    from sentence_transformers import SentenceTransformer
+
     try:
         print("DEBUG: Initializing embedding model...")
         model = SentenceTransformer("all-MiniLM-L6-v2")
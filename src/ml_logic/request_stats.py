@@ -0,0 +1,68 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from opentelemetry import trace
+
+from .metrics import RAG_ERRORS, RAG_STAGE_SECONDS, RETRIEVAL_BACKEND
+from ..data_pipeline.tracing import span
+
+# Set by the API's in-flight request tracker (only when debug endpoints are
+# enabled); stages then report themselves in it. None costs one lookup.
+CURRENT_REQUEST: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_request", default=None)
+
+
+class RequestStats:
+    """
+    Per-request timings and counters for the RAG path.
+
+    Stages are timed with `with stats.stage("name"):` and accumulate in
+    milliseconds; counters hold plain numbers such as prompt token counts.
+    Every stage is also observed in the rag_stage_seconds histogram and
+    traced as a "rag.<stage>" span; an exception escaping a stage counts as
+    an error of that stage. Scalar counters are copied onto the current span.
+    """
+
+    def __init__(self, backend: str = RETRIEVAL_BACKEND):
+        self.backend = backend
+        self.started = time.perf_counter()
+        self.timings_ms: Dict[str, float] = {}
+        self.counters: Dict[str, Any] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        request = CURRENT_REQUEST.get()
+        if request is not None:
+            outer, request["stage"] = request.get("stage"), name
+        try:
+            with span(f"rag.{name}", {"rag.backend": self.backend}):
+                yield self
+        except Exception:
+            self.error(name)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+            if request is not None:
+                request["stage"] = outer
+
+    def observe(self, name: str, seconds: float):
+        """Record a stage timed elsewhere (e.g. LLM time-to-first-token)."""
+        self.timings_ms[name] = round(self.timings_ms.get(name, 0.0) + seconds * 1000, 2)
+        RAG_STAGE_SECONDS.labels(stage=name, backend=self.backend).observe(seconds)
+
+    def error(self, stage: str):
+        RAG_ERRORS.labels(backend=self.backend, stage=stage).inc()
+
+    def set(self, name: str, value: Any):
+        self.counters[name] = value
+        if isinstance(value, (str, bool, int, float)):
+            trace.get_current_span().set_attribute(f"rag.{name}", value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "timings_ms": dict(self.timings_ms),
+            **self.counters,
+        }
@@ -1,37 +1,37 @@
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
 import os 
+import threading
 from dotenv import load_dotenv
 
+# Per-process pool sizing: Postgres max_connections is shared by every worker
+# of every replica, so each worker only gets its slice of it
+PG_MAX_CONNECTIONS = int(os.getenv("PG_MAX_CONNECTIONS", "0"))  # 0 = ask the server
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "20"))  # Airflow, pipeline, admin
+DB_POOL_MAX_PER_WORKER = int(os.getenv("DB_POOL_MAX_PER_WORKER", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
 
 
+def connection_kwargs() -> dict:
+    load_dotenv()
+    return dict(
+        host=os.getenv("DB_HOST", "db"),      # default to 'db' if env missing
+        port=int(os.getenv("DB_PORT", 5432)), # default to 5432
+        user=os.getenv("DB_USER", "ayush"),
+        password=os.getenv("DB_PASSWORD", "mypassword"),
+        dbname=os.getenv("DB_NAME", "mydatabase"),
+    )
 
 
-
-    
-
 def connect_storage():
     
     print(f'******** DATABASE CONNECTION ********\n')
-    load_dotenv()
-    DATABASE_URL = os.getenv("DB_URL")
     
     try:
-
-        
-        host = os.getenv("DB_HOST", "db")      # default to 'db' if env missing
-        port = int(os.getenv("DB_PORT", 5432)) # default to 5432
-        user = os.getenv("DB_USER", "ayush")
-        password = os.getenv("DB_PASSWORD", "mypassword")
-        dbname = os.getenv("DB_NAME", "mydatabase")
-
-        print(f"🔌 Connecting to Postgres at {host}:{port} as {user}")
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            dbname=dbname
-        )
+        params = connection_kwargs()
+        print(f"🔌 Connecting to Postgres at {params['host']}:{params['port']} as {params['user']}")
+        conn = psycopg2.connect(**params)
         print("✅ Database connection established")
         return conn
         
@@ -39,8 +39,108 @@ def connect_storage():
             
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"ERROR: {error}")
-    
-    
+
+
+# -----------------------------
+# Connection pool (API workers)
+# -----------------------------
+class ConnectionPool:
+    """
+    Blocking, thread-safe psycopg2 pool for one process.
+
+    psycopg2's ThreadedConnectionPool raises as soon as it is exhausted; the
+    semaphore here makes callers wait up to `timeout` instead, so a burst
+    queues for a connection rather than failing. Connections are opened
+    lazily, so a pool created before fork() holds no sockets to share.
+    """
+
+    def __init__(self, maxconn: int, timeout: float = DB_POOL_TIMEOUT):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = psycopg2.pool.ThreadedConnectionPool(0, maxconn, **connection_kwargs())
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self.pid = os.getpid()
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError(f"no connection available within {self.timeout}s (max {self.maxconn})")
+        try:
+            conn = self._pool.getconn()
+            if conn.closed:
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+            conn.autocommit = True
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            # A connection that failed mid-query is not handed out again
+            broken = conn.closed or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            self._pool.putconn(conn, close=bool(broken))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+def server_max_connections() -> int:
+    """
+    max_connections minus superuser-reserved slots, read from the server.
+    """
+    conn = psycopg2.connect(**connection_kwargs())
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_setting('max_connections')::int"
+                        " - current_setting('superuser_reserved_connections')::int")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def pool_size_per_worker(workers: int = None, max_connections: int = None) -> int:
+    """
+    Connections one worker may hold: (max_connections - reserved) / workers,
+    capped by DB_POOL_MAX_PER_WORKER and never below 1.
+
+    Args:
+        workers: Worker processes sharing the budget (default WEB_CONCURRENCY)
+        max_connections: Server limit (default PG_MAX_CONNECTIONS, else queried)
+    """
+    workers = workers or int(os.getenv("WEB_CONCURRENCY", "1"))
+    if max_connections is None:
+        max_connections = PG_MAX_CONNECTIONS
+    if not max_connections:
+        try:
+            max_connections = server_max_connections()
+        except Exception as e:
+            print(f"WARNING: could not read max_connections ({e}); assuming 100")
+            max_connections = 100
+    budget = max(workers, max_connections - DB_RESERVED_CONNECTIONS)
+    return max(1, min(DB_POOL_MAX_PER_WORKER, budget // workers))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    The pool of this process; a pool inherited across fork() is discarded.
+    DB_POOL_SIZE (set by the gunicorn config before forking) wins over
+    computing the size here.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            size = int(os.getenv("DB_POOL_SIZE", "0")) or pool_size_per_worker()
+            _pool = ConnectionPool(size)
+            print(f"INFO: Connection pool for pid {os.getpid()}: up to {size} connections")
+        return _pool
+
 
 def store_data(feed,conn):
     from .vector_db import vectordatabasePg
@@ -92,6 +192,8 @@ def store_data(feed,conn):
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"ERROR: Failed to store data - {error}")
         conn.rollback()
+    finally:
+        vector_database.close()
     
 def get_data(conn):
     cursor = conn.cursor()
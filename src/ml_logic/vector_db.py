@@ -1,6 +1,7 @@
 import os
 import re
 import math
+import time
 import hashlib
 from typing import List, Dict, Optional, Iterable, Tuple
 from dotenv import load_dotenv
@@ -10,8 +11,24 @@ import psycopg2
 import psycopg2.extras
 import numpy as np
 
+from .filters import SearchFilters
+from .metrics import RAG_ERRORS, RETRIEVAL_BACKEND
+
 DB_URL = os.getenv("DB_URL")
 EMBED_DIM = int(os.getenv("EMBED_DIM", "512"))
+CORPUS_VERSION_TTL = float(os.getenv("CORPUS_VERSION_TTL", "30"))
+# Filtered queries matching at most this many rows skip the ANN index
+PREFILTER_MAX_ROWS = int(os.getenv("RETRIEVAL_PREFILTER_MAX_ROWS", "5000"))
+KEYSET_TIE_SLACK = int(os.getenv("SEARCH_KEYSET_TIE_SLACK", "20"))
+# Syndicated copies share a story_id (data_pipeline/dedup.py, PIPELINE_DEDUP=tag):
+# RAG retrieval keeps the nearest copy of each story, from this many times top_k rows
+RETRIEVAL_ONE_PER_STORY = os.getenv("RETRIEVAL_ONE_PER_STORY", "true").lower() in ("1", "true", "yes")
+STORY_OVERFETCH = int(os.getenv("RETRIEVAL_STORY_OVERFETCH", "3"))
+DB_POOL = os.getenv("DB_POOL", "true").lower() in ("1", "true", "yes")
+
+# Columns /search may return (never the embedding itself)
+SEARCH_COLUMNS = ("id", "link_name", "title", "link", "published", "published_at", "summary", "authors", "tags")
+DEFAULT_SEARCH_COLUMNS = ("link_name", "title", "link", "published")
 TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
 
 def tokenize(text: str) -> List[str]:
@@ -44,22 +61,43 @@ def encode_custom(text: str, dim: int = EMBED_DIM, use_bigrams: bool = True):
     return vec
 
 
+def encode_query(text: str) -> str:
+    """
+    Embed a query and format it as a pgvector literal.
+    """
+    query_vec = encode_custom(text, EMBED_DIM).tolist()
+    return "[" + ",".join([str(x) for x in query_vec]) + "]"
+
+
 class vectordatabasePg:
-    def __init__(self):
+    def __init__(self, pooled: bool = DB_POOL):
+        # Pooled connections come from this process's pool (see storage.get_pool)
+        # and go back to it on close()
+        self._pool = None
         try:
-            from .storage import connect_storage
-            self.conn = connect_storage()
-            self.conn.autocommit = True
-            print("INFO: Connected to PostgreSQL successfully.")
+            if pooled:
+                from .storage import get_pool
+                self._pool = get_pool()
+                self.conn = self._pool.getconn()
+            else:
+                from .storage import connect_storage
+                self.conn = connect_storage()
+                self.conn.autocommit = True
+                print("INFO: Connected to PostgreSQL successfully.")
         except Exception as e:
             print(f"ERROR connecting to PostgreSQL: {e}")
+            RAG_ERRORS.labels(backend=RETRIEVAL_BACKEND, stage="db_connect").inc()
             self.conn = None
+        self._iterative_scan_checked = False
 
     def close(self):
         try:
-            if self.conn:
+            if self.conn and self._pool:
+                self._pool.putconn(self.conn)
+            elif self.conn:
                 self.conn.close()
                 print("INFO: Connection closed.")
+            self.conn = None
         except Exception as e:
             print(f"ERROR closing connection: {e}")
 
@@ -157,33 +195,281 @@ class vectordatabasePg:
         except Exception as e:
             print(f"ERROR counting articles: {e}")
             return 0
-    def query_similar_articles(self, query_text: str, top_k: int = 5):
+
+    def corpus_version(self) -> str:
+        """
+        Cheap fingerprint of the searchable corpus; changes whenever articles
+        are added or (re-)embedded.
+        """
+        if not self.conn:
+            print("ERROR: No DB connection.")
+            return "unknown"
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT COUNT(*), COALESCE(MAX(id), 0), COUNT(embedding), MAX(updated_at)
+                    FROM articles;
+                    """
+                )
+                total, max_id, embedded, updated = cur.fetchone()
+                return f"{total}-{max_id}-{embedded}-{updated.timestamp() if updated else 0:.0f}"
+        except Exception as e:
+            print(f"ERROR reading corpus version: {e}")
+            return "unknown"
+
+    def _enable_iterative_scan(self):
+        """
+        pgvector >= 0.8: keep scanning the ANN index until enough rows pass the
+        filters instead of returning fewer than top_k. Older versions ignore it.
+        """
+        if self._iterative_scan_checked:
+            return
+        self._iterative_scan_checked = True
+        for setting in ("hnsw.iterative_scan", "ivfflat.iterative_scan"):
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute(f"SET {setting} = relaxed_order;")
+            except Exception as e:
+                print(f"INFO: {setting} not available ({e}).")
+
+    def _filters_are_selective(self, filters: SearchFilters) -> bool:
+        """
+        Cheap index-only probe: do the filters leave few enough rows that an
+        exact scan over them beats walking the ANN index?
+        """
+        clauses, params = filters.to_sql()
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM articles
+                    WHERE embedding IS NOT NULL AND {" AND ".join(clauses)}
+                    LIMIT %s
+                ) AS probe;
+                """,
+                (*params, PREFILTER_MAX_ROWS + 1)
+            )
+            return cur.fetchone()[0] <= PREFILTER_MAX_ROWS
+
+    def similar_articles_sql(self, vec_str: str, top_k: int, filters: Optional[SearchFilters] = None):
+        """
+        Build the similarity SQL used by query_similar_articles. With
+        RETRIEVAL_ONE_PER_STORY, copies of a story already ranked are
+        skipped: the top_k rows come from STORY_OVERFETCH * top_k nearest.
+
+        Returns:
+            Tuple of (sql, args, strategy) where strategy is "prefilter",
+            "ann" or "ann_iterative"
+        """
+        clauses, params = (filters.to_sql() if filters and not filters.is_empty() else ([], []))
+        where = " AND ".join(["embedding IS NOT NULL", *clauses])
+        fetch = top_k * STORY_OVERFETCH if RETRIEVAL_ONE_PER_STORY else top_k
+        if RETRIEVAL_ONE_PER_STORY:
+            # Articles without a story are their own story (-id never clashes with a story_id)
+            pick = """
+                SELECT * FROM (
+                    SELECT DISTINCT ON (COALESCE(story_id, -id)) * FROM nearest
+                    ORDER BY COALESCE(story_id, -id), distance
+                ) best
+                ORDER BY distance
+                LIMIT %s;
+            """
+        else:
+            pick = "SELECT * FROM nearest ORDER BY distance LIMIT %s;"
+
+        if clauses and self._filters_are_selective(filters):
+            # Pre-filter: exact distance over the index-narrowed rows
+            sql = f"""
+                WITH candidates AS MATERIALIZED (
+                    SELECT id, link_name, title, link, published, summary, authors, tags, story_id, embedding
+                    FROM articles
+                    WHERE {where}
+                ), nearest AS (
+                    SELECT *, embedding <=> %s::vector AS distance
+                    FROM candidates
+                    ORDER BY distance
+                    LIMIT %s
+                )
+                {pick}
+            """
+            return sql, (*params, vec_str, fetch, top_k), "prefilter"
+
+        if clauses:
+            self._enable_iterative_scan()
+        # Iterative scans may return rows slightly out of order; re-sort the page
+        sql = f"""
+            WITH nearest AS MATERIALIZED (
+                SELECT id, link_name, title, link, published, summary, authors, tags, story_id, embedding,
+                       embedding <=> %s::vector AS distance
+                FROM articles
+                WHERE {where}
+                ORDER BY embedding <=> %s::vector
+                LIMIT %s
+            )
+            {pick}
+        """
+        return sql, (vec_str, *params, vec_str, fetch, top_k), "ann_iterative" if clauses else "ann"
+
+    def query_similar_articles(self, query_text: str, top_k: int = 5, filters: Optional[SearchFilters] = None,
+                               vec_str: Optional[str] = None):
         """
         Query the vector database for the most similar articles to the given text.
-        Uses <-> operator for cosine distance (pgvector).
+        Uses <=> operator for cosine distance (pgvector); each row carries its
+        `distance` so callers can re-rank without recomputing it.
+
+        Filters are applied in SQL. Selective filters (few matching rows) use a
+        pre-filter strategy: the btree/GIN indexes narrow the rows and the
+        distance is computed exactly over them. Broad filters walk the ANN
+        index with iterative scans so filtered queries still return top_k.
+
+        `vec_str` is the query already encoded with `encode_query`, so callers
+        can time encoding and search separately. Queries slower than
+        RETRIEVAL_SLOW_QUERY_MS are sampled into the slow-query log.
         """
         if not self.conn:
             print("ERROR: No DB connection.")
             return []
 
         try:
-            # Generate embedding for the query
-            query_vec = encode_custom(query_text, EMBED_DIM).tolist()
-            vec_str = "[" + ",".join([str(x) for x in query_vec]) + "]"
+            vec_str = vec_str or encode_query(query_text)
+            start = time.perf_counter()
+            sql, args, strategy = self.similar_articles_sql(vec_str, top_k, filters)
 
             with self.conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute(
-                    """
-                    SELECT articles_id, link_name, title, link, published, summary, authors,tags,embedding
-                    FROM articles
-                    WHERE embedding IS NOT NULL
-                    ORDER BY embedding <=> %s::vector
-                    LIMIT %s;
-                    """,
-                    (vec_str, top_k)
-                )
+                cur.execute(sql, args)
                 rows = cur.fetchall()
-                return [dict(r) for r in rows]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            from .explain import maybe_log_slow_query
+            maybe_log_slow_query(query_text, top_k, filters, strategy, elapsed_ms)
+            return [dict(r) for r in rows]
         except Exception as e:
             print(f"ERROR querying similar articles: {e}")
+            RAG_ERRORS.labels(backend=RETRIEVAL_BACKEND, stage="vector_search").inc()
+            return []
+
+    def explain_similar_articles(self, query_text: str, top_k: int = 5,
+                                 filters: Optional[SearchFilters] = None) -> Dict:
+        """
+        Run EXPLAIN (ANALYZE, BUFFERS) on the exact query_similar_articles SQL.
+
+        Returns:
+            Dictionary with the strategy, pgvector settings in effect, encode
+            and database timings, the JSON plan and a summary of it (see
+            explain.summarize_plan)
+        """
+        from .explain import summarize_plan, vector_settings
+
+        if not self.conn:
+            raise RuntimeError("No DB connection")
+
+        start = time.perf_counter()
+        vec_str = encode_query(query_text)
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        sql, args, strategy = self.similar_articles_sql(vec_str, top_k, filters)
+        with self.conn.cursor() as cur:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, SETTINGS, FORMAT JSON) " + sql, args)
+            plan = cur.fetchone()[0][0]
+        db_ms = (time.perf_counter() - start) * 1000
+
+        return {
+            "query": query_text,
+            "top_k": top_k,
+            "filters": filters.cache_key() if filters else None,
+            "strategy": strategy,
+            "settings": vector_settings(self.conn),
+            "encode_ms": round(encode_ms, 2),
+            "db_ms": round(db_ms, 2),
+            **summarize_plan(plan),
+            "plan": plan,
+        }
+
+    def search_articles(self, query_text: str, limit: int = 10, filters: Optional[SearchFilters] = None,
+                        after: Optional[Tuple[float, int]] = None,
+                        columns: Iterable[str] = DEFAULT_SEARCH_COLUMNS) -> List[Dict]:
+        """
+        Retrieval-only ranked search with keyset pagination.
+
+        Rows are ordered by (distance, id); `after` is the (distance, id) of
+        the last row of the previous page, so later pages never use OFFSET.
+        Only the requested columns are read.
+        """
+        if not self.conn:
+            print("ERROR: No DB connection.")
+            return []
+
+        columns = [c for c in columns if c in SEARCH_COLUMNS and c != "id"]
+        vec_str = encode_query(query_text)
+
+        clauses, params = (filters.to_sql() if filters and not filters.is_empty() else ([], []))
+        if after is not None:
+            # Row comparison: one (distance, id) order, no separate float equality test
+            clauses.append("((embedding <=> %s::vector), id) > (%s::float8, %s)")
+            params.extend([vec_str, after[0], after[1]])
+        where = " AND ".join(["embedding IS NOT NULL", *clauses])
+
+        if clauses:
+            self._enable_iterative_scan()
+
+        select = ", ".join(["id", *columns])
+        # The inner ORDER BY stays index-friendly (distance only); the slack
+        # rows let the outer (distance, id) order settle ties deterministically
+        sql = f"""
+            WITH nearest AS MATERIALIZED (
+                SELECT {select}, embedding <=> %s::vector AS distance
+                FROM articles
+                WHERE {where}
+                ORDER BY embedding <=> %s::vector
+                LIMIT %s
+            )
+            SELECT * FROM nearest ORDER BY distance, id LIMIT %s;
+        """
+        try:
+            with self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(sql, (vec_str, *params, vec_str, limit + KEYSET_TIE_SLACK, limit))
+                return [dict(r) for r in cur.fetchall()]
+        except Exception as e:
+            print(f"ERROR searching articles: {e}")
             return []
+
+    def resolve_sources(self, hint: str) -> List[str]:
+        """
+        Map a free-text source hint (e.g. "yle", "Helsinki Times") to stored link_name values.
+        """
+        if not self.conn or not hint:
+            return []
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    "SELECT DISTINCT link_name FROM articles WHERE link_name ILIKE %s;",
+                    (f"%{hint.strip()}%",)
+                )
+                return [r[0] for r in cur.fetchall()]
+        except Exception as e:
+            print(f"ERROR resolving sources for {hint!r}: {e}")
+            return []
+
+
+_corpus_version_cache = {"value": None, "expires": 0.0}
+
+
+def get_corpus_version(ttl: float = CORPUS_VERSION_TTL) -> str:
+    """
+    Corpus version cached for `ttl` seconds so hot paths don't query it per request.
+    """
+    now = time.monotonic()
+    if _corpus_version_cache["value"] is not None and now < _corpus_version_cache["expires"]:
+        return _corpus_version_cache["value"]
+
+    vectordatabase = vectordatabasePg()
+    try:
+        version = vectordatabase.corpus_version()
+    finally:
+        vectordatabase.close()
+
+    _corpus_version_cache["value"] = version
+    _corpus_version_cache["expires"] = now + ttl
+    return version
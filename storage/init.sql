@@ -12,7 +12,117 @@ CREATE TABLE IF NOT EXISTS articles (
                 tags TEXT[],
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
+);
 
 
 
+
+-- Short-lived answers shared between API workers for request coalescing
+CREATE TABLE IF NOT EXISTS answer_cache (
+                cache_key TEXT PRIMARY KEY,
+                answer JSONB NOT NULL,
+                created_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Retrieval filters: source + date range (btree) and tags (GIN)
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS published_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS idx_articles_link_name_published_at ON articles(link_name, published_at);
+CREATE INDEX IF NOT EXISTS idx_articles_published_at ON articles(published_at);
+CREATE INDEX IF NOT EXISTS idx_articles_tags ON articles USING GIN (tags);
+
+-- Sampled plans of slow similarity queries (see src/ml_logic/explain.py)
+CREATE TABLE IF NOT EXISTS retrieval_slow_queries (
+                id BIGSERIAL PRIMARY KEY,
+                logged_at TIMESTAMPTZ DEFAULT now(),
+                query_text TEXT NOT NULL,
+                top_k INT,
+                filters JSONB,
+                strategy TEXT,
+                duration_ms REAL,
+                index_used TEXT,
+                seq_scan BOOLEAN,
+                candidates_examined BIGINT,
+                settings JSONB,
+                plan JSONB
+);
+CREATE INDEX IF NOT EXISTS idx_retrieval_slow_queries_logged_at ON retrieval_slow_queries(logged_at);
+
+-- Per-source high-water marks and run bookkeeping (see src/data_pipeline/state.py)
+CREATE TABLE IF NOT EXISTS source_state (
+                source TEXT PRIMARY KEY,
+                last_guid TEXT,
+                last_link TEXT,
+                last_published_at TIMESTAMPTZ,
+                last_run_id TEXT,
+                last_success_at TIMESTAMPTZ,
+                articles_total BIGINT DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+                run_id TEXT PRIMARY KEY,
+                started_at TIMESTAMPTZ DEFAULT now(),
+                finished_at TIMESTAMPTZ,
+                status TEXT NOT NULL DEFAULT 'running',
+                full_refresh BOOLEAN DEFAULT FALSE,
+                articles_processed BIGINT,
+                heartbeat_at TIMESTAMPTZ
+);
+ALTER TABLE pipeline_runs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+
+-- Edit detection: hash of the source text, embeddings to re-compute (see src/data_pipeline/state.py)
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS embedding_stale BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Near-duplicate wire stories: signatures, LSH buckets, copies (see src/data_pipeline/dedup.py)
+CREATE TABLE IF NOT EXISTS stories (
+                story_id BIGSERIAL PRIMARY KEY,
+                signature BYTEA NOT NULL,
+                canonical_link TEXT NOT NULL,
+                canonical_source TEXT,
+                copies INT NOT NULL DEFAULT 1,
+                first_seen_at TIMESTAMPTZ DEFAULT now(),
+                last_seen_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS story_buckets (
+                band SMALLINT NOT NULL,
+                bucket BIGINT NOT NULL,
+                story_id BIGINT NOT NULL REFERENCES stories(story_id) ON DELETE CASCADE,
+                PRIMARY KEY (band, bucket, story_id)
+);
+CREATE TABLE IF NOT EXISTS story_aliases (
+                link TEXT PRIMARY KEY,
+                story_id BIGINT NOT NULL REFERENCES stories(story_id) ON DELETE CASCADE,
+                source TEXT NOT NULL,
+                similarity REAL NOT NULL,
+                seen_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_story_aliases_story_id ON story_aliases(story_id);
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS story_id BIGINT;
+CREATE INDEX IF NOT EXISTS idx_articles_story_id ON articles(story_id);
+
+-- Bulk loads: loaded files and indexes to rebuild (see src/data_pipeline/backfill.py)
+CREATE TABLE IF NOT EXISTS backfill_files (
+                path TEXT PRIMARY KEY,
+                bytes BIGINT,
+                mtime DOUBLE PRECISION,
+                rows INT,
+                loaded_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS backfill_indexes (
+                name TEXT PRIMARY KEY,
+                definition TEXT NOT NULL,
+                dropped_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Source leases shared by ingestion workers (see src/data_pipeline/distributed.py)
+CREATE TABLE IF NOT EXISTS source_leases (
+                source TEXT PRIMARY KEY,
+                worker_id TEXT,
+                leased_until TIMESTAMPTZ,
+                heartbeat_at TIMESTAMPTZ,
+                claimed_at TIMESTAMPTZ,
+                claims BIGINT NOT NULL DEFAULT 0,
+                last_finished_at TIMESTAMPTZ,
+                last_worker_id TEXT,
+                last_status TEXT,
+                last_error_at TIMESTAMPTZ
+);